@@ -1,21 +1,23 @@
+import re
 from time import sleep, time
 import logging
 from random import randint
+from itertools import groupby
 from langchain.prompts import ChatPromptTemplate
 from langchain.prompts.chat import SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain.callbacks import get_openai_callback
 
+from game_state import GameState, EMPTY, FOOD, SNAKE1, SNAKE2, SNAKE1_HEAD, SNAKE2_HEAD
+from bots import SNAKE_IDS, move_analysis
+from backends import available_models, llm_cost
+from prompt_tokens import llm_encoder, count_messages_tokens, count_tokens
+
 
 logging.basicConfig(level=logging.INFO)
 
 
-# Available models list to be used in the app
-AVAILABLE_MODELS = [
-    "openai gpt-4o-2024-05-13 (GPT-4o)",
-    "openai gpt-4-1106-preview (GPT-4 Turbo)",
-    "openai gpt-3.5-turbo",
-    "openai gpt-4",
-]
+# Available models list to be used in the app, "backend:model_name" ids of the registered backends (see backends.py)
+AVAILABLE_MODELS = available_models()
 
 
 # Default prompts for the initial layout 
@@ -58,109 +60,438 @@ Makt the following Chain of Thought in few words:
 ]
 
 
-def board_to_char(board_config, board_state, chars_type="emojis"):
+# Characters of every cell type for the board encodings
+BOARD_CHARS = {
+    "emojis": {
+        "CELL": "⬜",
+        "SNAKE1_HEAD": "🟢",
+        "SNAKE1": "🟩",
+        "SNAKE2_HEAD": "🔵",
+        "SNAKE2": "🟦",
+        "FOOD": "🍎",
+    },
+    "_GBR": {
+        "CELL": " _",
+        "SNAKE1_HEAD": " G",
+        "SNAKE1": " g",
+        "SNAKE2_HEAD": " B",
+        "SNAKE2": " b",
+        "FOOD": " R",
+    },
+}
+
+# Lookup tables from the cell codes (EMPTY, FOOD, SNAKE1, SNAKE2, SNAKE1_HEAD, SNAKE2_HEAD) to the characters
+BOARD_LUTS = {chars_type: [chars["CELL"], chars["FOOD"], chars["SNAKE1"], chars["SNAKE2"], chars["SNAKE1_HEAD"], chars["SNAKE2_HEAD"]] 
+              for chars_type, chars in BOARD_CHARS.items()}
+
+
+def board_codes(board_config, board_state, game_state=None):
     """
-    Receives the board configuration, board state and the type of output (emojis or characters).
-    Returns a string with the board in characters or emojis, depending on the chars_type parameter.
+    Receives the board configuration, the board state and optionally the GameState with the occupancy grid.
+    Returns the list of rows with the cell code of every (x, y) cell. When several elements share a cell (only after a collision)
+    snake1 has priority over snake2 and both over the food, and a snake's head over its body.
     """
 
-    if chars_type == "emojis":
-        CELL = "⬜"
-        SNAKE1_HEAD = "🟢"
-        SNAKE1 = "🟩"
-        SNAKE2_HEAD = "🔵"
-        SNAKE2 = "🟦"
-        FOOD = "🍎"
-
-    elif chars_type == "_GBR":
-        CELL = " _"
-        SNAKE1_HEAD = " G"
-        SNAKE1 = " g"
-        SNAKE2_HEAD = " B"
-        SNAKE2 = " b"
-        FOOD = " R"
-
-    # Creating the board in characters
-    chars_board_list = []
-
-    for y in range(board_config["GRID_SIZE"]):
-        line = []
-        for x in range(board_config["GRID_SIZE"]):
-
-            # Agent 1 (green snake)
-            if (x, y) in board_state["snake1"]["body"]:
-                if (x, y) == board_state["snake1"]["body"][0]:
-                    line.append(SNAKE1_HEAD)
-                else:
-                    line.append(SNAKE1)
-
-            # Agent 2 (blue snake)
-            elif (x, y) in board_state["snake2"]["body"]:
-                if (x, y) == board_state["snake2"]["body"][0]:
-                    line.append(SNAKE2_HEAD)
-                else:
-                    line.append(SNAKE2)
-
-            # Food
-            elif (x, y) in board_state["food"]:
-                line.append(FOOD)
-
-            # Empty cell
-            else:
-                line.append(CELL)
+    GRID_SIZE = board_config["GRID_SIZE"]
+
+    # Both snakes alive: the occupancy grid has no shared cells, only the heads have to be set
+    if game_state is not None and game_state.snakes["snake1"]["is_alive"] and game_state.snakes["snake2"]["is_alive"]:
+        codes = game_state.grid.tolist()
+        head1, head2 = game_state.snakes["snake1"]["body"][0], game_state.snakes["snake2"]["body"][0]
+        codes[head1[1]][head1[0]] = SNAKE1_HEAD
+        codes[head2[1]][head2[0]] = SNAKE2_HEAD
+        return codes
+
+    # Otherwise the cells are painted from the lowest to the highest priority
+    codes = [[EMPTY] * GRID_SIZE for _ in range(GRID_SIZE)]
+    layers = [(board_state["food"], FOOD),
+              (board_state["snake2"]["body"][1:], SNAKE2), (board_state["snake2"]["body"][:1], SNAKE2_HEAD),
+              (board_state["snake1"]["body"][1:], SNAKE1), (board_state["snake1"]["body"][:1], SNAKE1_HEAD)]
+    for positions, code in layers:
+        for x, y in positions:
+            if 0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE:
+                codes[y][x] = code
+
+    return codes
 
-        chars_board_list.append(line)
 
-    # Transforming the board to a string with the line number at the beginning of each line
-    chars_board = "\n".join([f"{i:02}" + "".join(line) for i, line in enumerate(chars_board_list)])
+def board_to_char(board_config, board_state, chars_type="emojis", game_state=None):
+    """
+    Receives the board configuration, board state, the type of output (emojis or characters) and optionally the GameState with the occupancy grid.
+    Returns a string with the board in characters or emojis, depending on the chars_type parameter.
+    """
+
+    lut = BOARD_LUTS[chars_type]
+
+    # Transforming the board to a string with the line number at the beginning of each line, every cell is a lookup of its code
+    chars_board = "\n".join([f"{i:02}" + "".join([lut[code] for code in row]) for i, row in enumerate(board_codes(board_config, board_state, game_state))])
 
     return chars_board
 
 
-def get_agent_action(agent, llm, prompt, board_config, board_state, is_test=False):
+# --- Compact board encodings ---
+
+# Single character of every cell code for the run-length encoded rows
+COMPACT_LUT = [char.strip() for char in BOARD_LUTS["_GBR"]]
+
+
+def format_pos(pos):
+    return f"{pos[0]},{pos[1]}"
+
+
+def rle_board(board_config, board_state, game_state=None):
+    """
+    Receives the board configuration, the board state and optionally the GameState with the occupancy grid.
+    Returns the characters board with every row run-length encoded: each run of equal cells is written as its length followed by
+    the cell char, the length is omitted for single cells (e.g. "02 2_3gG9_"). Every line starts with its y coordinate.
+    """
+
+    rows = []
+    for i, row in enumerate(board_codes(board_config, board_state, game_state)):
+        runs = []
+        for code, run in groupby(row):
+            length = len(list(run))
+            runs.append(f"{length}{COMPACT_LUT[code]}" if length > 1 else COMPACT_LUT[code])
+        rows.append(f"{i:02} " + "".join(runs))
+
+    return "\n".join(rows)
+
+
+def sparse_board(board_state):
+    """
+    Receives the board state.
+    Returns the list of occupied cells only, as x,y coordinates: every snake's head, direction and body (from head to tail) and the food.
+    """
+
+    lines = []
+    for snake_id in ["snake1", "snake2"]:
+        snake = board_state[snake_id]
+        status = "" if snake["is_alive"] else " (dead)"
+        lines.append(f"{snake_id}{status} head {format_pos(snake['body'][0])} dir {snake['dir']} body {' '.join(map(format_pos, snake['body'][1:]))}")
+    lines.append(f"food {' '.join(map(format_pos, board_state['food']))}")
+
+    return "\n".join(lines)
+
+
+def diff_board(prev_board_state, board_state):
+    """
+    Receives the board state shown in the previous turn (None in the first turn) and the current one.
+    Returns only the changes since the previous turn: every snake's new head and direction, whether it grew or the tail cell it left,
+    and the food eaten and added. The first turn returns the sparse board.
+    """
+
+    if prev_board_state is None:
+        return sparse_board(board_state)
+
+    lines = []
+    for snake_id in ["snake1", "snake2"]:
+        snake, prev_body = board_state[snake_id], prev_board_state[snake_id]["body"]
+        if not snake["is_alive"]:
+            lines.append(f"{snake_id} died")
+            continue
+        change = "grew" if len(snake["body"]) > len(prev_body) else f"left {format_pos(prev_body[-1])}"
+        lines.append(f"{snake_id} head {format_pos(snake['body'][0])} dir {snake['dir']} {change}")
+
+    food_eaten = [pos for pos in prev_board_state["food"] if pos not in board_state["food"]]
+    food_added = [pos for pos in board_state["food"] if pos not in prev_board_state["food"]]
+    if food_eaten:
+        lines.append(f"food eaten {' '.join(map(format_pos, food_eaten))}")
+    if food_added:
+        lines.append(f"new food {' '.join(map(format_pos, food_added))}")
+
+    return "\n".join(lines)
+
+
+def safe_moves_str(game_state, agent_number):
+    """
+    Receives the GameState and the agent int number.
+    Returns the safe moves of the agent's snake as arrow emojis (the other ones hit a wall or a body), flagging the ones where the opponent's head can also move.
+    """
+
+    moves, risky = move_analysis(game_state, SNAKE_IDS[agent_number][0])
+    if not moves:
+        return "No safe move, every direction hits a wall or a body."
+
+    text = f"Safe moves: {' '.join(DIR_TO_ARROW[dir] for dir in moves)}"
+    if risky:
+        text += f" ({' '.join(DIR_TO_ARROW[dir] for dir in risky)} can collide head to head with the opponent)"
+
+    return text
+
+
+# Compact encoding replacing every full board variable when the rendered prompt exceeds the agent's token budget, in this order
+COMPACT_FALLBACKS = {
+    "emojis_board": "rle_board",
+    "chars_board": "rle_board",
+    "board_state_str": "sparse_board",
+}
+
+
+def get_board_variables(board_config, board_state, input_variables, game_state=None, encodings=None, prev_board_state=None, agent_number=1):
+    """
+    Receives the board configuration, the board state, the prompt's input variables, optionally the GameState, optionally the dict of
+    encodings already generated in the turn (shared by both agents, it is updated with the new ones), optionally the board state of the previous turn
+    and the agent int number (for the agent's own variables).
+    Returns the dictionary with only the board encodings used by the prompt: emojis_board, chars_board, board_state_str, rle_board, sparse_board, diff_board,
+    safe_moves (the agent's safe moves) and the turn number.
+    """
+
+    encodings = encodings if encodings is not None else {}
+    get_game_state = lambda: game_state if game_state is not None else GameState(board_config, board_state)
+
+    generators = {
+        "emojis_board": lambda: board_to_char(board_config, board_state, game_state=game_state),
+        "chars_board": lambda: board_to_char(board_config, board_state, chars_type="_GBR", game_state=game_state),
+        "board_state_str": lambda: str(board_state),
+        "rle_board": lambda: rle_board(board_config, board_state, game_state=game_state),
+        "sparse_board": lambda: sparse_board(board_state),
+        "diff_board": lambda: diff_board(prev_board_state, board_state),
+        "safe_moves": lambda: safe_moves_str(get_game_state(), agent_number),
+        "turn": lambda: str(board_state["turn"]),
+    }
+
+    # The agent's own variables are cached per agent in the shared encodings
+    own_variables = {"safe_moves"}
+
+    variables = {}
+    for name, generator in generators.items():
+        if name in input_variables:
+            key = f"{name}_{agent_number}" if name in own_variables else name
+            if key not in encodings:
+                encodings[key] = generator()
+            variables[name] = encodings[key]
+
+    return variables
+
+
+def compile_prompt(prompt):
     """
-    Receives the agent int number, the LLM langchain chat model, the prompt list with 2 strings (sys_msg, human_msg), the board configuration dictionary, the board state dictionary and a boolean to indicate if it is a test case.
-    Returns the action of the agent (direction to move), the raw response message from the LLM, the time it took to get the response, the tokens used and the cost of the API call.
+    Receives the prompt dictionary with the sys_msg and human_msg strings.
+    Returns the compiled langchain chat template and the set of input variables it uses, so it is built only once per match
+    and only the board encodings used by the template are generated every turn.
+    """
+
+    template = ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate.from_template(prompt["sys_msg"]),
+            HumanMessagePromptTemplate.from_template(prompt["human_msg"]),
+        ]
+    )
+
+    return {"template": template, "input_variables": set(template.input_variables)}
+
+
+# --- Responses ---
+
+# Arrow emojis of every direction
+ARROW_TO_DIR = {
+    "⬆️": "U",
+    "⬇️": "D",
+    "⬅️": "L",
+    "➡️": "R",
+}
+
+DIR_TO_ARROW = {dir: arrow for arrow, dir in ARROW_TO_DIR.items()}
+
+ARROW_PATTERN = re.compile("|".join(re.escape(arrow) for arrow in ARROW_TO_DIR))
+
+
+def find_move(text, start=0, complete=True):
+    """
+    Receives a response (or the part of a streamed one received so far), the index to search from and whether the response is complete.
+    Returns the (direction, end index) of the committed move: the first arrow emoji followed by a whitespace (the prompts ask for a space after it)
+    or ending a complete response. A complete response without any committed arrow falls back to its first arrow. (None, None) if there is no move (yet).
+    The streamed and the whole responses use this same rule, so a response stopped at its committed arrow gets the move of the whole one.
+    """
+
+    first = None
+    for match in ARROW_PATTERN.finditer(text, start):
+        end = match.end()
+        if (end < len(text) and text[end].isspace()) or (complete and end == len(text)):
+            return ARROW_TO_DIR[match.group()], end
+        if first is None:
+            first = (ARROW_TO_DIR[match.group()], end)
+
+    if complete and first is not None:
+        return first
+
+    return None, None
+
+
+def parse_direction(response):
+    """
+    Receives the whole LLM response (or the one stopped at its committed arrow).
+    Returns the direction of its committed arrow emoji ("U", "D", "L" or "R", see find_move()) or None if there is none.
+    """
+
+    return find_move(response)[0]
+
+
+class ArrowStreamParser:
+    """
+    Incremental parser of a streamed response with the find_move() rule: the decision is committed when an arrow emoji is followed by a whitespace,
+    so the generation can be stopped there. Every chunk is only scanned once, besides the few chars of an arrow split between chunks.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.scanned = 0
+        self.committed = None
+        self.committed_end = None
+
+
+    def feed(self, chunk):
+        """
+        Receives the next text chunk of the response.
+        Returns the committed direction or None if there is no decision yet.
+        """
+
+        self.text += chunk
+        if self.committed is None:
+            self.committed, self.committed_end = find_move(self.text, max(0, self.scanned - 3), complete=False)
+            self.scanned = len(self.text)
+
+        return self.committed
+
+
+def stream_llm(llm, messages, stop_early=False, cancel=None):
+    """
+    Receives the langchain chat model, the messages, whether to stop the generation once the move is committed and optionally the event that cancels the call.
+    Returns the response text (up to the committed arrow if it was stopped early) and whether it was stopped early.
+    """
+
+    parser = ArrowStreamParser()
+    stream = llm.stream(messages)
+    try:
+        for chunk in stream:
+            if parser.feed(chunk.content) is not None and stop_early:
+                return parser.text[:parser.committed_end], True
+            if cancel is not None and cancel.is_set():
+                break
+    finally:
+        # Closing the generator also closes the HTTP stream, so the rest of the completion is not generated
+        stream.close()
+
+    return parser.text, False
+
+
+def fit_token_budget(compiled_prompt, variables, token_budget, encoder, compact_variables):
+    """
+    Receives the compiled prompt, the board variables, the agent's token budget, the tiktoken encoding and a function returning a compact board variable by name.
+    Replaces the full board variables by their compact encodings (COMPACT_FALLBACKS order) until the rendered prompt fits the budget.
+    Returns the formatted messages, their input tokens and the list of replaced variables.
+    """
+
+    messages = compiled_prompt["template"].format_messages(**variables)
+    prompt_tokens = count_messages_tokens(encoder, messages)
+
+    compacted = []
+    for name, compact_name in COMPACT_FALLBACKS.items():
+        if token_budget is None or prompt_tokens <= token_budget:
+            break
+        if name not in variables:
+            continue
+        variables[name] = compact_variables(compact_name)
+        compacted.append(name)
+        messages = compiled_prompt["template"].format_messages(**variables)
+        prompt_tokens = count_messages_tokens(encoder, messages)
+
+    return messages, prompt_tokens, compacted
+
+
+def get_agent_action(agent, llm, prompt, board_config, board_state, is_test=False, game_state=None, cache=None, compiled_prompt=None, encodings=None, prev_board_state=None, token_budget=None, conversation=None, stream=False, stop_early=False, cancel=None):
+    """
+    Receives the agent int number, the LLM langchain chat model, the prompt list with 2 strings (sys_msg, human_msg), the board configuration dictionary, the board state dictionary, a boolean to indicate if it is a test case, optionally the GameState to build the boards from its occupancy grid, optionally a ResponseCache, optionally the prompt already compiled with compile_prompt(), optionally the dict of board encodings shared by both agents in the turn, optionally the board state of the previous turn (for {diff_board}), optionally the maximum input tokens of the prompt, optionally the agent's Conversation of the match (multi-turn mode, the token budget doesn't apply), whether to stream the response, whether to stop streaming once the move is committed (an arrow emoji followed by a space) and optionally the event set when the move's deadline expires (a streamed response stops at its next chunk).
+    Returns the action of the agent (direction to move), the raw response message from the LLM, the time it took to get the response, the tokens used, the cost of the API call and a dict with extra info of the call to be added to the game history (e.g. "cached", "prompt_tokens").
     """
 
     if not is_test:
 
-        # Creating the prompt template from the user defined agent's prompts
-        template = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(prompt["sys_msg"]),
-                HumanMessagePromptTemplate.from_template(prompt["human_msg"]),
-            ]
-        )
+        # Prompt rendering phase: the board variables, the messages and their tokens
+        t_prompt = time()
+
+        # Creating the prompt template from the user defined agent's prompts (if it wasn't compiled for the match already)
+        if compiled_prompt is None:
+            compiled_prompt = compile_prompt(prompt)
+
+        # Creating only the board encodings that the templates use, reusing the ones of the other agent in this turn
+        encodings = encodings if encodings is not None else {}
+        get_variables = lambda input_variables: get_board_variables(board_config, board_state, input_variables, game_state=game_state, encodings=encodings, prev_board_state=prev_board_state, agent_number=agent)
+
+        info = {}
+        encoder = llm_encoder(llm)
 
-        # Creating the board state in the emojis_board and chars_board formats to have them ready for the prompt if the template uses them
-        emojis_board = board_to_char(board_config, board_state)
-        chars_board = board_to_char(board_config, board_state, chars_type="_GBR")
-        board_state_str = str(board_state)
+        # Multi-turn mode: the conversation keeps the previous turns and only appends this turn's message, the tokens of the unchanged prefix
+        # of the previous request are the ones a provider's prefix cache can reuse
+        if conversation is not None:
+            messages = conversation.next_messages(agent, board_state, get_variables)
+            info["context_messages"] = len(messages)
+            if encoder is not None:
+                info["prompt_tokens"], info["cached_prompt_tokens"] = conversation.count_tokens(encoder)
+                info["uncached_prompt_tokens"] = info["prompt_tokens"] - info["cached_prompt_tokens"]
 
-        messages = template.format_messages(emojis_board=emojis_board, chars_board=chars_board, board_state_str=board_state_str)
+        # Counting the input tokens of the rendered prompt before sending it, compacting the board variables if it is over the agent's budget
+        elif encoder is not None:
+            compact_variables = lambda name: get_variables({name})[name]
+            messages, info["prompt_tokens"], compacted = fit_token_budget(compiled_prompt, get_variables(compiled_prompt["input_variables"]), token_budget, encoder, compact_variables)
+            if token_budget is not None:
+                info["compacted"] = ",".join(compacted)
+                info["over_budget"] = info["prompt_tokens"] > token_budget
+
+        else:
+            messages = compiled_prompt["template"].format_messages(**get_variables(compiled_prompt["input_variables"]))
+
+        info["prompt_time"] = time() - t_prompt
 
         logging.info(f"Agent {agent} \nMessages: {messages}")
 
-        # OpenAI API call with the callback to get the response message but also the cost and tokens used in the callback
+        # Cached response for the same backend, model, temperature, response mode and messages, it reports the original tokens and cost of the call
+        cache_mode = "stop_early" if stream and stop_early else "full"
+        cache_key = cache.make_key(llm, messages, cache_mode) if cache is not None and cache.is_cacheable(llm) else None
+        cached = cache.get(cache_key) if cache_key is not None else None
+
         t0 = time()
-        with get_openai_callback() as cb:
-            agent_response = llm(messages).content
+        if cached is not None:
+            agent_response, completion_tokens, total_cost = cached
+            info["cached"] = True
+
+        elif stream:
+            # Streamed call, the API doesn't report the usage so the completion tokens and the cost are counted with the tokenizer.
+            # If it is stopped early the response is the reasoning up to the committed arrow
+            agent_response, info["stopped_early"] = stream_llm(llm, messages, stop_early=stop_early, cancel=cancel)
+            completion_tokens = count_tokens(encoder, agent_response) if encoder is not None else 0
+            total_cost = llm_cost(llm, info.get("prompt_tokens", 0), completion_tokens)
+
+            if cache_key is not None:
+                cache.put(cache_key, agent_response, completion_tokens, total_cost)
+                info["cached"] = False
+
+        else:
+            # LLM call with the callback to get the tokens used reported by the API, if it doesn't report them (e.g. local servers and fake LLMs)
+            # they are counted with the backend's tokenizer. The cost comes from the backend's prices
+            with get_openai_callback() as cb:
+                agent_response = llm(messages).content
+            if cb.total_tokens:
+                prompt_tokens, completion_tokens = cb.prompt_tokens, cb.completion_tokens
+            else:
+                prompt_tokens, completion_tokens = info.get("prompt_tokens", 0), count_tokens(encoder, agent_response) if encoder is not None else 0
+            total_cost = llm_cost(llm, prompt_tokens, completion_tokens)
+
+            if cache_key is not None:
+                cache.put(cache_key, agent_response, completion_tokens, total_cost)
+                info["cached"] = False
         llm_time = time() - t0
 
-        # Getting the direction from the LLM response and the arrow emoji in it
-        if "⬆️" in agent_response:
-            dir = "U"
-        elif "⬇️" in agent_response:
-            dir = "D"
-        elif "⬅️" in agent_response:
-            dir = "L"
-        elif "➡️" in agent_response:
-            dir = "R"
-        else: 
-            dir = None
+        # Getting the direction from the committed arrow emoji of the LLM response, the same one whether it was streamed, stopped early or cached
+        t_parse = time()
+        dir = parse_direction(agent_response)
+
+        # A response arriving after the move's deadline is not added, the fallback policy played instead
+        if conversation is not None and not (cancel is not None and cancel.is_set()):
+            conversation.add_response(agent_response, dir, board_state["turn"])
+        info["parse_time"] = time() - t_parse
         
-        return (dir, agent_response, llm_time, cb.completion_tokens, cb.total_cost)
+        return (dir, agent_response, llm_time, completion_tokens, total_cost, info)
 
     # Test case without calling the LLM API, it will randomly return a direction
     else:
@@ -172,7 +503,7 @@ def get_agent_action(agent, llm, prompt, board_config, board_state, is_test=Fals
         elif agent == 2:
             dir = "U" if randint(0, 1) == 0 else "L"
 
-        return (dir, "Test", 0.5, 0, 0)
+        return (dir, "Test", 0.5, 0, 0, {})
         
 
 
@@ -1,12 +1,33 @@
 import streamlit as st
-from langchain.chat_models import ChatOpenAI
-import tiktoken
 import os
 import dotenv
 
-from game_engine import game_engine
+from game_engine import game_engine, board_config, board_state_0
+from st_observer import StreamlitObserver
 from utils import contributor_card, enric_info
-from agents import AVAILABLE_MODELS, DEFAULT_PROMPT1, DEFAULT_PROMPT2
+from agents import AVAILABLE_MODELS, DEFAULT_PROMPT1, DEFAULT_PROMPT2, compile_prompt, get_board_variables
+from backends import build_agent_llm, model_label, resolve_model
+from prompt_tokens import count_messages_tokens
+
+
+def rendered_prompt_tokens(model, prompt, agent_number):
+    """
+    Receives one of the AVAILABLE_MODELS ids, the prompt dictionary and the agent int number.
+    Returns the input tokens of the prompt rendered with the initial board (with the tokenizer of the model's backend) or None if it can't be counted.
+    """
+
+    backend, model_name = resolve_model(model)
+    encoder = backend.encoder(model_name)
+    if encoder is None:
+        return None
+
+    try:
+        compiled_prompt = compile_prompt(prompt)
+        variables = get_board_variables(board_config, board_state_0, compiled_prompt["input_variables"], agent_number=agent_number)
+        return count_messages_tokens(encoder, compiled_prompt["template"].format_messages(**variables))
+    except (KeyError, ValueError):
+        # The prompt uses a variable that doesn't exist or has unbalanced braces
+        return None
 
 
 dotenv.load_dotenv()
@@ -38,7 +59,7 @@ def main():
 
     with st.sidebar:
 
-        # OpenAI API Key input field (it will be necessary to run the app)
+        # OpenAI API Key input field (only necessary to play with the OpenAI models)
         openai_api_key = os.getenv("OPENAI_API_KEY") if os.getenv("OPENAI_API_KEY") is not None else ""  # only for development environment, otherwise it should return None
         user_api_key = st.text_input("Introduce your OpenAI API Key (https://platform.openai.com/)", value=openai_api_key, type="password")
         if user_api_key != "":
@@ -64,6 +85,9 @@ def main():
     with st.expander("### Instructions:"):
         st.write("- This is a 1vs1 snake game where two LLM Agents are playing against each other. You can either modify the model and/or the prompt for each Agent.")
         st.write("- The following variables are available for the prompt, updated at each turn, in order to make the agent aware of the current situation: `{emojis_board}`, `{chars_board}`, `{board_state_str}`. It's not necessary to use all of them, it would take longer and spend more tokens")
+        st.write("- Compact variables are also available to spend fewer tokens: `{rle_board}` (the chars board with every run of equal cells as its length and char, e.g. `02 2_3gG9_`), `{sparse_board}` (only the occupied cells as x,y coordinates) and `{diff_board}` (only the changes since the previous turn).")
+        st.write("- `{safe_moves}` lists your snake's moves that don't hit a wall or a body, e.g. `Safe moves: ⬆️ ➡️ (➡️ can collide head to head with the opponent)`.")
+        st.write("- With an input tokens budget, the `{emojis_board}` and `{chars_board}` variables are replaced by `{rle_board}` and `{board_state_str}` by `{sparse_board}` in the turns where the prompt would exceed it.")
         
         cols_inst = st.columns(2)
         with cols_inst[0]:
@@ -128,53 +152,55 @@ def main():
     
     # --- User inputs ---
 
-    # Checking if the user has introduced the OpenAI API Key, if not, a warning is displayed
-    if openai_api_key == "" or openai_api_key is None or "sk-" not in openai_api_key:
+    cols0 = st.columns([3, 1, 3])
+
+    # Agent 1 (left side, green snake) configuration
+    with cols0[0]:
+        model1 = st.selectbox("Select the LLM-1", options=AVAILABLE_MODELS, index=0, format_func=model_label)
+        llm1_temp = st.slider("LLM-1 temperature", min_value=0.0, max_value=1.0, value=0.5, step=0.05)
+
+        with st.expander("Prompt for the Agent-1"):
+            prompt1 = {
+                "sys_msg": st.text_area("System Message (opt.)", value=DEFAULT_PROMPT1[0], height=120, key="prompt1_sys_msg"),
+                "human_msg": st.text_area("Human Message", value=DEFAULT_PROMPT1[1], height=120, key="prompt1_human_msg"),
+            }
+
+            # The backend's tokenizer allows to count the number of tokens of the rendered prompt before doing any API call
+            prompt1_tokens = rendered_prompt_tokens(model1, prompt1, 1)
+            st.write(f"Input tokens per turn: `{prompt1_tokens if prompt1_tokens is not None else '?'}` (with the initial board)")
+            budget1 = st.number_input("Input tokens budget per turn (0 for no budget)", min_value=0, value=0, step=50, key="budget1")
+            stop_early1 = st.checkbox("Stream the response and stop it once the move is chosen (arrow emoji + space)", value=False, key="stop_early1")
+            safe_moves1 = st.checkbox("Play the forced moves without calling the LLM and correct the moves that hit a wall or a body", value=False, key="safe_moves1")
+
+    # VS sign
+    with cols0[1]:
+        st.markdown("<h1 style='text-align:center'> - vs - </h1>", unsafe_allow_html=True)
+
+    # Agent 2 (right side, blue snake) configuration
+    with cols0[2]:
+        model2 = st.selectbox("Select the LLM-2", options=AVAILABLE_MODELS, index=0, format_func=model_label)
+        llm2_temp = st.slider("LLM-2 temperature", min_value=0.0, max_value=1.0, value=0.5, step=0.05)
+
+        with st.expander("Prompt for the Agent-2"):
+            prompt2 = {
+                "sys_msg": st.text_area("System Message (opt.)", value=DEFAULT_PROMPT2[0], height=120, key="prompt2_sys_msg"),
+                "human_msg": st.text_area("Human Message", value=DEFAULT_PROMPT2[1], height=120, key="prompt2_human_msg"),
+            }
+
+            # The backend's tokenizer allows to count the number of tokens of the rendered prompt before doing any API call
+            prompt2_tokens = rendered_prompt_tokens(model2, prompt2, 2)
+            st.write(f"Input tokens per turn: `{prompt2_tokens if prompt2_tokens is not None else '?'}` (with the initial board)")
+            budget2 = st.number_input("Input tokens budget per turn (0 for no budget)", min_value=0, value=0, step=50, key="budget2")
+            stop_early2 = st.checkbox("Stream the response and stop it once the move is chosen (arrow emoji + space)", value=False, key="stop_early2")
+            safe_moves2 = st.checkbox("Play the forced moves without calling the LLM and correct the moves that hit a wall or a body", value=False, key="safe_moves2")
+
+
+    # Only the OpenAI models need the API Key, the local servers, the fake LLM and the bots can play without it
+    needs_api_key = any(resolve_model(model)[0].needs_api_key for model in (model1, model2))
+    missing_api_key = needs_api_key and (openai_api_key == "" or openai_api_key is None or "sk-" not in openai_api_key)
+    if missing_api_key:
         st.write("#")
-        st.warning("⬅️ Please introduce your OpenAI API Key to continue...")
-
-    else:
-        cols0 = st.columns([3, 1, 3])
-
-        # Agent 1 (left side, green snake) configuration
-        with cols0[0]:
-            model1 = st.selectbox("Select the LLM-1", options=AVAILABLE_MODELS, index=0)
-            llm1_temp = st.slider("LLM-1 temperature", min_value=0.0, max_value=1.0, value=0.5, step=0.05)
-            
-            # Defining the tiktoken encoder for the selected model
-            encoding1 = tiktoken.encoding_for_model(model1.split(" ")[1] if model1.split(" ")[1] != "gpt-4o-2024-05-13" else "gpt-4-1106-preview")
-            llm1 = ChatOpenAI(temperature=llm1_temp, openai_api_key=openai_api_key, model_name=model1.split(" ")[1])
-
-            with st.expander("Prompt for the Agent-1"):
-                prompt1 = {
-                    "sys_msg": st.text_area("System Message (opt.)", value=DEFAULT_PROMPT1[0], height=120, key="prompt1_sys_msg"),
-                    "human_msg": st.text_area("Human Message", value=DEFAULT_PROMPT1[1], height=120, key="prompt1_human_msg"),
-                }
-
-                # Tiktoken allows to count the number of tokens of the prompt template before doing any API call
-                st.write(f"Input tokens: `{len(encoding1.encode(prompt1['human_msg'] + prompt1['sys_msg']))}` + variables tokens")
-
-        # VS sign
-        with cols0[1]:
-            st.markdown("<h1 style='text-align:center'> - vs - </h1>", unsafe_allow_html=True)
-
-        # Agent 2 (right side, blue snake) configuration
-        with cols0[2]:
-            model2 = st.selectbox("Select the LLM-2", options=AVAILABLE_MODELS, index=0)
-            llm2_temp = st.slider("LLM-2 temperature", min_value=0.0, max_value=1.0, value=0.5, step=0.05)
-            
-            # Defining the tiktoken encoder for the selected model
-            encoding2 = tiktoken.encoding_for_model(model2.split(" ")[1] if model2.split(" ")[1] != "gpt-4o-2024-05-13" else "gpt-4-1106-preview")
-            llm2 = ChatOpenAI(temperature=llm2_temp, openai_api_key=openai_api_key, model_name=model2.split(" ")[1])
-
-            with st.expander("Prompt for the Agent-2"):
-                prompt2 = {
-                    "sys_msg": st.text_area("System Message (opt.)", value=DEFAULT_PROMPT2[0], height=120, key="prompt2_sys_msg"),
-                    "human_msg": st.text_area("Human Message", value=DEFAULT_PROMPT2[1], height=120, key="prompt2_human_msg"),
-                }
-
-                # Tiktoken allows to count the number of tokens of the prompt template before doing any API call
-                st.write(f"Input tokens: `{len(encoding2.encode(prompt2['human_msg'] + prompt2['sys_msg']))}` + variables tokens")
+        st.warning("⬅️ Please introduce your OpenAI API Key to play with the OpenAI models...")
 
 
     # --- Game display ---
@@ -185,8 +211,8 @@ def main():
     cols1 = st.columns([5, 2, 2, 5])
 
     with cols1[1]:
-        # Checking if the user has introduced the OpenAI API Key, if not, the game cannot start
-        if openai_api_key == "" or openai_api_key is None or "sk-" not in openai_api_key:
+        # Checking if the user has introduced the OpenAI API Key when an OpenAI model is selected, if not, the game cannot start
+        if missing_api_key:
             is_start = False
             st.write("#")
 
@@ -220,14 +246,15 @@ def main():
 
     # Starting the game loop when the Play button is pressed
     if is_start:
-        game_engine(llm1=llm1, 
-                    llm2=llm2, 
-                    prompt1=prompt1,
-                    prompt2=prompt2,
-                    board_imgs_space=board_imgs_space, 
-                    turn_counter=turn_counter,
-                    plots_space=plots_space,
-                    agents_spaces=[agent1_space, agent2_space]
+        # The model's backend builds the agent: a shared LLM client, or the policy of a scripted bot
+        agent1 = build_agent_llm(model1, llm1_temp, prompt1, openai_api_key)
+        agent2 = build_agent_llm(model2, llm2_temp, prompt2, openai_api_key)
+        game_engine(agent1={**agent1, "token_budget": budget1 or None, "stream": stop_early1, "stop_early": stop_early1, "skip_forced": safe_moves1, "correct_moves": safe_moves1}, 
+                    agent2={**agent2, "token_budget": budget2 or None, "stream": stop_early2, "stop_early": stop_early2, "skip_forced": safe_moves2, "correct_moves": safe_moves2}, 
+                    observers=[StreamlitObserver(board_imgs_space=board_imgs_space, 
+                                                 turn_counter=turn_counter,
+                                                 plots_space=plots_space,
+                                                 agents_spaces=[agent1_space, agent2_space])]
                     )
 
 
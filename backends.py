@@ -0,0 +1,250 @@
+import os
+import re
+import hashlib
+from typing import Any, List, Optional
+
+from langchain.chat_models import ChatOpenAI
+from langchain.chat_models.base import BaseChatModel
+from langchain.callbacks.openai_info import MODEL_COST_PER_1K_TOKENS, standardize_model_name
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, ChatResult
+
+from bots import BOT_POLICIES
+from llm_client import get_client
+from prompt_tokens import get_encoder
+
+
+# --- Fake LLM ---
+
+class DeterministicFakeChatModel(BaseChatModel):
+    """
+    Offline chat model for tests and benchmarks: the response only depends on the messages (a hash of them chooses the arrow),
+    so the same prompt always gets the same answer, and it takes no time.
+    """
+
+    model_name: str = "deterministic"
+    temperature: float = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-deterministic"
+
+
+    def respond(self, messages):
+        arrows = ["⬆️", "⬇️", "⬅️", "➡️"]
+        digest = hashlib.sha256("".join(message.content for message in messages).encode("utf-8")).digest()
+        return f"Deterministic move {arrows[digest[0] % 4]} "
+
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.respond(messages)))])
+
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return self._generate(messages, stop=stop)
+
+
+class SimpleEncoder:
+    """
+    Offline tokenizer approximation (words, numbers and every other symbol are one token), with the encode() method of the tiktoken encodings.
+    """
+
+    pattern = re.compile(r"\w+|[^\w\s]")
+
+    def encode(self, text):
+        return self.pattern.findall(text)
+
+
+# --- Backends ---
+
+class OpenAIBackend:
+    """
+    OpenAI chat models: tiktoken tokenizer and the langchain OpenAI prices plus the ones of the newer models.
+    """
+
+    name = "openai"
+    needs_api_key = True
+    runs_locally = False
+
+    models = {
+        "gpt-4o-2024-05-13": "GPT-4o",
+        "gpt-4-1106-preview": "GPT-4 Turbo",
+        "gpt-3.5-turbo": "gpt-3.5-turbo",
+        "gpt-4": "gpt-4",
+    }
+
+    # $ per 1K (input, completion) tokens of the models missing in the langchain prices table
+    prices = {
+        "gpt-4o-2024-05-13": (0.005, 0.015),
+        "gpt-4-1106-preview": (0.01, 0.03),
+    }
+
+
+    def chat_model(self, model_name, temperature, api_key):
+        # The langchain retries are disabled as the shared client retries itself
+        return ChatOpenAI(temperature=temperature, openai_api_key=api_key, model_name=model_name, max_retries=1)
+
+
+    def encoder(self, model_name):
+        return get_encoder(model_name)
+
+
+    def price(self, model_name):
+        if model_name in self.prices:
+            return self.prices[model_name]
+
+        input_name, completion_name = standardize_model_name(model_name), standardize_model_name(model_name, is_completion=True)
+        if input_name in MODEL_COST_PER_1K_TOKENS and completion_name in MODEL_COST_PER_1K_TOKENS:
+            return MODEL_COST_PER_1K_TOKENS[input_name], MODEL_COST_PER_1K_TOKENS[completion_name]
+
+        return 0, 0
+
+
+    def cost(self, model_name, prompt_tokens, completion_tokens):
+        input_price, completion_price = self.price(model_name)
+        return (prompt_tokens * input_price + completion_tokens * completion_price) / 1000
+
+
+    def build_agent(self, model_name, temperature, prompt, api_key=None):
+        return {"llm": get_client(self, model_name, temperature, api_key), "prompt": prompt}
+
+
+class LocalBackend(OpenAIBackend):
+    """
+    Any OpenAI-compatible inference server (vLLM, llama.cpp, Ollama...) at LOCAL_LLM_BASE_URL, serving the models listed in LOCAL_LLM_MODELS
+    (comma separated, any other name can also be used). Tokens are approximated with the cl100k encoding and the calls are free.
+    """
+
+    name = "local"
+    needs_api_key = False
+    prices = {}
+
+
+    def __init__(self):
+        self.base_url = os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:8000/v1")
+        self.models = {model: model for model in os.getenv("LOCAL_LLM_MODELS", "").split(",") if model}
+
+
+    def chat_model(self, model_name, temperature, api_key):
+        return ChatOpenAI(temperature=temperature, openai_api_key=api_key or "not-needed", openai_api_base=self.base_url, model_name=model_name, max_retries=1)
+
+
+    def encoder(self, model_name):
+        return get_encoder("cl100k_base")
+
+
+    def price(self, model_name):
+        return 0, 0
+
+
+class FakeBackend(OpenAIBackend):
+    """
+    Deterministic fake LLM to test the whole arena offline (prompts, caches, token accounting, UI) without any API call.
+    """
+
+    name = "fake"
+    needs_api_key = False
+    runs_locally = True
+    models = {"deterministic": "Deterministic fake LLM"}
+    prices = {}
+
+
+    def chat_model(self, model_name, temperature, api_key):
+        return DeterministicFakeChatModel(model_name=model_name, temperature=temperature)
+
+
+    def encoder(self, model_name):
+        return SimpleEncoder()
+
+
+    def price(self, model_name):
+        return 0, 0
+
+
+class BotBackend:
+    """
+    Scripted local bots, they play through the agents' "policy" function without any prompt or LLM.
+    """
+
+    name = "bot"
+    needs_api_key = False
+    runs_locally = True
+    models = {"heuristic": "Greedy bot", "flood_fill": "Flood fill bot", "expectimax": "Expectimax bot"}
+    policies = BOT_POLICIES
+
+
+    def encoder(self, model_name):
+        return None
+
+
+    def cost(self, model_name, prompt_tokens, completion_tokens):
+        return 0
+
+
+    def build_agent(self, model_name, temperature, prompt, api_key=None):
+        return {"policy": self.policies[model_name], "prompt": prompt}
+
+
+BACKENDS = {backend.name: backend for backend in [OpenAIBackend(), LocalBackend(), FakeBackend(), BotBackend()]}
+
+
+# --- Models ---
+
+def resolve_model(model):
+    """
+    Receives a model id "backend:model_name" (e.g. "openai:gpt-4", "local:llama3", "bot:heuristic")
+    or one of the former "openai gpt-4o-2024-05-13 (GPT-4o)" strings.
+    Returns the backend and the model name.
+    """
+
+    if ":" in model:
+        backend_name, model_name = model.split(":", 1)
+    else:
+        backend_name, model_name = model.split(" ")[:2]
+
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend_name} in {model}, it must be one of {list(BACKENDS)}")
+
+    return BACKENDS[backend_name], model_name
+
+
+def model_id(model):
+    """
+    Receives a model id or one of the former model strings.
+    Returns its canonical "backend:model_name" id, the key of the per-model limits.
+    """
+
+    backend, model_name = resolve_model(model)
+    return f"{backend.name}:{model_name}"
+
+
+def available_models():
+    """
+    Returns the ids of the models of every backend.
+    """
+
+    return [f"{backend.name}:{model_name}" for backend in BACKENDS.values() for model_name in backend.models]
+
+
+def model_label(model):
+    backend, model_name = resolve_model(model)
+    return f"{backend.name} {backend.models.get(model_name, model_name)}"
+
+
+def build_agent_llm(model, temperature, prompt, api_key=None):
+    """
+    Receives a model id, the temperature, the prompt dictionary and the API key.
+    Returns the base agent config of the model's backend: {"llm", "prompt"} with the shared LLM client, or {"policy", "prompt"} for the scripted bots.
+    """
+
+    backend, model_name = resolve_model(model)
+    return backend.build_agent(model_name, temperature, prompt, api_key)
+
+
+def llm_cost(llm, prompt_tokens, completion_tokens):
+    """
+    Receives the LLM client and the input and completion tokens of a call.
+    Returns its cost in $ with the prices of the client's backend (OpenAI prices for plain langchain models).
+    """
+
+    backend = getattr(llm, "backend", None) or BACKENDS["openai"]
+    return backend.cost(getattr(llm, "model_name", None) or "", prompt_tokens, completion_tokens)
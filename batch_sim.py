@@ -0,0 +1,245 @@
+import argparse
+from time import time
+import numpy as np
+
+from game_engine import board_config, board_state_0
+from game_state import EMPTY, FOOD, SNAKE1, SNAKE2
+
+
+# Directions as integers in the batched arrays, -1 means no action (keep the current direction)
+DIRS = ["U", "D", "L", "R"]
+DIR_TO_INT = {dir: i for i, dir in enumerate(DIRS)}
+DELTA_X = np.array([0, 0, -1, 1])
+DELTA_Y = np.array([-1, 1, 0, 0])
+
+# Winners as integers
+DRAW = 0
+AGENT1 = 1
+AGENT2 = 2
+
+
+class BatchSimulator:
+    """
+    Simulates B independent games in lockstep with NumPy arrays, following the same rules as game_engine (GameState.play_turn()):
+    - grid: (B, G, G) int8 occupancy grid with the game_state cell codes
+    - body: (B, 2, C) ring buffers with the cells (y * G + x) of every snake, head at head_idx and length cells from it
+    - head_x, head_y: (B, 2) head positions (they can be out of the board when a snake hits a wall)
+    - dirs: (B, 2) directions as indices of DIRS, alive: (B, 2), done: (B,), turn: (B,)
+    It doesn't call any LLM, it is meant for scripted baselines and to test rule changes with thousands of games per second.
+    """
+
+    def __init__(self, n_games, board_config=board_config, board_state_0=board_state_0, seed=None):
+        self.n_games = n_games
+        self.grid_size = board_config["GRID_SIZE"]
+        self.max_turns = board_config["MAX_TURNS"]
+        self.capacity = self.grid_size * self.grid_size + 1
+        self.rng = np.random.default_rng(seed)
+
+        G, B = self.grid_size, n_games
+        self.grid = np.zeros((B, G, G), dtype=np.int8)
+        self.body = np.zeros((B, 2, self.capacity), dtype=np.int32)
+        self.head_idx = np.zeros((B, 2), dtype=np.int64)
+        self.length = np.zeros((B, 2), dtype=np.int64)
+        self.head_x = np.zeros((B, 2), dtype=np.int64)
+        self.head_y = np.zeros((B, 2), dtype=np.int64)
+        self.dirs = np.zeros((B, 2), dtype=np.int64)
+        self.alive = np.ones((B, 2), dtype=bool)
+        self.done = np.zeros(B, dtype=bool)
+        self.turn = np.full(B, board_state_0["turn"], dtype=np.int64)
+        self.food_count = np.zeros(B, dtype=np.int64)
+
+        # Every game starts from the same initial state
+        for s, (snake_id, code) in enumerate([("snake1", SNAKE1), ("snake2", SNAKE2)]):
+            snake_body = board_state_0[snake_id]["body"]
+            cells = [y * G + x for x, y in snake_body]
+            self.body[:, s, :len(cells)] = cells
+            self.length[:, s] = len(cells)
+            self.head_x[:, s], self.head_y[:, s] = snake_body[0]
+            self.dirs[:, s] = DIR_TO_INT[board_state_0[snake_id]["dir"]]
+            self.alive[:, s] = board_state_0[snake_id]["is_alive"]
+            for x, y in snake_body:
+                self.grid[:, y, x] = code
+
+        for x, y in board_state_0["food"]:
+            self.grid[:, y, x] = FOOD
+        self.food_count[:] = len(board_state_0["food"])
+
+
+    # --- Game rules ---
+
+    def place_food(self, games):
+        """
+        Places one food in a uniformly random empty cell of every given game (games without empty cells are skipped).
+        """
+
+        if len(games) == 0:
+            return
+
+        flat = self.grid[games].reshape(len(games), -1)
+        keys = self.rng.random(flat.shape)
+        keys[flat != EMPTY] = -1
+        cells = keys.argmax(axis=1)
+
+        has_free = keys[np.arange(len(games)), cells] >= 0
+        games, cells = games[has_free], cells[has_free]
+
+        self.grid[games, cells // self.grid_size, cells % self.grid_size] = FOOD
+        self.food_count[games] += 1
+
+
+    def begin_turn(self):
+        """
+        Starts a new turn in the active games: increments the turn counter and places a food while there are less than 2.
+        Returns the indices of the active games.
+        """
+
+        active = np.nonzero(~self.done)[0]
+        self.turn[active] += 1
+        self.place_food(active[self.food_count[active] < 2])
+
+        return active
+
+
+    def move_snake(self, games, s):
+        """
+        Moves the snake s (0 or 1) of the given games one cell: the tail is removed from the grid unless the new head eats a food.
+        The new head is not written yet so the collisions are checked against both bodies after moving.
+        Returns the new heads' x, y and whether they are in the board.
+        """
+
+        G = self.grid_size
+        new_x = self.head_x[games, s] + DELTA_X[self.dirs[games, s]]
+        new_y = self.head_y[games, s] + DELTA_Y[self.dirs[games, s]]
+        in_bounds = (new_x >= 0) & (new_x < G) & (new_y >= 0) & (new_y < G)
+
+        clip_x, clip_y = np.clip(new_x, 0, G - 1), np.clip(new_y, 0, G - 1)
+        eats = in_bounds & (self.grid[games, clip_y, clip_x] == FOOD)
+
+        # Eating: the food is removed and the snake grows
+        self.grid[games[eats], clip_y[eats], clip_x[eats]] = EMPTY
+        self.food_count[games[eats]] -= 1
+
+        # Not eating: the tail is removed
+        pops = games[~eats]
+        tail_idx = (self.head_idx[pops, s] + self.length[pops, s] - 1) % self.capacity
+        tail = self.body[pops, s, tail_idx]
+        self.grid[pops, tail // G, tail % G] = EMPTY
+        self.length[pops, s] -= 1
+
+        return new_x, new_y, in_bounds
+
+
+    def step(self, actions):
+        """
+        Receives a (B, 2) array with the actions of both snakes in every game as indices of DIRS (-1 keeps the current direction).
+        Moves both snakes of the active games, checks the collisions and updates the alive and done flags.
+        Returns the indices of the games that were played in this step.
+        """
+
+        G = self.grid_size
+        games = np.nonzero(~self.done)[0]
+        actions = np.asarray(actions)[games]
+
+        self.dirs[games] = np.where(actions >= 0, actions, self.dirs[games])
+
+        x1, y1, in_bounds1 = self.move_snake(games, 0)
+        x2, y2, in_bounds2 = self.move_snake(games, 1)
+
+        # Check if game is over: out of the board, any snake's body or both heads in the same cell
+        same_cell = (x1 == x2) & (y1 == y2)
+        cell1 = self.grid[games, np.clip(y1, 0, G - 1), np.clip(x1, 0, G - 1)]
+        cell2 = self.grid[games, np.clip(y2, 0, G - 1), np.clip(x2, 0, G - 1)]
+        is_dead1 = ~in_bounds1 | (cell1 == SNAKE1) | (cell1 == SNAKE2) | same_cell
+        is_dead2 = ~in_bounds2 | (cell2 == SNAKE1) | (cell2 == SNAKE2) | same_cell
+
+        # Adding the new heads to the bodies and the grid
+        for s, (x, y, in_bounds, code) in enumerate([(x1, y1, in_bounds1, SNAKE1), (x2, y2, in_bounds2, SNAKE2)]):
+            self.head_idx[games, s] = (self.head_idx[games, s] - 1) % self.capacity
+            self.body[games, s, self.head_idx[games, s]] = np.clip(y, 0, G - 1) * G + np.clip(x, 0, G - 1)
+            self.length[games, s] += 1
+            self.head_x[games, s], self.head_y[games, s] = x, y
+            self.grid[games[in_bounds], y[in_bounds], x[in_bounds]] = code
+
+        self.alive[games, 0] &= ~is_dead1
+        self.alive[games, 1] &= ~is_dead2
+        self.done[games] = is_dead1 | is_dead2 | (self.turn[games] >= self.max_turns)
+
+        return games
+
+
+    def winners(self):
+        """
+        Returns a (B,) array with the winner of every game (DRAW, AGENT1 or AGENT2) with the same rules as game_engine.get_winner().
+        """
+
+        alive1, alive2 = self.alive[:, 0], self.alive[:, 1]
+        length1, length2 = self.length[:, 0], self.length[:, 1]
+
+        winners = np.full(self.n_games, DRAW)
+        winners[(alive1 & alive2 & (length1 > length2)) | (alive1 & ~alive2)] = AGENT1
+        winners[(alive1 & alive2 & (length2 > length1)) | (alive2 & ~alive1)] = AGENT2
+
+        return winners
+
+
+    def to_dict(self, game):
+        """
+        Receives the index of a game.
+        Returns its board state dictionary (the food list is ordered by position as the batch only keeps food in the grid).
+        """
+
+        G = self.grid_size
+        board_state = {"turn": int(self.turn[game])}
+        for s, snake_id in enumerate(["snake1", "snake2"]):
+            idx = (self.head_idx[game, s] + np.arange(self.length[game, s])) % self.capacity
+            cells = self.body[game, s, idx]
+            body = [(int(c % G), int(c // G)) for c in cells]
+            body[0] = (int(self.head_x[game, s]), int(self.head_y[game, s]))
+            board_state[snake_id] = {"body": body, "dir": DIRS[self.dirs[game, s]], "is_alive": bool(self.alive[game, s])}
+
+        ys, xs = np.nonzero(self.grid[game] == FOOD)
+        board_state["food"] = [(int(x), int(y)) for x, y in zip(xs, ys)]
+
+        return board_state
+
+
+    # --- Main function ---
+
+    def play(self, policy1, policy2):
+        """
+        Receives the vectorized policies of both snakes: functions (simulator, snake index) -> (B,) array of actions.
+        Plays every game until it is over or reaches MAX_TURNS and returns the winners array.
+        """
+
+        while not self.done.all():
+            self.begin_turn()
+            actions = np.stack([policy1(self, 0), policy2(self, 1)], axis=1)
+            self.step(actions)
+
+        return self.winners()
+
+
+def random_test_policy(sim, s):
+    """
+    Vectorized version of the test agent in agents.get_agent_action(): snake1 goes down or right and snake2 up or left at random.
+    """
+
+    choices = np.array([[DIR_TO_INT["D"], DIR_TO_INT["R"]], [DIR_TO_INT["U"], DIR_TO_INT["L"]]])
+
+    return choices[s][sim.rng.integers(0, 2, size=sim.n_games)]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Play a batch of games between the random test agents without calling any LLM.")
+    parser.add_argument("--n-games", type=int, default=10000, help="Number of games played in lockstep")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random generator")
+    args = parser.parse_args()
+
+    t0 = time()
+    sim = BatchSimulator(args.n_games, seed=args.seed)
+    winners = sim.play(random_test_policy, random_test_policy)
+    elapsed = time() - t0
+
+    print(f"{args.n_games} games in {elapsed:.2f} s ({args.n_games / elapsed:.0f} games/s), mean turns: {sim.turn.mean():.1f}")
+    print(f"Agent 1: {(winners == AGENT1).mean():.1%} - Agent 2: {(winners == AGENT2).mean():.1%} - Draw: {(winners == DRAW).mean():.1%}")
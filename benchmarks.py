@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import platform
+import sys
+import tempfile
+from datetime import datetime, timezone
+from random import Random
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from game_engine import game_engine, board_config, board_state_0
+from game_state import GameState
+from agents import board_to_char, DEFAULT_PROMPT1, DEFAULT_PROMPT2
+from backends import build_agent_llm
+from board_plot import board_plot
+from run_matches import run_matches
+
+
+# Rendering configurations benchmarked: (GRID_SIZE, SQUARE_SIZE)
+RENDER_SIZES = [(10, 35), (15, 20), (15, 35), (25, 35)]
+
+# Ratios of occupied cells of the crowded boards
+CROWDED_FILLS = [0.5, 0.9, 0.99]
+
+# A result slower than the baseline by more than this ratio is a regression
+DEFAULT_TOLERANCE = 0.2
+
+BENCHMARK_SEED = 1234
+
+
+# --- Utils ---
+
+def measure(fn, min_time=0.2, repeat=5):
+    """
+    Receives a function without arguments, the minimum time of every measurement in seconds and the number of measurements.
+    Calls it in loops of n calls (n calibrated so a loop lasts at least min_time).
+    Returns the best and the median calls per second of the loops (the best one is the least disturbed by the rest of the machine).
+    """
+
+    n = 1
+    while True:
+        t0 = perf_counter()
+        for _ in range(n):
+            fn()
+        elapsed = perf_counter() - t0
+        if elapsed >= min_time:
+            break
+        n = max(n * 2, int(n * min_time / max(elapsed, 1e-9)))
+
+    rates = [n / elapsed]
+    for _ in range(repeat - 1):
+        t0 = perf_counter()
+        for _ in range(n):
+            fn()
+        rates.append(n / (perf_counter() - t0))
+
+    return max(rates), float(np.median(rates))
+
+
+def crowded_board_state(grid_size, fill, seed=BENCHMARK_SEED):
+    """
+    Receives the board size, the ratio of cells occupied by the snakes and a seed.
+    Returns a board state with both snakes winding through the rows (snake1 from the top, snake2 from the bottom) covering that ratio of the board
+    and two food cells in random free cells.
+    """
+
+    # Cells of the board in a zig-zag path through the rows, every snake is a contiguous part of it
+    path = [(x if y % 2 == 0 else grid_size - 1 - x, y) for y in range(grid_size) for x in range(grid_size)]
+    length = max(2, int(fill * grid_size * grid_size) // 2)
+    body1 = path[:length][::-1]
+    body2 = path[::-1][:length][::-1]
+
+    occupied = set(body1) | set(body2)
+    free = [pos for pos in path if pos not in occupied]
+    food = Random(seed).sample(free, min(2, len(free)))
+
+    def head_dir(body):
+        dx, dy = body[0][0] - body[1][0], body[0][1] - body[1][1]
+        return {(0, -1): "U", (0, 1): "D", (-1, 0): "L", (1, 0): "R"}[(dx, dy)]
+
+    return {
+        "turn": 50,
+        "snake1": {"body": body1, "dir": head_dir(body1), "is_alive": True},
+        "snake2": {"body": body2, "dir": head_dir(body2), "is_alive": True},
+        "food": food,
+    }
+
+
+def fake_agents():
+    """
+    Returns two agents with the deterministic fake LLM (no API call) whose unsafe moves are corrected, so the matches last as long as real ones.
+    """
+
+    prompts = [{"sys_msg": DEFAULT_PROMPT1[0], "human_msg": DEFAULT_PROMPT1[1]}, {"sys_msg": DEFAULT_PROMPT2[0], "human_msg": DEFAULT_PROMPT2[1]}]
+    return [{**build_agent_llm("fake:deterministic", temperature, prompt), "correct_moves": True} for temperature, prompt in zip([0, 0.5], prompts)]
+
+
+# --- Benchmarks ---
+
+def bench_game_loop(min_time, repeat):
+    """
+    Turns per second of the game loop with two fake LLM agents (prompt rendering, token counting, parsing, moves and history), without observers.
+    """
+
+    agent1, agent2 = fake_agents()
+
+    # The fake LLM and the seed make every match identical, whole matches are measured and converted to turns
+    _, game_history = game_engine(board_config, board_state_0, agent1, agent2, observers=[], seed=BENCHMARK_SEED)
+    turns_per_match = len(game_history) - 1
+
+    best, median = measure(lambda: game_engine(board_config, board_state_0, agent1, agent2, observers=[], seed=BENCHMARK_SEED), min_time, repeat)
+
+    return {"game_loop": {"unit": "turns/s", "value": best * turns_per_match, "median": median * turns_per_match}}
+
+
+def bench_board_plot(min_time, repeat):
+    """
+    Frames per second of board_plot() for every (GRID_SIZE, SQUARE_SIZE) of RENDER_SIZES, with a board half occupied by the snakes.
+    """
+
+    results = {}
+    for grid_size, square_size in RENDER_SIZES:
+        config = {**board_config, "GRID_SIZE": grid_size, "SQUARE_SIZE": square_size}
+        board_state = crowded_board_state(grid_size, 0.5)
+        best, median = measure(lambda: board_plot(config, board_state), min_time, repeat)
+        results[f"board_plot_{grid_size}x{grid_size}_{square_size}px"] = {"unit": "frames/s", "value": best, "median": median}
+
+    return results
+
+
+def bench_board_to_char(min_time, repeat):
+    """
+    Boards per second of board_to_char() in emojis and characters, from the board state dict and from the GameState occupancy grid.
+    """
+
+    board_state = crowded_board_state(board_config["GRID_SIZE"], 0.5)
+    game_state = GameState(board_config, board_state)
+
+    results = {}
+    for chars_type in ["emojis", "_GBR"]:
+        for source, state in [("dict", None), ("grid", game_state)]:
+            best, median = measure(lambda: board_to_char(board_config, board_state, chars_type=chars_type, game_state=state), min_time, repeat)
+            results[f"board_to_char_{chars_type.strip('_').lower()}_{source}"] = {"unit": "boards/s", "value": best, "median": median}
+
+    return results
+
+
+def bench_place_food(min_time, repeat):
+    """
+    Food placements per second on boards with CROWDED_FILLS of their cells occupied by the snakes.
+    """
+
+    results = {}
+    for fill in CROWDED_FILLS:
+        game_state = GameState(board_config, crowded_board_state(board_config["GRID_SIZE"], fill), seed=BENCHMARK_SEED)
+        best, median = measure(game_state.place_food, min_time, repeat)
+        results[f"place_food_{int(fill * 100)}pct"] = {"unit": "calls/s", "value": best, "median": median}
+
+    return results
+
+
+def bench_matches(min_time, repeat):
+    """
+    End to end matches per second of run_matches() in headless mode (replay files and results written to a temporary directory),
+    between a fake LLM agent and the heuristic bot.
+    """
+
+    agent1 = fake_agents()[0]
+    agent2 = build_agent_llm("bot:heuristic", 0, None)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        def play():
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_matches(agent1, agent2, 1, out_dir, seed=BENCHMARK_SEED)
+
+        best, median = measure(play, min_time, repeat)
+
+    return {"matches": {"unit": "matches/s", "value": best, "median": median}}
+
+
+BENCHMARKS = {
+    "game_loop": bench_game_loop,
+    "board_plot": bench_board_plot,
+    "board_to_char": bench_board_to_char,
+    "place_food": bench_place_food,
+    "matches": bench_matches,
+}
+
+
+# --- Main functions ---
+
+def run_benchmarks(names=None, min_time=0.2, repeat=5):
+    """
+    Receives the names of the benchmarks to run (all the BENCHMARKS if None), the minimum time of every measurement and the number of measurements.
+    Returns the report: the environment (versions and platform) and the results {name: {unit, value, median}}, higher values are better.
+    """
+
+    # The agents log every prompt at the INFO level, it would be most of the measured time
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+    for name in names or BENCHMARKS:
+        results.update(BENCHMARKS[name](min_time, repeat))
+
+    return {
+        "environment": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(results, baseline_results, tolerance=DEFAULT_TOLERANCE):
+    """
+    Receives the results of this run, the results of the baseline report and the tolerated slowdown ratio.
+    Returns the comparison of every benchmark in both: {name: {value, baseline, ratio, regression}}, a regression is a ratio below 1 - tolerance.
+    """
+
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline_results:
+            continue
+        ratio = result["value"] / baseline_results[name]["value"]
+        comparison[name] = {"value": result["value"], "baseline": baseline_results[name]["value"], "ratio": ratio, "regression": ratio < 1 - tolerance}
+
+    return comparison
+
+
+def format_report(results, comparison=None):
+    """
+    Receives the results and optionally their comparison with the baseline.
+    Returns them as a text table.
+    """
+
+    lines = [f"{'Benchmark':<34} {'value':>12} {'median':>12} {'unit':<10}" + (f" {'baseline':>12} {'ratio':>7}" if comparison is not None else "")]
+    for name, result in results.items():
+        line = f"{name:<34} {result['value']:>12.1f} {result['median']:>12.1f} {result['unit']:<10}"
+        if comparison is not None and name in comparison:
+            flag = "  REGRESSION" if comparison[name]["regression"] else ""
+            line += f" {comparison[name]['baseline']:>12.1f} {comparison[name]['ratio']:>7.2f}{flag}"
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the game loop, the rendering, the prompt encodings and the headless matches offline (fake LLM and bots).")
+    parser.add_argument("--only", nargs="+", default=None, choices=list(BENCHMARKS), help="Benchmarks to run (all by default)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum time of every measurement in seconds")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per benchmark, the best one is reported")
+    parser.add_argument("--out", default=None, help="JSON file to save the report")
+    parser.add_argument("--baseline", default=None, help="JSON report of a previous run to compare with, the exit code is 1 if any benchmark regressed")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Tolerated slowdown ratio against the baseline")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.only, args.min_time, args.repeat)
+
+    comparison = None
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            comparison = compare_to_baseline(report["results"], json.load(f)["results"], args.tolerance)
+        report["comparison"] = comparison
+
+    print(format_report(report["results"], comparison))
+
+    if args.out is not None:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if comparison is not None and any(result["regression"] for result in comparison.values()):
+        sys.exit(1)
@@ -1,13 +1,53 @@
 import cv2
 import numpy as np
-from time import time
 
 
-def board_plot(board_config, board_state, is_display=False, save_dir=None):
-
-    t0 = time()
+# Cache of the pre-rendered board templates, one per board configuration
+_TEMPLATES_CACHE = {}
+
+
+def draw_head(image, square_top_left, SQUARE_SIZE, dir):
+    """
+    Draws the snake's eyes looking to the given direction in the head's square with the given top left corner.
+    """
+
+    radius = SQUARE_SIZE // 5
+
+    # Getting the eyes' coordinates
+    if dir in ["U", "D"]:
+        center1 = (square_top_left[0] + SQUARE_SIZE//4 - 1, square_top_left[1] + SQUARE_SIZE//2)
+        center2 = (square_top_left[0] + 3 * SQUARE_SIZE//4, square_top_left[1] + SQUARE_SIZE//2)
+        if dir == "U":      # Looking up
+            center1pupil = (center1[0], center1[1] - radius//2) 
+            center2pupil = (center2[0], center2[1] - radius//2)
+        elif dir == "D":    # Looking down
+            center1pupil = (center1[0], center1[1] + radius//2) 
+            center2pupil = (center2[0], center2[1] + radius//2)
+
+    elif dir in ["R", "L"]:
+        center1 = (square_top_left[0] + SQUARE_SIZE//2, square_top_left[1] + SQUARE_SIZE//4 - 1)
+        center2 = (square_top_left[0] + SQUARE_SIZE//2, square_top_left[1] + 3 * SQUARE_SIZE//4)
+        if dir == "R":      # Looking right
+            center1pupil = (center1[0] + radius//2, center1[1]) 
+            center2pupil = (center2[0] + radius//2, center2[1])
+        elif dir == "L":    # Looking left
+            center1pupil = (center1[0] - radius//2, center1[1]) 
+            center2pupil = (center2[0] - radius//2, center2[1])
+
+    # Drawing the eyes
+    cv2.circle(image, center1, radius, (200, 200, 200), -1)
+    cv2.circle(image, center2, radius, (200, 200, 200), -1)
+    cv2.circle(image, center1pupil, radius//2, (20, 20, 20), -1)
+    cv2.circle(image, center2pupil, radius//2, (20, 20, 20), -1)
+
+
+def get_board_template(board_config):
+    """
+    Receives the board configuration.
+    Returns the cached template for it: the background image with the grid lines already drawn and the pre-rendered head sprites 
+    (patch, mask and offset from the square's top left corner) for every snake and direction. They are only rendered the first time.
+    """
 
-    # Board config
     GRID_SIZE = board_config["GRID_SIZE"]
     SQUARE_SIZE = board_config["SQUARE_SIZE"]
     LINE_THICKNESS = board_config["LINE_THICKNESS"]
@@ -16,93 +56,146 @@ def board_plot(board_config, board_state, is_display=False, save_dir=None):
     LINES_COLOR = board_config["LINES_COLOR"]
     SNAKE1_COLOR = board_config["SNAKE1_COLOR"]
     SNAKE2_COLOR = board_config["SNAKE2_COLOR"]
-    FOOD_COLOR = board_config["FOOD_COLOR"]
-
-    # Board state
-    turn = board_state["turn"]
-    snake1_body = board_state["snake1"]["body"]
-    snake1_dir = board_state["snake1"]["dir"]
-    snake2_body = board_state["snake2"]["body"]
-    snake2_dir = board_state["snake2"]["dir"]
-    food = board_state["food"]
 
+    key = (GRID_SIZE, SQUARE_SIZE, LINE_THICKNESS, tuple(BACKGROUND_COLOR), tuple(LINES_COLOR), tuple(SNAKE1_COLOR), tuple(SNAKE2_COLOR))
+    if key in _TEMPLATES_CACHE:
+        return _TEMPLATES_CACHE[key]
 
     grid_thickness = GRID_SIZE * SQUARE_SIZE + (GRID_SIZE + 1) * LINE_THICKNESS
 
-    # Create a white background image
-    image = np.ones((grid_thickness, grid_thickness, 3), dtype=np.uint8) * BACKGROUND_COLOR
-    image = image.astype(np.uint8)
+    # Create the background image
+    background = np.empty((grid_thickness, grid_thickness, 3), dtype=np.uint8)
+    background[:, :] = BACKGROUND_COLOR
 
     # Draw the grid lines
-    cv2.line(image, (0, 0), (0, grid_thickness), LINES_COLOR, thickness=LINE_THICKNESS)
-    cv2.line(image, (0, 0), (grid_thickness, 0), LINES_COLOR, thickness=LINE_THICKNESS)
+    cv2.line(background, (0, 0), (0, grid_thickness), LINES_COLOR, thickness=LINE_THICKNESS)
+    cv2.line(background, (0, 0), (grid_thickness, 0), LINES_COLOR, thickness=LINE_THICKNESS)
 
     for i in range(1, GRID_SIZE + 1):
         # Vertical lines
         v_start_point = (i * (SQUARE_SIZE + LINE_THICKNESS), 0)
         v_end_point = (i * (SQUARE_SIZE + LINE_THICKNESS), grid_thickness)
-        cv2.line(image, v_start_point, v_end_point, LINES_COLOR, thickness=LINE_THICKNESS)
+        cv2.line(background, v_start_point, v_end_point, LINES_COLOR, thickness=LINE_THICKNESS)
 
         # Horizontal lines
         h_start_point = (0, i * (SQUARE_SIZE + LINE_THICKNESS))
         h_end_point = (grid_thickness, i * (SQUARE_SIZE + LINE_THICKNESS))
-        cv2.line(image, h_start_point, h_end_point, LINES_COLOR, thickness=LINE_THICKNESS)
-
-    # Function to draw every snake and food square position in the grid
-    def draw_pos(target_pos, color, is_head=False, dir=None):
-
-        # Getting the square's coordinates
-        square_top_left = (target_pos[0] * (SQUARE_SIZE + LINE_THICKNESS) + LINE_THICKNESS, target_pos[1] * (SQUARE_SIZE + LINE_THICKNESS) + LINE_THICKNESS)
-        square_bottom_right = (square_top_left[0] + SQUARE_SIZE - LINE_THICKNESS, square_top_left[1] + SQUARE_SIZE - LINE_THICKNESS)
-        cv2.rectangle(image, square_top_left, square_bottom_right, color, -1)
-        
-        # Drawing the eyes in the head
-        if is_head:
-            radius = SQUARE_SIZE // 5
-
-            # Getting the eyes' coordinates
-            if dir in ["U", "D"]:
-                center1 = (square_top_left[0] + SQUARE_SIZE//4 - 1, square_top_left[1] + SQUARE_SIZE//2)
-                center2 = (square_top_left[0] + 3 * SQUARE_SIZE//4, square_top_left[1] + SQUARE_SIZE//2)
-                if dir == "U":      # Looking up
-                    center1pupil = (center1[0], center1[1] - radius//2) 
-                    center2pupil = (center2[0], center2[1] - radius//2)
-                elif dir == "D":    # Looking down
-                    center1pupil = (center1[0], center1[1] + radius//2) 
-                    center2pupil = (center2[0], center2[1] + radius//2)
-
-            elif dir in ["R", "L"]:
-                center1 = (square_top_left[0] + SQUARE_SIZE//2, square_top_left[1] + SQUARE_SIZE//4 - 1)
-                center2 = (square_top_left[0] + SQUARE_SIZE//2, square_top_left[1] + 3 * SQUARE_SIZE//4)
-                if dir == "R":      # Looking right
-                    center1pupil = (center1[0] + radius//2, center1[1]) 
-                    center2pupil = (center2[0] + radius//2, center2[1])
-                elif dir == "L":    # Looking left
-                    center1pupil = (center1[0] - radius//2, center1[1]) 
-                    center2pupil = (center2[0] - radius//2, center2[1])
-
-            # Drawing the eyes
-            cv2.circle(image, center1, radius, (200, 200, 200), -1)
-            cv2.circle(image, center2, radius, (200, 200, 200), -1)
-            cv2.circle(image, center1pupil, radius//2, (20, 20, 20), -1)
-            cv2.circle(image, center2pupil, radius//2, (20, 20, 20), -1)
+        cv2.line(background, h_start_point, h_end_point, LINES_COLOR, thickness=LINE_THICKNESS)
+
+    # Head sprites, rendered in a canvas with a margin as the eyes could go beyond the square with some configurations
+    margin = SQUARE_SIZE
+    canvas_size = SQUARE_SIZE + 2 * margin
+    heads = {}
+    for snake, color in [(1, SNAKE1_COLOR), (2, SNAKE2_COLOR)]:
+        for dir in ["U", "D", "L", "R"]:
+            patch = np.zeros((canvas_size, canvas_size, 3), dtype=np.uint8)
+            mask = np.zeros((canvas_size, canvas_size), dtype=np.uint8)
+
+            square_bottom_right = (margin + SQUARE_SIZE - LINE_THICKNESS, margin + SQUARE_SIZE - LINE_THICKNESS)
+            cv2.rectangle(patch, (margin, margin), square_bottom_right, color, -1)
+            cv2.rectangle(mask, (margin, margin), square_bottom_right, 255, -1)
+            draw_head(patch, (margin, margin), SQUARE_SIZE, dir)
+            draw_head(mask, (margin, margin), SQUARE_SIZE, dir)
+
+            # Cropping the sprite to the drawn pixels
+            ys, xs = np.nonzero(mask)
+            y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+            heads[(snake, dir)] = {"patch": patch[y0:y1, x0:x1].copy(),
+                                   "mask": mask[y0:y1, x0:x1] > 0,
+                                   "offset": (x0 - margin, y0 - margin)}
+
+    template = {"background": background, "heads": heads}
+    _TEMPLATES_CACHE[key] = template
+
+    return template
+
+
+def cell_top_left(board_config, pos):
+    """
+    Receives the board configuration and a (x, y) cell position.
+    Returns the (x, y) pixel coordinates of the top left corner of the cell's square.
+    """
+
+    SQUARE_SIZE = board_config["SQUARE_SIZE"]
+    LINE_THICKNESS = board_config["LINE_THICKNESS"]
+
+    return (pos[0] * (SQUARE_SIZE + LINE_THICKNESS) + LINE_THICKNESS, pos[1] * (SQUARE_SIZE + LINE_THICKNESS) + LINE_THICKNESS)
+
+
+def paint_cell(image, board_config, pos, color):
+    """
+    Paints the square of the given cell with a solid color (clipped to the image).
+    """
+
+    x0, y0 = cell_top_left(board_config, pos)
+    side = board_config["SQUARE_SIZE"] - board_config["LINE_THICKNESS"] + 1
+
+    image[max(y0, 0):max(y0 + side, 0), max(x0, 0):max(x0 + side, 0)] = color
+
+
+def paint_sprite(image, board_config, pos, sprite):
+    """
+    Paints a pre-rendered sprite (e.g. a snake's head) in the given cell, only where its mask is set and clipped to the image.
+    """
+
+    x0, y0 = cell_top_left(board_config, pos)
+    x0, y0 = x0 + sprite["offset"][0], y0 + sprite["offset"][1]
+    h, w = sprite["mask"].shape
+
+    # Clipping the sprite to the image borders (the head is out of the board when the snake hits a wall)
+    iy0, iy1 = max(y0, 0), min(y0 + h, image.shape[0])
+    ix0, ix1 = max(x0, 0), min(x0 + w, image.shape[1])
+    if iy0 >= iy1 or ix0 >= ix1:
+        return
+
+    mask = sprite["mask"][iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0]
+    region = image[iy0:iy1, ix0:ix1]
+    region[mask] = sprite["patch"][iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0][mask]
+
+
+def board_plot(board_config, board_state, is_display=False, save_dir=None):
+    """
+    Receives the board configuration, the board state, whether to display the image in a window and an optional directory to save it as a PNG.
+    Returns the BGR image of the board (None if it is saved). Its time is measured by the caller (the "render" phase of the game engine's timers).
+    """
+
+    # Board config
+    GRID_SIZE = board_config["GRID_SIZE"]
+    SQUARE_SIZE = board_config["SQUARE_SIZE"]
+    LINE_THICKNESS = board_config["LINE_THICKNESS"]
+
+    BACKGROUND_COLOR = board_config["BACKGROUND_COLOR"]
+    LINES_COLOR = board_config["LINES_COLOR"]
+    SNAKE1_COLOR = board_config["SNAKE1_COLOR"]
+    SNAKE2_COLOR = board_config["SNAKE2_COLOR"]
+    FOOD_COLOR = board_config["FOOD_COLOR"]
+
+    # Board state
+    turn = board_state["turn"]
+    snake1_body = board_state["snake1"]["body"]
+    snake1_dir = board_state["snake1"]["dir"]
+    snake2_body = board_state["snake2"]["body"]
+    snake2_dir = board_state["snake2"]["dir"]
+    food = board_state["food"]
+
+
+    # Copy of the cached background and grid, only the occupied cells are painted on it
+    template = get_board_template(board_config)
+    image = template["background"].copy()
 
     # Drawing Snake's 1 (green) parts
     for pos in snake1_body[1:]:
-        draw_pos(pos, SNAKE1_COLOR, False, snake1_dir)
-    draw_pos(snake1_body[0], SNAKE1_COLOR, True, snake1_dir)
+        paint_cell(image, board_config, pos, SNAKE1_COLOR)
+    paint_sprite(image, board_config, snake1_body[0], template["heads"][(1, snake1_dir)])
 
     # Drawing Snake's 2 (blue) parts
     for pos in snake2_body[1:]:
-        draw_pos(pos, SNAKE2_COLOR, False, snake2_dir)
-    draw_pos(snake2_body[0], SNAKE2_COLOR, True, snake2_dir)
+        paint_cell(image, board_config, pos, SNAKE2_COLOR)
+    paint_sprite(image, board_config, snake2_body[0], template["heads"][(2, snake2_dir)])
 
     # Drawing food
     for pos in food:
-        draw_pos(pos, FOOD_COLOR)
-
-
-    image = image.astype(np.uint8)
+        paint_cell(image, board_config, pos, FOOD_COLOR)
 
     # Display the image on your computer screen (for testing)
     if is_display:
@@ -120,6 +213,94 @@ def board_plot(board_config, board_state, is_display=False, save_dir=None):
 
 
 
+def cell_ops(board_state):
+    """
+    Receives the board state.
+    Returns a dictionary with the drawing operations of every occupied cell, in the same order board_plot() paints them:
+    ("cell", color_key) for solid squares and ("head", snake, dir) for the heads.
+    """
+
+    ops = {}
+    for snake, color_key in [(1, "SNAKE1_COLOR"), (2, "SNAKE2_COLOR")]:
+        snake_state = board_state[f"snake{snake}"]
+        for pos in snake_state["body"][1:]:
+            ops[pos] = ops.get(pos, ()) + (("cell", color_key),)
+        head = snake_state["body"][0]
+        ops[head] = ops.get(head, ()) + (("head", snake, snake_state["dir"]),)
+
+    for pos in board_state["food"]:
+        ops[pos] = ops.get(pos, ()) + (("cell", "FOOD_COLOR"),)
+
+    return ops
+
+
+class BoardRenderer:
+    """
+    Stateful board renderer for live play and replays. It keeps the previous frame and only repaints the cells that changed
+    since the previous rendered board state (new heads, old heads that became body, removed tails and food).
+    Frames are bit-identical to board_plot().
+    """
+
+    def __init__(self, board_config):
+        self.board_config = board_config
+        self.template = get_board_template(board_config)
+
+        # The incremental update is only exact if the heads' sprites don't go beyond their squares, otherwise every frame is fully redrawn
+        side = board_config["SQUARE_SIZE"] - board_config["LINE_THICKNESS"] + 1
+        self.is_incremental = all(sprite["offset"][0] >= 0 and sprite["offset"][1] >= 0 and
+                                  sprite["offset"][0] + sprite["mask"].shape[1] <= side and
+                                  sprite["offset"][1] + sprite["mask"].shape[0] <= side
+                                  for sprite in self.template["heads"].values())
+
+        self.reset()
+
+
+    def reset(self):
+        self.image = None
+        self.prev_ops = {}
+
+
+    def paint_ops(self, pos, ops):
+
+        # Cells out of the board are never drawn
+        if not (0 <= pos[0] < self.board_config["GRID_SIZE"] and 0 <= pos[1] < self.board_config["GRID_SIZE"]):
+            return
+
+        # Restoring the empty square from the template before painting the cell's content
+        x0, y0 = cell_top_left(self.board_config, pos)
+        side = self.board_config["SQUARE_SIZE"] - self.board_config["LINE_THICKNESS"] + 1
+        self.image[y0:y0 + side, x0:x0 + side] = self.template["background"][y0:y0 + side, x0:x0 + side]
+
+        for op in ops:
+            if op[0] == "cell":
+                paint_cell(self.image, self.board_config, pos, self.board_config[op[1]])
+            else:
+                paint_sprite(self.image, self.board_config, pos, self.template["heads"][(op[1], op[2])])
+
+
+    def render(self, board_state, copy=True):
+        """
+        Receives the board state to render and whether to return a copy of the frame (the internal frame is updated in the next call).
+        Returns the BGR image of the board.
+        """
+
+        ops = cell_ops(board_state)
+
+        if self.image is None or not self.is_incremental:
+            self.image = board_plot(self.board_config, board_state)
+
+        else:
+            # Dirty cells: every cell whose drawing operations changed since the previous frame
+            for pos in self.prev_ops.keys() | ops.keys():
+                pos_ops = ops.get(pos, ())
+                if self.prev_ops.get(pos, ()) != pos_ops:
+                    self.paint_ops(pos, pos_ops)
+
+        self.prev_ops = ops
+
+        return self.image.copy() if copy else self.image
+
+
 if __name__ == "__main__":
 
     # --- Test case ---
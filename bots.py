@@ -0,0 +1,278 @@
+from time import time
+from collections import deque
+
+from game_state import SNAKE1, SNAKE2, DIR_TO_DELTA
+
+
+OPPOSITE_DIR = {"U": "D", "D": "U", "L": "R", "R": "L"}
+
+SNAKE_IDS = {1: ("snake1", "snake2"), 2: ("snake2", "snake1")}
+
+
+# --- Utils ---
+
+def next_head(head, dir):
+    dx, dy = DIR_TO_DELTA[dir]
+    return (head[0] + dx, head[1] + dy)
+
+
+def manhattan(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def safe_moves(game_state, snake_id):
+    """
+    Receives the GameState and the snake id.
+    Returns the directions whose next cell is inside the board and free of any body. The snake's own tail counts as free
+    (it moves away in the same turn), the opponent's tail doesn't as it stays if the opponent eats.
+    """
+
+    body = game_state.snakes[snake_id]["body"]
+    head, tail = body[0], body[-1]
+
+    moves = []
+    for dir in DIR_TO_DELTA:
+        pos = next_head(head, dir)
+        if game_state.in_bounds(pos) and (game_state.grid[pos[1], pos[0]] not in (SNAKE1, SNAKE2) or pos == tail):
+            moves.append(dir)
+
+    return moves
+
+
+def move_analysis(game_state, snake_id):
+    """
+    Receives the GameState and the snake id.
+    Returns the safe moves of the snake (see safe_moves()) and the ones among them whose next cell the opponent's head can also reach
+    (a head to head collision kills both snakes).
+    """
+
+    opponent = "snake2" if snake_id == "snake1" else "snake1"
+    moves = safe_moves(game_state, snake_id)
+
+    head = game_state.snakes[snake_id]["body"][0]
+    opponent_head = game_state.snakes[opponent]["body"][0]
+    opponent_next = {next_head(opponent_head, dir) for dir in DIR_TO_DELTA}
+    risky = [dir for dir in moves if next_head(head, dir) in opponent_next]
+
+    return moves, risky
+
+
+# --- Bots ---
+
+def heuristic_policy(agent_number, board_config, board_state, game_state):
+    """
+    Cheap greedy food-seeker with the policy signature of the game engine agents, also used as the fallback of the timed out LLM moves.
+    It chooses among the safe moves the one that doesn't share a cell with the opponent's possible next heads and gets closer to the nearest food,
+    keeping the current direction on ties.
+    Returns the agent's (action, response, time, completion tokens, cost, info).
+    """
+
+    t0 = time()
+    own, opponent = SNAKE_IDS[agent_number]
+    snake = game_state.snakes[own]
+    head = snake["body"][0]
+
+    moves = safe_moves(game_state, own)
+    if not moves:
+        return (None, "Heuristic bot: no safe move", time() - t0, 0, 0, {})
+
+    opponent_head = game_state.snakes[opponent]["body"][0]
+    opponent_next = {next_head(opponent_head, dir) for dir in DIR_TO_DELTA}
+
+    def score(dir):
+        pos = next_head(head, dir)
+        food_dist = min((manhattan(pos, food) for food in game_state.food), default=0)
+        return (pos in opponent_next, food_dist, dir != snake["dir"])
+
+    dir = min(moves, key=score)
+
+    return (dir, f"Heuristic bot: {dir}", time() - t0, 0, 0, {})
+
+
+def flood_fill_policy(agent_number, board_config, board_state, game_state):
+    """
+    Survival bot: among the safe moves it keeps the largest reachable area (flood fill from the next head, so it doesn't enter dead ends
+    shorter than its body), then avoids the opponent's possible next heads and follows the shortest path (BFS) to the food.
+    Returns the agent's (action, response, time, completion tokens, cost, info).
+    """
+
+    t0 = time()
+    own, opponent = SNAKE_IDS[agent_number]
+    snake = game_state.snakes[own]
+    grid_size = game_state.grid_size
+
+    moves = safe_moves(game_state, own)
+    if not moves:
+        return (None, "Flood fill bot: no safe move", time() - t0, 0, 0, {})
+
+    # The snake's own tail moves away in the same turn, so it isn't an obstacle
+    blocked = set(game_state.snakes[opponent]["body"]) | set(snake["body"])
+    blocked.discard(snake["body"][-1])
+
+    opponent_head = game_state.snakes[opponent]["body"][0]
+    opponent_next = {next_head(opponent_head, dir) for dir in DIR_TO_DELTA}
+    length = len(snake["body"])
+
+    def score(dir):
+        pos = next_head(snake["body"][0], dir)
+        area = reachable_area(blocked, pos, grid_size, limit=2 * length)
+        food_dist = food_distance(blocked, pos, game_state.food, grid_size)
+        return (-min(area, length), pos in opponent_next, food_dist if food_dist is not None else grid_size ** 2, dir != snake["dir"])
+
+    dir = min(moves, key=score)
+
+    return (dir, f"Flood fill bot: {dir}", time() - t0, 0, 0, {})
+
+
+def expectimax_policy(agent_number, board_config, board_state, game_state, depth=2):
+    """
+    Depth-limited search over the simultaneous moves of both snakes with the rules of the game engine (walls, bodies, head to head collisions and growth,
+    no new food is placed in the search). Every own move is scored by its mean value over the opponent's moves, taken as equally likely (expectimax),
+    and the leaves by evaluate().
+    Returns the agent's (action, response, time, completion tokens, cost, info).
+    """
+
+    t0 = time()
+    own, opponent = SNAKE_IDS[agent_number]
+    bodies = (tuple(game_state.snakes[own]["body"]), tuple(game_state.snakes[opponent]["body"]))
+    dirs = (game_state.snakes[own]["dir"], game_state.snakes[opponent]["dir"])
+
+    value, dir = search(bodies, dirs, frozenset(game_state.food), game_state.grid_size, depth)
+    if dir is None:
+        return (None, "Expectimax bot: no move", time() - t0, 0, 0, {})
+
+    return (dir, f"Expectimax bot: {dir} (value {value:.1f})", time() - t0, 0, 0, {})
+
+
+# --- Search ---
+
+def reachable_area(blocked, start, grid_size, limit=None):
+    """
+    Receives the set of blocked cells, the start cell, the board size and an optional limit.
+    Returns the number of free cells reachable from the start cell (flood fill), stopping at the limit.
+    """
+
+    if start in blocked or not (0 <= start[0] < grid_size and 0 <= start[1] < grid_size):
+        return 0
+
+    seen = {start}
+    queue = deque([start])
+    while queue and (limit is None or len(seen) < limit):
+        x, y = queue.popleft()
+        for dx, dy in DIR_TO_DELTA.values():
+            pos = (x + dx, y + dy)
+            if pos not in seen and pos not in blocked and 0 <= pos[0] < grid_size and 0 <= pos[1] < grid_size:
+                seen.add(pos)
+                queue.append(pos)
+
+    return len(seen)
+
+
+def food_distance(blocked, start, food, grid_size):
+    """
+    Receives the set of blocked cells, the start cell, the food positions and the board size.
+    Returns the length of the shortest path (BFS) to the nearest food or None if no food is reachable.
+    """
+
+    food = set(food)
+    if not food:
+        return None
+
+    seen = {start}
+    queue = deque([(start, 0)])
+    while queue:
+        pos, dist = queue.popleft()
+        if pos in food:
+            return dist
+        for dx, dy in DIR_TO_DELTA.values():
+            nxt = (pos[0] + dx, pos[1] + dy)
+            if nxt not in seen and nxt not in blocked and 0 <= nxt[0] < grid_size and 0 <= nxt[1] < grid_size:
+                seen.add(nxt)
+                queue.append((nxt, dist + 1))
+
+    return None
+
+
+def simulate(bodies, moves, food, grid_size):
+    """
+    Receives both bodies (tuples from head to tail), both moves, the food positions and the board size.
+    Applies a turn with the rules of GameState.play_turn(): both snakes move (growing if they eat), then a head dies out of the board,
+    in any body or in the same cell as the other head.
+    Returns the new bodies, the remaining food and both alive flags.
+    """
+
+    new_bodies = []
+    for body, dir in zip(bodies, moves):
+        head = next_head(body[0], dir)
+        new_bodies.append((head,) + (body if head in food else body[:-1]))
+    food = food - {body[0] for body in new_bodies}
+
+    occupied = set(new_bodies[0][1:]) | set(new_bodies[1][1:])
+    heads = (new_bodies[0][0], new_bodies[1][0])
+    alive = tuple(0 <= head[0] < grid_size and 0 <= head[1] < grid_size and head not in occupied and heads[0] != heads[1] for head in heads)
+
+    return tuple(new_bodies), food, alive
+
+
+def evaluate(bodies, food, grid_size):
+    """
+    Receives both bodies (own first), the food positions and the board size of a position where both snakes are alive.
+    Returns its value for the own snake: a penalty if it is trapped in a space smaller than its body (a bonus if the opponent is), the length difference
+    and the shortest path (BFS) to the food.
+    """
+
+    blocked = set(bodies[0]) | set(bodies[1])
+    own_area = reachable_area(blocked - {bodies[0][0]}, bodies[0][0], grid_size, limit=2 * len(bodies[0]))
+    opponent_area = reachable_area(blocked - {bodies[1][0]}, bodies[1][0], grid_size, limit=2 * len(bodies[1]))
+    food_dist = food_distance(blocked, bodies[0][0], food, grid_size)
+    if food_dist is None:
+        food_dist = grid_size if food else 0
+
+    # Trapped in a smaller space than the body is almost as bad as dying
+    trapped = (own_area < len(bodies[0])) * -500 + (opponent_area < len(bodies[1])) * 500
+
+    # A food eaten outweighs any distance to the next one, otherwise the snake would rather wait next to the food than eat it
+    return trapped + 100 * (len(bodies[0]) - len(bodies[1])) - food_dist
+
+
+def search(bodies, dirs, food, grid_size, depth):
+    """
+    Receives both bodies and directions (own first), the food positions, the board size and the remaining depth.
+    Returns the value of the position and the best own move (None at the leaves or if there is no move), the reversing moves are skipped.
+    The opponent's moves are averaged instead of taking the worst case: the opponent isn't an adversary that only tries to kill the own snake,
+    and the worst case makes it give up the food whenever the opponent's head could also reach it.
+    """
+
+    if depth == 0:
+        return evaluate(bodies, food, grid_size), None
+
+    own_moves = [dir for dir in DIR_TO_DELTA if dir != OPPOSITE_DIR[dirs[0]]]
+    opponent_moves = [dir for dir in DIR_TO_DELTA if dir != OPPOSITE_DIR[dirs[1]]]
+
+    best_value, best_dir = None, None
+    for own_dir in own_moves:
+        values = []
+        for opponent_dir in opponent_moves:
+            new_bodies, new_food, (own_alive, opponent_alive) = simulate(bodies, (own_dir, opponent_dir), food, grid_size)
+            if not own_alive:
+                value = -500 if not opponent_alive else -1000
+            elif not opponent_alive:
+                value = 1000
+            else:
+                value = search(new_bodies, (own_dir, opponent_dir), new_food, grid_size, depth - 1)[0]
+
+            values.append(value)
+
+        mean = sum(values) / len(values)
+        if best_value is None or mean > best_value or (mean == best_value and own_dir == dirs[0]):
+            best_value, best_dir = mean, own_dir
+
+    return best_value, best_dir
+
+
+# Bots by name, for the agent backends and the timeout fallbacks
+BOT_POLICIES = {
+    "heuristic": heuristic_policy,
+    "flood_fill": flood_fill_policy,
+    "expectimax": expectimax_policy,
+}
@@ -0,0 +1,195 @@
+import threading
+
+from langchain.prompts.chat import HumanMessagePromptTemplate
+from langchain.schema import AIMessage, HumanMessage
+
+from prompt_tokens import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY
+
+
+# Message of every turn after the first one, only the changes of the board are sent
+DEFAULT_TURN_MSG = """Turn {turn}. Changes since your last move (x,y coordinates):
+{diff_board}
+Shortly reason your next move and add one of the emojis ⬆️, ⬇️, ⬅️, ➡️ to chose its direction."""
+
+# Message of the first turn after the older turns are removed from the conversation, the whole board is sent again
+DEFAULT_SNAPSHOT_MSG = """Turn {turn}. This is the current board (x,y coordinates, bodies from head to tail):
+{sparse_board}
+Shortly reason your next move and add one of the emojis ⬆️, ⬇️, ⬅️, ➡️ to chose its direction."""
+
+MEMORY_POLICIES = ["window", "summary"]
+
+
+class Conversation:
+    """
+    Multi-turn conversation of an LLM agent during a match. The system message, the first human message (rules and full board) and the
+    first response are a stable prefix, and every next turn only appends a short message with the board changes and the agent's response,
+    so the providers that discount repeated prefixes can reuse the previous request.
+    The context is bounded by the memory policy: after window turns the appended turns are removed and a snapshot message with the whole board
+    starts a new block ("window"), optionally preceded by a short summary of the removed turns ("summary"), so no LLM call is needed to summarize.
+    """
+
+    def __init__(self, compiled_prompt, memory="window", window=10, turn_msg=DEFAULT_TURN_MSG, snapshot_msg=DEFAULT_SNAPSHOT_MSG):
+        if memory not in MEMORY_POLICIES:
+            raise ValueError(f"Unknown memory policy {memory}, it must be one of {MEMORY_POLICIES}")
+
+        self.compiled_prompt = compiled_prompt
+        self.memory = memory
+        self.window = window
+        self.turn_template = HumanMessagePromptTemplate.from_template(turn_msg)
+        self.snapshot_template = HumanMessagePromptTemplate.from_template(snapshot_msg)
+
+        self.messages = []
+        self.tokens = []
+        self.prefix_len = 0
+        self.block_turns = []
+        self.summaries = []
+
+        # Number of leading messages of the last request that are still sent unchanged in the next one
+        self.unchanged_len = 0
+
+        # Turn waiting for its response, a call abandoned by its deadline can't answer a later turn
+        self.pending_turn = None
+        self.answered_turn = None
+        self.needs_snapshot = False
+        self.lock = threading.Lock()
+
+
+    def next_messages(self, agent_number, board_state, get_variables):
+        """
+        Receives the agent int number, the board state and a function returning the board variables of a set of input variables.
+        Appends the human message of the turn (removing the older turns if the block is full, and the previous turn's message if it was never answered).
+        Returns the list of messages to send.
+        """
+
+        with self.lock:
+            if self.pending_turn is not None:
+                self.drop_pending()
+            self.pending_turn = board_state["turn"]
+            return self.append_turn(agent_number, board_state, get_variables)
+
+
+    def drop_pending(self):
+        # The unanswered message is removed and, as its board changes are lost, the next message has the whole board
+        if len(self.messages) < self.prefix_len:
+            self.messages, self.tokens = [], []
+        else:
+            self.messages.pop()
+            self.tokens.pop()
+            self.block_turns.pop()
+            self.unchanged_len = min(self.unchanged_len, len(self.messages))
+            self.needs_snapshot = True
+        self.pending_turn = None
+
+
+    def append_turn(self, agent_number, board_state, get_variables):
+
+        # First turn: the user defined prompt with the full board
+        if not self.messages:
+            compiled_prompt = self.compiled_prompt
+            self.messages = compiled_prompt["template"].format_messages(**get_variables(compiled_prompt["input_variables"]))
+            self.tokens = [None] * len(self.messages)
+            self.prefix_len = len(self.messages) + 1
+            self.block_turns = [self.turn_info(agent_number, board_state)]
+            return list(self.messages)
+
+        # The block is full: the appended turns are removed and the next message has the whole board
+        if len(self.messages) - self.prefix_len >= 2 * self.window:
+            if self.memory == "summary" and self.block_turns:
+                self.summaries.append(self.summarize(self.block_turns))
+            del self.messages[self.prefix_len:]
+            del self.tokens[self.prefix_len:]
+            self.unchanged_len = min(self.unchanged_len, self.prefix_len)
+            self.block_turns = []
+            template = self.snapshot_template
+        elif self.needs_snapshot:
+            template = self.snapshot_template
+        else:
+            template = self.turn_template
+        self.needs_snapshot = False
+
+        message = template.format(**get_variables(set(template.input_variables)))
+        if template is self.snapshot_template and self.summaries:
+            message = HumanMessage(content="\n".join(self.summaries) + "\n" + message.content)
+
+        self.messages.append(message)
+        self.tokens.append(None)
+        self.block_turns.append(self.turn_info(agent_number, board_state))
+
+        return list(self.messages)
+
+
+    def add_response(self, response, action, turn):
+        """
+        Receives the agent's response, the parsed action and the turn it answers, appends the response to the conversation
+        (a late response of an abandoned turn is ignored).
+        """
+
+        with self.lock:
+            if turn != self.pending_turn:
+                return
+            self.pending_turn = None
+            self.answered_turn = turn
+            self.unchanged_len = len(self.messages)
+            self.messages.append(AIMessage(content=response))
+            self.tokens.append(None)
+            self.block_turns[-1]["action"] = action
+
+
+    def abandon_turn(self, turn):
+        """
+        Receives the turn whose call was abandoned by its deadline (the fallback policy moved instead).
+        Removes the turn's message, and its response if it arrived after the deadline, so the conversation never has a move that wasn't played.
+        """
+
+        with self.lock:
+            if turn == self.answered_turn and turn != self.pending_turn:
+                self.messages.pop()
+                self.tokens.pop()
+                self.pending_turn = turn
+            if turn == self.pending_turn:
+                self.drop_pending()
+
+
+    def skip_turn(self):
+        """
+        Marks a turn played without asking the agent (e.g. a forced move), as its board changes are never sent the next message has the whole board.
+        """
+
+        with self.lock:
+            if self.messages:
+                self.needs_snapshot = True
+
+
+    def turn_info(self, agent_number, board_state):
+        own, opponent = ("snake1", "snake2") if agent_number == 1 else ("snake2", "snake1")
+        return {"turn": board_state["turn"], "own_len": len(board_state[own]["body"]), "opponent_len": len(board_state[opponent]["body"]), "action": None}
+
+
+    def summarize(self, turns):
+        """
+        Receives the turn infos of the removed block.
+        Returns a one line summary: the moves of the agent and how the length of both snakes changed.
+        """
+
+        moves = " ".join(turn["action"] or "-" for turn in turns)
+        return (f"Summary of turns {turns[0]['turn']}-{turns[-1]['turn']}: your moves were {moves}, "
+                f"your length went from {turns[0]['own_len']} to {turns[-1]['own_len']} and your opponent's from {turns[0]['opponent_len']} to {turns[-1]['opponent_len']}.")
+
+
+    def count_tokens(self, encoder):
+        """
+        Receives the tiktoken encoding.
+        Returns the input tokens of the current request and the ones of its prefix that was already sent in the previous request
+        (the tokens that a provider's prefix cache can reuse). Every message is only encoded once.
+        """
+
+        # A call abandoned by its deadline can still be changing the messages from its thread
+        with self.lock:
+            for i, n_tokens in enumerate(self.tokens):
+                if n_tokens is None:
+                    self.tokens[i] = TOKENS_PER_MESSAGE + len(encoder.encode(self.messages[i].content))
+
+            prompt_tokens = sum(self.tokens) + TOKENS_PER_REPLY
+            cached_tokens = sum(self.tokens[:self.unchanged_len])
+
+        return prompt_tokens, cached_tokens
@@ -1,10 +1,14 @@
-import streamlit as st 
-from random import randint
-from copy import deepcopy
-import pandas as pd
+from random import randrange
+from time import time
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-from board_plot import board_plot
-from agents import get_agent_action
+from agents import get_agent_action, compile_prompt
+from conversation import Conversation
+from bots import BOT_POLICIES, SNAKE_IDS, heuristic_policy, safe_moves
+from game_state import GameState
+from history import GameHistory
+from profiling import PhaseTimer
 
 
 # Configs
@@ -39,71 +43,149 @@ board_state_0 = {
 }
 
 
-# --- Utils ---
+# --- Game rules ---
 
-def place_food(board_config, board_state):
+def get_winner(board_state):
+    """
+    Receives the final board state.
+    Returns the winner of the game: "Agent 1", "Agent 2" or "Draw".
+    """
 
-    new_food_pos = (randint(0, board_config["GRID_SIZE"]-1), randint(0, board_config["GRID_SIZE"]-1))
+    if board_state["snake1"]["is_alive"] and not board_state["snake2"]["is_alive"]:
+        return "Agent 1"
+    elif board_state["snake2"]["is_alive"] and not board_state["snake1"]["is_alive"]:
+        return "Agent 2"
+    elif not board_state["snake1"]["is_alive"] and not board_state["snake2"]["is_alive"]:
+        return "Draw"
+    elif len(board_state["snake1"]["body"]) > len(board_state["snake2"]["body"]):
+        return "Agent 1"
+    elif len(board_state["snake2"]["body"]) > len(board_state["snake1"]["body"]):
+        return "Agent 2"
+    else:
+        return "Draw"
 
-    it = 0
-    while (new_food_pos in board_state["snake1"]["body"] or new_food_pos in board_state["snake2"]["body"] or new_food_pos in board_state["food"]) and it <= 50:
-        it += 1
-        new_food_pos = (randint(0, board_config["GRID_SIZE"]-1), randint(0, board_config["GRID_SIZE"]-1))
 
-    if it <= 50:
-        return new_food_pos
-    else:
-        return None
-    
+def keep_dir_policy(agent_number, board_config, board_state, game_state):
+    return (None, "Keeping the current direction", 0, 0, 0, {})
 
-def move_snake(board_state, snake):
 
-    head = deepcopy(snake["body"][0])
+# Policies applied when an agent doesn't move before its deadline
+TIMEOUT_FALLBACKS = {
+    "keep": keep_dir_policy,
+    **BOT_POLICIES,
+}
 
-    if snake["dir"] == "U":
-        head = (head[0], head[1]-1)
-    elif snake["dir"] == "D":
-        head = (head[0], head[1]+1)
-    elif snake["dir"] == "L":
-        head = (head[0]-1, head[1])
-    elif snake["dir"] == "R":
-        head = (head[0]+1, head[1])
 
-    snake["body"].insert(0, head)
+def run_agent(agent_number, agent, board_config, board_state, game_state, encodings=None, prev_board_state=None, cancel=None):
+    """
+    Receives the agent int number, the agent config, the board configuration, the board state dictionary, the GameState, the turn's board encodings shared by both agents,
+    the board state shown in the previous turn and the event set when the move is cancelled by its deadline.
+    Returns the agent's (action, response, time, completion tokens, cost, info) from its "policy" function if it has one (scripted agents and replays)
+    or from the LLM call in get_agent_action() otherwise. The info dict has extra fields of the turn to be added to the history.
+    """
 
-    if head in board_state["food"]:
-        board_state["food"].remove(head)
-    else:
-        snake["body"].pop()
+    if "policy" in agent:
+        return agent["policy"](agent_number, board_config, board_state, game_state)
 
+    # A forced move (only one safe move) is played without calling the LLM, a conversation sends the whole board in its next message
+    if agent.get("skip_forced", False):
+        moves = safe_moves(game_state, SNAKE_IDS[agent_number][0])
+        if len(moves) == 1:
+            if agent.get("conversation_memory") is not None:
+                agent["conversation_memory"].skip_turn()
+            return (moves[0], f"Forced move: {moves[0]}", 0, 0, 0, {"forced": True})
+
+    action, response, agent_time, completion_tokens, cost, info = get_agent_action(agent=agent_number, llm=agent["llm"], prompt=agent["prompt"], board_config=board_config, board_state=board_state, is_test=agent.get("is_test", False), game_state=game_state, cache=agent.get("cache"), compiled_prompt=agent.get("compiled_prompt"), encodings=encodings, prev_board_state=prev_board_state, token_budget=agent.get("token_budget"), conversation=agent.get("conversation_memory"), stream=agent.get("stream", False), stop_early=agent.get("stop_early", False), cancel=cancel)
+
+    return (action, response, agent_time, completion_tokens, cost, {**info, "forced": False} if agent.get("skip_forced", False) else info)
+
+
+def correct_move(agent_number, agent, board_config, board_state, game_state, action, info):
+    """
+    Receives the agent int number, the agent config, the board configuration, the board state, the GameState and the agent's action and info.
+    Returns the action and the info. If the agent has "correct_moves" and its move (None keeps the current direction) hits a wall or a body while another move is safe,
+    the heuristic bot's safe move replaces it and the correction (e.g. "L->U") is recorded in the info.
+    """
+
+    if not agent.get("correct_moves", False):
+        return action, info
+
+    snake_id = SNAKE_IDS[agent_number][0]
+    moves = safe_moves(game_state, snake_id)
+    dir = action if action is not None else game_state.snakes[snake_id]["dir"]
+    if not moves or dir in moves:
+        return action, {**info, "corrected": ""}
+
+    corrected = heuristic_policy(agent_number, board_config, board_state, game_state)[0]
+    return corrected, {**info, "corrected": f"{dir}->{corrected}"}
+
+
+def await_agent(future, agent_number, agent, board_config, board_state, game_state, t_start, cancel):
+    """
+    Receives the future of the agent's move, the agent int number, the agent config, the board configuration, the board state, the GameState,
+    the time the move was requested and the agent's cancel event.
+    Returns the agent's (action, response, time, completion tokens, cost, info). If the agent has a "move_timeout" (seconds) and it expires, the call is cancelled
+    (a streamed response stops at its next chunk, a blocking one is abandoned and its conversation turn removed) and the "timeout_fallback" policy moves instead: "keep" the current direction (default) or one of the local bots ("heuristic", "flood_fill", "expectimax").
+    """
+
+    move_timeout = agent.get("move_timeout")
+    if move_timeout is None:
+        return future.result()
+
+    try:
+        action, response, agent_time, completion_tokens, cost, info = future.result(timeout=max(0, t_start + move_timeout - time()))
+        return (action, response, agent_time, completion_tokens, cost, {**info, "timed_out": False})
+
+    except FutureTimeoutError:
+        cancel.set()
+        if agent.get("conversation_memory") is not None:
+            agent["conversation_memory"].abandon_turn(board_state["turn"])
+        action, response, _, _, _, info = TIMEOUT_FALLBACKS[agent.get("timeout_fallback", "keep")](agent_number, board_config, board_state, game_state)
+        # The tokens and cost of the abandoned call are unknown (None), they are not counted as free
+        return (action, f"Timeout after {move_timeout} s. {response}", time() - t_start, None, None, {**info, "timed_out": True})
 
-DIR_TO_ARROW = {
-    "U": "⬆️",
-    "D": "⬇️",
-    "L": "⬅️",
-    "R": "➡️",
-    None: "❌",
-}
-    
 
 # --- Main function ---
 
 def game_engine(board_config=board_config, 
                 board_state_0=board_state_0, 
-                llm1=None, 
-                llm2=None, 
-                prompt1=None,
-                prompt2=None,
-                board_imgs_space=None, 
-                turn_counter=None,
-                plots_space=None,
-                agents_spaces=None
+                agent1=None, 
+                agent2=None, 
+                observers=None,
+                seed=None,
+                trace_hook=None,
                 ):
-
-    board_state = deepcopy(board_state_0)
-
-    game_history = []
-    game_history.append({"board_state": deepcopy(board_state),
+    """
+    Headless game loop, it doesn't depend on Streamlit so it can be used from the app, a script or a batch of matches.
+    Receives the board configuration, the initial board state, the two agent configs (dicts with "llm", "prompt" and optionally "is_test", "cache", "token_budget", "conversation", "stream", "stop_early", "move_timeout", "timeout_fallback", "skip_forced" and "correct_moves", or with a "policy" function) 
+    an optional list of observers, an optional seed for the food placement (a random one is drawn if not set, so every match can be replayed) 
+    and an optional trace_hook(phase, turn, seconds) receiving every phase time of the turns (see PhaseTimer).
+    Every observer can implement on_game_start(board_config, board_state, seed), on_turn(board_config, board_state, game_history) and 
+    on_game_over(board_config, board_state, game_history, winner) to render or log the game while it is being played.
+    Every turn record has the times of the phases: phase_food, phase_agents (waiting for both agents), phase_correct (unsafe moves correction), phase_move, phase_history and, added after the observers run,
+    phase_render and phase_ui (the observers can time their board rendering with game_history.timer.phase("render")).
+    Returns the winner ("Agent 1", "Agent 2" or "Draw") and the GameHistory (indexable and iterable as the list of turn dicts).
+    """
+
+    observers = observers if observers is not None else []
+    seed = seed if seed is not None else randrange(2**32)
+
+    # The LLM agents' prompt templates are compiled once per match
+    agent1, agent2 = [{**agent, "compiled_prompt": compile_prompt(agent["prompt"])} if "policy" not in agent and not agent.get("is_test", False) else agent for agent in (agent1, agent2)]
+
+    # Agents in multi-turn mode keep their conversation during the match ("conversation" is True or a dict with the Conversation options)
+    agent1, agent2 = [{**agent, "conversation_memory": Conversation(agent["compiled_prompt"], **(agent["conversation"] if isinstance(agent["conversation"], dict) else {}))} 
+                      if "compiled_prompt" in agent and agent.get("conversation") else agent for agent in (agent1, agent2)]
+
+    # The game state is kept in an occupancy grid, its dictionary form is used in the prompts, the history and the observers
+    game_state = GameState(board_config, board_state_0, seed=seed)
+    board_state = game_state.to_dict()
+
+    # The history keeps per-turn deltas of the board state and a keyframe every few turns instead of a copy of the board every turn
+    game_history = GameHistory()
+    timer = PhaseTimer(trace_hook)
+    game_history.timer = timer
+    game_history.append({"board_state": board_state,
                          
                         "agent1_response": None,
                         "agent1_action": None,
@@ -118,133 +200,105 @@ def game_engine(board_config=board_config,
                         "agent2_cost": 0,
                         })
 
+    for observer in observers:
+        if hasattr(observer, "on_game_start"):
+            observer.on_game_start(board_config, board_state, seed)
+
     game_over = False
     turn = 0
-    
-    while not game_over and turn < board_config["MAX_TURNS"]:
-
-        # Update turn
-        turn += 1
-        board_state["turn"] = turn
-
-        # Place food
-        if len(board_state["food"]) < 2:
-            new_food_pos = place_food(board_config, board_state)
-            if new_food_pos is not None:
-                board_state["food"].append(new_food_pos)
-
-        # Agents turn
-        agent1_action, agent1_response, llm1_time, completion_tokens1, cost1 = get_agent_action(agent=1, llm=llm1, prompt=prompt1, board_config=board_config, board_state=board_state)
-        agent2_action, agent2_response, llm2_time, completion_tokens2, cost2 = get_agent_action(agent=2, llm=llm2, prompt=prompt2, board_config=board_config, board_state=board_state)
-
-        if agent1_action is not None:
-            board_state["snake1"]["dir"] = agent1_action
-
-        if agent2_action is not None:
-            board_state["snake2"]["dir"] = agent2_action
-
-        # Move snakes
-        move_snake(board_state, board_state["snake1"])
-        move_snake(board_state, board_state["snake2"])
-
-        # Check if game is over
-        if board_state["snake1"]["body"][0] in board_state["snake2"]["body"] or \
-            board_state["snake1"]["body"][0] in board_state["snake1"]["body"][1:] or \
-            board_state["snake1"]["body"][0][0] < 0 or board_state["snake1"]["body"][0][0] >= board_config["GRID_SIZE"] or \
-            board_state["snake1"]["body"][0][1] < 0 or board_state["snake1"]["body"][0][1] >= board_config["GRID_SIZE"]:
-            
-            board_state["snake1"]["is_alive"] = False
-            game_over = True
-        
-        if board_state["snake2"]["body"][0] in board_state["snake1"]["body"] or \
-            board_state["snake2"]["body"][0] in board_state["snake2"]["body"][1:] or \
-            board_state["snake2"]["body"][0][0] < 0 or board_state["snake2"]["body"][0][0] >= board_config["GRID_SIZE"] or \
-            board_state["snake2"]["body"][0][1] < 0 or board_state["snake2"]["body"][0][1] >= board_config["GRID_SIZE"]:
-            
-            board_state["snake2"]["is_alive"] = False
-            game_over = True
-
-        # Update game history
-        game_history.append({"board_state": deepcopy(board_state),
+    prev_board_state = None
+
+    # Thread pool to call both agents at the same time, the turn latency is the slowest agent's one instead of the sum of both
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        while not game_over and turn < board_config["MAX_TURNS"]:
+
+            # Update turn
+            turn += 1
+            game_state.turn = turn
+            timer.start_turn(turn)
+
+            # Place food
+            with timer.phase("food"):
+                if len(game_state.food) < 2:
+                    new_food_pos = game_state.place_food()
+                    if new_food_pos is not None:
+                        game_state.add_food(new_food_pos)
+
+                board_state = game_state.to_dict()
+
+            # Agents turn, both agents see the same board state so their calls are done concurrently (each call measures its own time)
+            encodings = {}
+            cancel1, cancel2 = Event(), Event()
+            with timer.phase("agents"):
+                t_start = time()
+                future1 = executor.submit(run_agent, 1, agent1, board_config, board_state, game_state, encodings, prev_board_state, cancel1)
+                future2 = executor.submit(run_agent, 2, agent2, board_config, board_state, game_state, encodings, prev_board_state, cancel2)
+                agent1_action, agent1_response, llm1_time, completion_tokens1, cost1, info1 = await_agent(future1, 1, agent1, board_config, board_state, game_state, t_start, cancel1)
+                agent2_action, agent2_response, llm2_time, completion_tokens2, cost2, info2 = await_agent(future2, 2, agent2, board_config, board_state, game_state, t_start, cancel2)
+            prev_board_state = board_state
+
+            # The agents' phases are measured in their threads, they are only traced (they are already in the agents' fields of the record)
+            for prefix, agent_time, info in [("agent1", llm1_time, info1), ("agent2", llm2_time, info2)]:
+                for name in ["prompt_time", "parse_time"]:
+                    if name in info:
+                        timer.trace(f"{prefix}_{name}", info[name])
+                timer.trace(f"{prefix}_time", agent_time)
+
+            # Unsafe moves are corrected before moving if the agents ask for it (after the timeouts, so it also applies to the fallback moves)
+            with timer.phase("correct"):
+                agent1_action, info1 = correct_move(1, agent1, board_config, board_state, game_state, agent1_action, info1)
+                agent2_action, info2 = correct_move(2, agent2, board_config, board_state, game_state, agent2_action, info2)
+
+            # An abandoned call keeps its worker thread busy until it returns, the next turns use new workers
+            if info1.get("timed_out") or info2.get("timed_out"):
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ThreadPoolExecutor(max_workers=2)
+
+            # Move snakes and check if game is over
+            with timer.phase("move"):
+                game_over = game_state.play_turn(agent1_action, agent2_action)
+                board_state = game_state.to_dict()
+
+            # Update game history
+            with timer.phase("history"):
+                game_history.append({"board_state": board_state,
                              
-                            "agent1_response": agent1_response,
-                            "agent1_action": agent1_action,
-                            "agent1_time": llm1_time,
-                            "agent1_completion_tokens": completion_tokens1,
-                            "agent1_cost": cost1,
-
-                            "agent2_response": agent2_response,
-                            "agent2_action": agent2_action,
-                            "agent2_time": llm2_time,
-                            "agent2_completion_tokens": completion_tokens2,
-                            "agent2_cost": cost2,
-                            })
-
-        # Update latest messages in web layout
-        container1 = agents_spaces[0].container()
-        container2 = agents_spaces[1].container()
-        
-        with container1:
-            st.markdown(f"<h4 style='text-align:center; background-color:green;'> Agent 1 Score: {len(board_state['snake1']['body'])} </h4>", unsafe_allow_html=True)
-            st.write("")
-            for i in range(min(2, len(game_history)-1)):
-                st.success(f"**Turn {turn-i}:** " + game_history[-(i+1)]["agent1_response"], icon=DIR_TO_ARROW[game_history[-(i+1)]["agent1_action"]])
-
-        with container2:
-            st.markdown(f"<h4 style='text-align:center; background-color:blue;'> Agent 2 Score: {len(board_state['snake2']['body'])} </h4>", unsafe_allow_html=True)
-            st.write("")
-            for i in range(min(2, len(game_history)-1)):
-                st.info(f"**Turn {turn-i}:** " + game_history[-(i+1)]["agent2_response"], icon=DIR_TO_ARROW[game_history[-(i+1)]["agent2_action"]])
-
-        # Update board
-        img_arr = board_plot(board_config, board_state, is_display=False, save_dir=None)
-
-        # BGR to RGB and update new img in web layout
-        turn_counter.markdown(f"<h3 style='text-align:center'> Turn {turn} </h3>", unsafe_allow_html=True)
-        board_imgs_space.image(img_arr[:, :, (2, 1, 0)], use_column_width=True)
-
-        # Update plots
-        plots_container = plots_space.container()
-        df = pd.DataFrame(game_history)
-
-        with plots_container:
-            st.write("")
-            cols_plots = st.columns(3)
-            with cols_plots[0]:
-                st.write("##### Completion tokens")
-                st.line_chart(df[["agent1_completion_tokens", "agent2_completion_tokens"]], color=["#12c914", "#0074ba"])
-                st.success(f"Total completion tokens Agent 1: {df['agent1_completion_tokens'].sum()}")
-                st.info(f"Total completion tokens Agent 2: {df['agent2_completion_tokens'].sum()}")
-            with cols_plots[1]:
-                st.write("##### Cost of input + completion tokens ($)")
-                st.line_chart(df[["agent1_cost", "agent2_cost"]], color=["#12c914", "#0074ba"])
-                st.success(f"Total cost Agent 1: {df['agent1_cost'].sum():.4f} $") 
-                st.info(f"Total cost Agent 2: {df['agent2_cost'].sum():.4f} $")
-            with cols_plots[2]:
-                st.write("##### Response Time (s)")
-                st.line_chart(df[["agent1_time", "agent2_time"]], color=["#12c914", "#0074ba"])
-                st.success(f"Total time Agent 1: {df['agent1_time'].sum():.3f} s")
-                st.info(f"Total time Agent 2: {df['agent2_time'].sum():.3f} s")
-
+                                    "agent1_response": agent1_response,
+                                    "agent1_action": agent1_action,
+                                    "agent1_time": llm1_time,
+                                    "agent1_completion_tokens": completion_tokens1,
+                                    "agent1_cost": cost1,
+
+                                    "agent2_response": agent2_response,
+                                    "agent2_action": agent2_action,
+                                    "agent2_time": llm2_time,
+                                    "agent2_completion_tokens": completion_tokens2,
+                                    "agent2_cost": cost2,
+
+                                    **{f"agent1_{key}": value for key, value in info1.items()},
+                                    **{f"agent2_{key}": value for key, value in info2.items()},
+                                    **timer.fields(["food", "agents", "correct", "move"]),
+                                    })
+            game_history.records[-1].update(timer.fields(["history"]))
+
+            # The observers' time is the UI update, except the board rendering they time themselves
+            with timer.phase("ui"):
+                for observer in observers:
+                    if hasattr(observer, "on_turn"):
+                        observer.on_turn(board_config, board_state, game_history)
+            game_history.records[-1].update({"phase_render": 0, **timer.fields(["render", "ui"])})
+
+    finally:
+        # The workers are released even if an observer or an agent raised, a call abandoned by its deadline isn't waited for
+        executor.shutdown(wait=False, cancel_futures=True)
 
     # --- Winning rules ---
 
-    winner = None
-    if board_state["snake1"]["is_alive"] and not board_state["snake2"]["is_alive"]:
-        winner = "Agent 1"
-    elif board_state["snake2"]["is_alive"] and not board_state["snake1"]["is_alive"]:
-        winner = "Agent 2"
-    elif not board_state["snake1"]["is_alive"] and not board_state["snake2"]["is_alive"]:
-        winner = "Draw"
-    elif len(board_state["snake1"]["body"]) > len(board_state["snake2"]["body"]):
-        winner = "Agent 1"
-    elif len(board_state["snake2"]["body"]) > len(board_state["snake1"]["body"]):
-        winner = "Agent 2"
-    else:
-        winner = "Draw"
+    winner = get_winner(board_state)
+
+    for observer in observers:
+        if hasattr(observer, "on_game_over"):
+            observer.on_game_over(board_config, board_state, game_history, winner)
 
-    turn_counter.markdown(f"<h3 style='text-align:center'> Turn {turn} - WINNER: {winner} </h3>", unsafe_allow_html=True)
-    
-    st.toast(f"Game over! \nWinner: {winner}", icon="🟰" if winner=="Draw" else "🎉")
-    if winner != "Draw":
-        st.balloons()
\ No newline at end of file
+    return winner, game_history
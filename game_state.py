@@ -0,0 +1,191 @@
+from random import Random
+from collections import deque
+import numpy as np
+
+
+# Occupancy grid cell codes
+EMPTY = 0
+FOOD = 1
+SNAKE1 = 2
+SNAKE2 = 3
+
+# Head codes, only used by the board serializers (the occupancy grid doesn't distinguish the heads)
+SNAKE1_HEAD = 4
+SNAKE2_HEAD = 5
+
+SNAKE_CODES = {"snake1": SNAKE1, "snake2": SNAKE2}
+
+DIR_TO_DELTA = {
+    "U": (0, -1),
+    "D": (0, 1),
+    "L": (-1, 0),
+    "R": (1, 0),
+}
+
+
+class GameState:
+    """
+    Game state backed by a NumPy int8 occupancy grid (indexed as grid[y, x]) and a deque per snake body (head first),
+    so the membership checks of the game rules are O(1) instead of linear scans over the bodies' lists.
+    The empty cells are kept in an index updated with every cell change, so the food is placed with a single seeded random sample.
+    The dictionary form used in the prompts and in the game history is available with to_dict().
+    """
+
+    def __init__(self, board_config, board_state, seed=None):
+        self.grid_size = board_config["GRID_SIZE"]
+        self.grid = np.zeros((self.grid_size, self.grid_size), dtype=np.int8)
+        self.rng = Random(seed)
+
+        # Free cells index: list of the empty cells (y * G + x) and the position of every cell in that list (-1 if occupied), 
+        # so a uniformly random empty cell can be sampled and updated in O(1)
+        self.free_cells = list(range(self.grid_size * self.grid_size))
+        self.free_index = list(range(self.grid_size * self.grid_size))
+
+        self.turn = board_state["turn"]
+        self.snakes = {}
+        for snake_id in ["snake1", "snake2"]:
+            self.snakes[snake_id] = {
+                "body": deque(board_state[snake_id]["body"]),
+                "dir": board_state[snake_id]["dir"],
+                "is_alive": board_state[snake_id]["is_alive"],
+            }
+            for pos in board_state[snake_id]["body"]:
+                self.set_cell(pos, SNAKE_CODES[snake_id])
+
+        self.food = list(board_state["food"])
+        for pos in self.food:
+            self.set_cell(pos, FOOD)
+
+
+    def to_dict(self):
+        """
+        Returns the board state dictionary (new lists, so it can be stored in the history without copying it again).
+        """
+
+        return {
+            "turn": self.turn,
+            "snake1": {
+                "body": list(self.snakes["snake1"]["body"]),
+                "dir": self.snakes["snake1"]["dir"],
+                "is_alive": self.snakes["snake1"]["is_alive"],
+            },
+            "snake2": {
+                "body": list(self.snakes["snake2"]["body"]),
+                "dir": self.snakes["snake2"]["dir"],
+                "is_alive": self.snakes["snake2"]["is_alive"],
+            },
+            "food": list(self.food),
+        }
+
+
+    # --- Grid access ---
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size
+
+
+    def get_cell(self, pos):
+        return self.grid[pos[1], pos[0]]
+
+
+    def set_cell(self, pos, code):
+        if not self.in_bounds(pos):
+            return
+
+        prev_code = self.grid[pos[1], pos[0]]
+        self.grid[pos[1], pos[0]] = code
+
+        cell = pos[1] * self.grid_size + pos[0]
+        if prev_code == EMPTY and code != EMPTY:
+            # Removing the cell from the free cells list by swapping it with the last one
+            idx = self.free_index[cell]
+            last = self.free_cells.pop()
+            if last != cell:
+                self.free_cells[idx] = last
+                self.free_index[last] = idx
+            self.free_index[cell] = -1
+
+        elif prev_code != EMPTY and code == EMPTY:
+            self.free_index[cell] = len(self.free_cells)
+            self.free_cells.append(cell)
+
+
+    def is_free(self, pos):
+        return self.in_bounds(pos) and self.grid[pos[1], pos[0]] == EMPTY
+
+
+    # --- Game rules ---
+
+    def place_food(self):
+        """
+        Samples a uniformly random empty cell from the free cells index with the seeded random generator.
+        Returns the new food position or None if the board is full.
+        """
+
+        if not self.free_cells:
+            return None
+
+        cell = self.free_cells[self.rng.randrange(len(self.free_cells))]
+
+        return (cell % self.grid_size, cell // self.grid_size)
+
+
+    def add_food(self, pos):
+        self.food.append(pos)
+        self.set_cell(pos, FOOD)
+
+
+    def move_snake(self, snake_id):
+        """
+        Moves the snake one cell in its direction: the head is added and the tail removed unless the new head eats a food.
+        The new head is not written in the grid yet, so the collisions can be checked against the bodies of both snakes after moving.
+        Returns the new head position.
+        """
+
+        snake = self.snakes[snake_id]
+        head = snake["body"][0]
+        dx, dy = DIR_TO_DELTA[snake["dir"]]
+        head = (head[0] + dx, head[1] + dy)
+
+        if self.in_bounds(head) and self.grid[head[1], head[0]] == FOOD:
+            self.food.remove(head)
+            self.set_cell(head, EMPTY)
+        else:
+            tail = snake["body"].pop()
+            self.set_cell(tail, EMPTY)
+
+        return head
+
+
+    def play_turn(self, agent1_action, agent2_action):
+        """
+        Receives both agents' actions (None keeps the current direction).
+        Applies the actions, moves both snakes, checks the collisions (a head dies out of the board, in a body or in the other head) and updates the is_alive flags.
+        Returns True if the game is over.
+        """
+
+        if agent1_action is not None:
+            self.snakes["snake1"]["dir"] = agent1_action
+
+        if agent2_action is not None:
+            self.snakes["snake2"]["dir"] = agent2_action
+
+        # Move snakes, the tails are already removed from the grid when the heads are checked
+        head1 = self.move_snake("snake1")
+        head2 = self.move_snake("snake2")
+
+        # Check if game is over: out of the board, any snake's body or both heads in the same cell
+        is_dead1 = not self.in_bounds(head1) or self.grid[head1[1], head1[0]] in (SNAKE1, SNAKE2) or head1 == head2
+        is_dead2 = not self.in_bounds(head2) or self.grid[head2[1], head2[0]] in (SNAKE1, SNAKE2) or head1 == head2
+
+        for snake_id, head in [("snake1", head1), ("snake2", head2)]:
+            self.snakes[snake_id]["body"].appendleft(head)
+            self.set_cell(head, SNAKE_CODES[snake_id])
+
+        if is_dead1:
+            self.snakes["snake1"]["is_alive"] = False
+
+        if is_dead2:
+            self.snakes["snake2"]["is_alive"] = False
+
+        return is_dead1 or is_dead2
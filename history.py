@@ -0,0 +1,158 @@
+from collections import deque
+
+from metrics import MetricsAccumulator
+
+
+KEYFRAME_INTERVAL = 20
+
+
+# --- Deltas ---
+
+def make_delta(prev_state, board_state):
+    """
+    Receives two consecutive board states.
+    Returns the delta between them: the turn, every snake's new head, whether its tail was removed, its direction and alive flag,
+    and the food added and eaten (the food list keeps its order: eaten food is removed and new food is appended).
+    """
+
+    delta = {"turn": board_state["turn"]}
+
+    for snake_id in ["snake1", "snake2"]:
+        prev_body, body = prev_state[snake_id]["body"], board_state[snake_id]["body"]
+        delta[snake_id] = {
+            "head": body[0],
+            "tail_removed": len(body) == len(prev_body),
+            "dir": board_state[snake_id]["dir"],
+            "is_alive": board_state[snake_id]["is_alive"],
+        }
+
+    food_eaten = [pos for pos in prev_state["food"] if pos not in board_state["food"]]
+    delta["food_eaten"] = food_eaten
+    delta["food_added"] = board_state["food"][len(prev_state["food"]) - len(food_eaten):]
+
+    return delta
+
+
+def apply_delta(state, delta):
+    """
+    Receives a working state (board state with the bodies as deques) and the delta of the next turn.
+    Applies the delta in place.
+    """
+
+    state["turn"] = delta["turn"]
+
+    for snake_id in ["snake1", "snake2"]:
+        snake_delta = delta[snake_id]
+        body = state[snake_id]["body"]
+        body.appendleft(snake_delta["head"])
+        if snake_delta["tail_removed"]:
+            body.pop()
+        state[snake_id]["dir"] = snake_delta["dir"]
+        state[snake_id]["is_alive"] = snake_delta["is_alive"]
+
+    for pos in delta["food_eaten"]:
+        state["food"].remove(pos)
+    state["food"].extend(delta["food_added"])
+
+
+def to_working_state(board_state):
+    return {
+        "turn": board_state["turn"],
+        "snake1": {**board_state["snake1"], "body": deque(board_state["snake1"]["body"])},
+        "snake2": {**board_state["snake2"], "body": deque(board_state["snake2"]["body"])},
+        "food": list(board_state["food"]),
+    }
+
+
+def to_board_state(state):
+    return {
+        "turn": state["turn"],
+        "snake1": {**state["snake1"], "body": list(state["snake1"]["body"])},
+        "snake2": {**state["snake2"], "body": list(state["snake2"]["body"])},
+        "food": list(state["food"]),
+    }
+
+
+# --- History ---
+
+class GameHistory:
+    """
+    Game history stored as per-turn deltas of the board state, with a full keyframe every keyframe_interval turns, instead of a copy of the whole board every turn.
+    It behaves like the list of turn dicts used before: game_history[i] (also negative) and iteration return the turn's metrics with its "board_state"
+    reconstructed from the closest keyframe. The metrics alone are available in the records list without reconstructing any board
+    and their per-turn columns and running totals in the metrics accumulator.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.records = []
+        self.deltas = []
+        self.keyframes = {}
+        self.metrics = MetricsAccumulator()
+
+        # PhaseTimer of the match being played (set by the game engine), the observers time their board rendering with it
+        self.timer = None
+
+        # Last reconstructed state, so sequential access only applies one delta per turn
+        self.cached_idx = None
+        self.cached_state = None
+        self.last_state = None
+
+
+    def append(self, turn):
+        """
+        Receives a turn dict with the agents' metrics and the "board_state" after the turn.
+        """
+
+        board_state = turn["board_state"]
+        idx = len(self.records)
+
+        self.records.append({key: value for key, value in turn.items() if key != "board_state"})
+        self.metrics.append(turn)
+        self.deltas.append(None if idx == 0 else make_delta(self.last_state, board_state))
+        if idx % self.keyframe_interval == 0:
+            self.keyframes[idx] = to_board_state(to_working_state(board_state))
+
+        self.last_state = board_state
+
+
+    def __len__(self):
+        return len(self.records)
+
+
+    def board_state(self, idx):
+        """
+        Receives the turn index (negative values count from the end).
+        Returns the board state after that turn.
+        """
+
+        if idx < 0:
+            idx += len(self.records)
+        if not 0 <= idx < len(self.records):
+            raise IndexError("game history index out of range")
+
+        # Starting from the cached state if it is between the closest keyframe and the requested turn
+        keyframe_idx = idx - idx % self.keyframe_interval
+        if self.cached_idx is not None and keyframe_idx <= self.cached_idx <= idx:
+            start_idx, state = self.cached_idx, self.cached_state
+        else:
+            start_idx, state = keyframe_idx, to_working_state(self.keyframes[keyframe_idx])
+
+        for i in range(start_idx + 1, idx + 1):
+            apply_delta(state, self.deltas[i])
+
+        self.cached_idx, self.cached_state = idx, state
+
+        return to_board_state(state)
+
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self.records)))]
+
+        return {"board_state": self.board_state(idx), **self.records[idx]}
+
+
+    def __iter__(self):
+        for idx in range(len(self.records)):
+            yield self[idx]
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from time import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses keyed by the backend, the model, the temperature, the response mode and a hash of the formatted messages.
+    It has an in-memory LRU layer in front of a SQLite file with a maximum number of entries (the least recently used ones are evicted).
+    Every entry keeps the original completion tokens and cost, so cached hits can still report them.
+    By default only deterministic calls (temperature 0) are cached, as other calls are expected to return different responses.
+    """
+
+    def __init__(self, path=".llm_cache.sqlite", max_memory_entries=1024, max_disk_entries=100000, only_deterministic=True):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.only_deterministic = only_deterministic
+
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Last access time of the memory hits not written yet, they are written in batch before the disk eviction
+        self.touched = {}
+
+        # The connection is shared by the threads of the concurrent agents and matches, the lock serializes its use
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                               key TEXT PRIMARY KEY,
+                               response TEXT,
+                               completion_tokens INTEGER,
+                               cost REAL,
+                               last_access REAL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.db.commit()
+
+
+    def is_cacheable(self, llm):
+        """
+        Receives the langchain chat model.
+        Returns True if its responses can be cached (temperature 0, or any temperature if only_deterministic is False).
+        """
+
+        return not self.only_deterministic or (getattr(llm, "temperature", 0) or 0) == 0
+
+
+    def make_key(self, llm, messages, mode="full"):
+        """
+        Receives the langchain chat model (or shared LLM client), the formatted messages and the response mode: "full" or "stop_early"
+        (streamed and cut once the move is committed, so it must not be served to the calls that expect the whole response).
+        Returns the cache key: a hash of the backend, the model name, the temperature, the mode and the messages' types and contents.
+        """
+
+        # The same model name in two backends (e.g. openai:X and local:X) are different models, plain langchain models are OpenAI ones
+        backend = getattr(getattr(llm, "backend", None), "name", "openai")
+        model = getattr(llm, "model_name", type(llm).__name__)
+        temperature = getattr(llm, "temperature", None)
+        payload = json.dumps([backend, model, temperature, mode, [(message.type, message.content) for message in messages]], ensure_ascii=False)
+
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+    def get(self, key):
+        """
+        Receives a cache key.
+        Returns the cached (response, completion_tokens, cost) or None.
+        """
+
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.touched[key] = time()
+                return self.memory[key]
+
+            row = self.db.execute("SELECT response, completion_tokens, cost FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time(), key))
+            self.db.commit()
+
+            entry = tuple(row)
+            self.remember(key, entry)
+
+            return entry
+
+
+    def put(self, key, response, completion_tokens, cost):
+        """
+        Stores a response with its original completion tokens and cost in both layers.
+        """
+
+        entry = (response, completion_tokens, cost)
+
+        with self.lock:
+            self.remember(key, entry)
+
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, response, completion_tokens, cost, time()))
+            self.touched.pop(key, None)
+            self.write_touched()
+
+            # Evicting the least recently used entries above the disk size cap
+            n_entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if n_entries > self.max_disk_entries:
+                self.db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)", (n_entries - self.max_disk_entries,))
+
+            self.db.commit()
+
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+
+    def write_touched(self):
+        """
+        Writes the last access time of the memory hits to the disk layer, so its eviction also keeps the entries only read from memory.
+        The lock must be held by the caller.
+        """
+
+        if self.touched:
+            self.db.executemany("UPDATE responses SET last_access = ? WHERE key = ?", [(t, key) for key, t in self.touched.items()])
+            self.touched.clear()
+
+
+    def close(self):
+        with self.lock:
+            self.write_touched()
+            self.db.commit()
+            self.db.close()
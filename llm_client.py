@@ -0,0 +1,249 @@
+import random
+import logging
+import threading
+from time import time, sleep
+
+import openai
+import requests
+
+from prompt_tokens import count_messages_tokens, count_tokens
+
+
+# Transient errors of the OpenAI API that are retried
+RETRYABLE_ERRORS = (
+    openai.error.Timeout,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+)
+
+POOL_MAXSIZE = 64
+
+
+# --- Rate limits ---
+
+class TokenBucket:
+    """
+    Token bucket refilled at a constant rate per minute, with the capacity of one minute. acquire() waits until the amount is available,
+    consume() debits an amount known after the call (the bucket can go negative, delaying the next calls).
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.tokens = rate_per_minute
+        self.updated = time()
+        self.lock = threading.Lock()
+
+
+    def refill(self):
+        now = time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def acquire(self, amount=1):
+        # An amount larger than the capacity waits until the bucket is full
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_time = (amount - self.tokens) / self.rate
+
+            sleep(wait_time)
+
+
+    def consume(self, amount):
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+
+
+class ModelLimiter:
+    """
+    Requests per minute and tokens per minute limits of a model, shared by all the agents and matches that use it.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+
+    def acquire(self, prompt_tokens):
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None:
+            self.tokens.acquire(prompt_tokens)
+
+
+    def record(self, completion_tokens):
+        if self.tokens is not None:
+            self.tokens.consume(completion_tokens)
+
+
+# Limiters of every "backend:model_name" id (the same model name in two backends are different servers), looked up on every call
+# so they also apply to the clients created before setting them
+MODEL_LIMITERS = {}
+
+
+def set_model_limits(model_id, requests_per_minute=None, tokens_per_minute=None):
+    """
+    Receives the "backend:model_name" id of the model (e.g. "openai:gpt-4", see backends.model_id()) and its requests and tokens per minute limits (None for no limit).
+    """
+
+    MODEL_LIMITERS[model_id] = ModelLimiter(requests_per_minute, tokens_per_minute)
+
+
+# --- Retries ---
+
+def backoff_delay(attempt, error=None, base_delay=1, max_delay=60):
+    """
+    Receives the retry attempt number (0 for the first retry), the error and the base and maximum delays in seconds.
+    Returns the seconds to wait: the Retry-After header of the error if the API sent one, otherwise a "full jitter" exponential backoff
+    (uniform between 0 and base_delay * 2^attempt), so the concurrent matches that failed together don't retry together.
+    """
+
+    headers = getattr(error, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+# --- Clients ---
+
+class LLMClient:
+    """
+    Wrapper of a langchain chat model shared by all the agents and matches of the same model and temperature. Every request waits for the model's limiter
+    (requests and estimated prompt tokens) and the transient errors are retried with jittered exponential backoff. It exposes the wrapped model's attributes
+    (model_name, temperature...) for the response cache and its backend for the token accounting and the prices.
+    """
+
+    def __init__(self, llm, backend, max_retries=5, base_delay=1, max_delay=60):
+        self.llm = llm
+        self.backend = backend
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+
+    def acquire(self, messages):
+        """
+        Waits for the model's limiter, if it has one, with the prompt tokens of the messages.
+        Returns the limiter or None.
+        """
+
+        limiter = MODEL_LIMITERS.get(f"{self.backend.name}:{getattr(self.llm, 'model_name', None)}")
+        if limiter is not None:
+            encoder = self.backend.encoder(self.llm.model_name) if limiter.tokens is not None else None
+            limiter.acquire(count_messages_tokens(encoder, messages) if encoder is not None else 0)
+
+        return limiter
+
+
+    def record(self, limiter, response):
+        if limiter is not None and limiter.tokens is not None:
+            encoder = self.backend.encoder(self.llm.model_name)
+            limiter.record(count_tokens(encoder, response) if encoder is not None else 0)
+
+
+    def retry_or_raise(self, attempt, error):
+        if attempt >= self.max_retries:
+            raise error
+        delay = backoff_delay(attempt, error, self.base_delay, self.max_delay)
+        logging.warning(f"LLM call failed ({type(error).__name__}: {error}), retrying in {delay:.1f} s")
+        sleep(delay)
+
+
+    def __call__(self, messages):
+        attempt = 0
+        while True:
+            limiter = self.acquire(messages)
+            try:
+                response = self.llm(messages)
+                break
+            except RETRYABLE_ERRORS as e:
+                self.retry_or_raise(attempt, e)
+                attempt += 1
+
+        self.record(limiter, response.content)
+
+        return response
+
+
+    def stream(self, messages):
+        """
+        Streams the response chunks. The call is retried until its first chunk arrives, an error in the middle of the stream is raised
+        as the chunks were already consumed.
+        """
+
+        attempt = 0
+        while True:
+            limiter = self.acquire(messages)
+            stream = self.llm.stream(messages)
+            try:
+                first_chunk = next(stream, None)
+                break
+            except RETRYABLE_ERRORS as e:
+                stream.close()
+                self.retry_or_raise(attempt, e)
+                attempt += 1
+
+        text = ""
+        try:
+            if first_chunk is not None:
+                text += first_chunk.content
+                yield first_chunk
+            for chunk in stream:
+                text += chunk.content
+                yield chunk
+        finally:
+            stream.close()
+            self.record(limiter, text)
+
+
+# Shared clients by (backend, model name, temperature, API key), so the app reruns, the agents and the concurrent matches reuse them
+CLIENTS = {}
+CLIENTS_LOCK = threading.Lock()
+
+
+def install_session_pool(pool_maxsize=POOL_MAXSIZE):
+    """
+    Makes the OpenAI library use a single HTTP session with a connection pool for all the threads (by default it creates one per thread,
+    so the new threads of every match would open new connections).
+    """
+
+    if not openai.requestssession:
+        session = requests.Session()
+        session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=2))
+        session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=2))
+        openai.requestssession = session
+
+
+def get_client(backend, model_name, temperature, api_key):
+    """
+    Receives the backend (see backends.py), the model name used in the API calls, the temperature and the API key.
+    Returns the shared LLMClient of those settings, with the chat model created by the backend on the first request.
+    """
+
+    key = (backend.name, model_name, temperature, api_key)
+    with CLIENTS_LOCK:
+        if key not in CLIENTS:
+            install_session_pool()
+            CLIENTS[key] = LLMClient(backend.chat_model(model_name, temperature, api_key), backend)
+
+        return CLIENTS[key]
@@ -0,0 +1,60 @@
+from array import array
+from math import nan
+
+
+# Per-agent metrics of every turn in the game history records
+METRIC_COLUMNS = [
+    "agent1_completion_tokens", "agent2_completion_tokens",
+    "agent1_cost", "agent2_cost",
+    "agent1_time", "agent2_time",
+]
+
+
+class MetricsAccumulator:
+    """
+    Running per-turn metrics of a match: one columnar array per metric and the running totals,
+    so the UI and the summaries don't have to rebuild a DataFrame or sum the whole history every turn.
+    Unknown values (None, e.g. the tokens and cost of a call abandoned by its deadline) are NaN in the arrays and counted apart from the totals.
+    """
+
+    def __init__(self, columns=METRIC_COLUMNS):
+        self.columns = {column: array("d") for column in columns}
+        self.totals = {column: 0 for column in columns}
+        self.unknown = {column: 0 for column in columns}
+
+
+    def append(self, record):
+        """
+        Receives a turn record with the metric columns and adds it to the arrays and the running totals.
+        """
+
+        for column, values in self.columns.items():
+            value = record[column]
+            if value is None:
+                values.append(nan)
+                self.unknown[column] += 1
+            else:
+                values.append(value)
+                self.totals[column] += value
+
+
+    def total(self, column):
+        """
+        Receives a metric column.
+        Returns its total or None if the value of any turn is unknown.
+        """
+
+        return None if self.unknown[column] else self.totals[column]
+
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+
+    def rows(self, columns, start=0):
+        """
+        Receives a list of metric columns and the first row index.
+        Returns a dictionary with the values of those columns from that row on, to append them to a chart.
+        """
+
+        return {column: self.columns[column][start:].tolist() for column in columns}
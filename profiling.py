@@ -0,0 +1,129 @@
+import cProfile
+from time import perf_counter
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# Per-agent timed fields of the history records: prompt rendering, LLM wait (or the policy's time) and response parsing
+AGENT_TIME_FIELDS = ["prompt_time", "time", "parse_time"]
+
+PERCENTILES = [50, 95, 99]
+
+
+class PhaseTimer:
+    """
+    Timers of the phases of every turn of the game loop (food placement, agents, moves correction, move and collisions, history, board rendering and UI update).
+    phase() is a context manager adding the elapsed time to the current turn, the time of a phase nested in another one (e.g. the board rendering
+    inside an observer's UI update) is only counted in the inner phase. Every measured time is also sent to the optional trace_hook(phase, turn, seconds),
+    to feed an external metrics pipeline.
+    """
+
+    def __init__(self, trace_hook=None):
+        self.trace_hook = trace_hook
+        self.turn = 0
+        self.times = {}
+
+        # Time of the phases nested in every open phase
+        self.stack = []
+
+
+    def start_turn(self, turn):
+        self.turn = turn
+        self.times = {}
+
+
+    @contextmanager
+    def phase(self, name):
+        t0 = perf_counter()
+        self.stack.append(0)
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - t0
+            nested = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+            self.add(name, elapsed - nested)
+
+
+    def add(self, name, seconds):
+        self.times[name] = self.times.get(name, 0) + seconds
+        self.trace(name, seconds)
+
+
+    def trace(self, name, seconds):
+        if self.trace_hook is not None:
+            self.trace_hook(name, self.turn, seconds)
+
+
+    def fields(self, names=None):
+        """
+        Receives the phases to export (all the measured ones if None).
+        Returns the history fields of the current turn: phase_<name> in seconds.
+        """
+
+        return {f"phase_{name}": seconds for name, seconds in self.times.items() if names is None or name in names}
+
+
+def is_time_field(key):
+    return key.startswith("phase_") or any(key == f"agent{n}_{field}" for n in (1, 2) for field in AGENT_TIME_FIELDS)
+
+
+def phase_stats(records, percentiles=PERCENTILES):
+    """
+    Receives the game history records of one or several matches (the initial record of every match has no timers).
+    Returns the count, mean, total and percentiles (p50, p95, p99 by default) in seconds of every timed field: the engine phases (phase_*)
+    and the agents' prompt rendering, LLM wait and parsing times.
+    """
+
+    columns = {}
+    for record in records:
+        if record.get("agent1_response") is None and record.get("agent2_response") is None:
+            continue
+        for key, value in record.items():
+            if is_time_field(key) and value is not None:
+                columns.setdefault(key, []).append(value)
+
+    stats = {}
+    for key, values in columns.items():
+        values = np.asarray(values, dtype=float)
+        stats[key] = {"count": len(values), "mean": float(values.mean()), "total": float(values.sum()),
+                      **{f"p{p}": float(value) for p, value in zip(percentiles, np.percentile(values, percentiles))}}
+
+    return stats
+
+
+def format_phase_stats(stats):
+    """
+    Receives the stats returned by phase_stats().
+    Returns them as a text table in milliseconds, sorted by total time.
+    """
+
+    percentile_keys = [key for key in next(iter(stats.values()), {}) if key.startswith("p")]
+    lines = [f"{'Phase (ms)':<24} {'count':>6} {'mean':>9} " + " ".join(f"{key:>9}" for key in percentile_keys) + f" {'total':>10}"]
+    for key, stat in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+        lines.append(f"{key:<24} {stat['count']:>6} {1000 * stat['mean']:>9.3f} " + " ".join(f"{1000 * stat[p]:>9.3f}" for p in percentile_keys) + f" {1000 * stat['total']:>10.1f}")
+
+    return "\n".join(lines)
+
+
+@contextmanager
+def profile_to(path):
+    """
+    Receives the path of the profile dump (None to not profile).
+    Profiles the block with cProfile and dumps the stats to the path, to be loaded with pstats or a viewer such as snakeviz.
+    Only the calling thread is profiled, the agents' calls in the engine's worker threads show up as the wait on their futures.
+    """
+
+    if path is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
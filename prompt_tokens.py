@@ -0,0 +1,61 @@
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+
+# Tokens added by the chat format to every message and to prime the reply (OpenAI chat models)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Models unknown to the installed tiktoken version are counted with the encoding of a close model
+ENCODING_ALIASES = {
+    "gpt-4o-2024-05-13": "gpt-4-1106-preview",
+}
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name):
+    """
+    Receives the model name used in the API calls.
+    Returns its tiktoken encoding, created only once per model (cl100k_base for unknown models),
+    or None if it can't be loaded (e.g. the encoding files can't be downloaded), so the accounting is skipped instead of failing the turn.
+    """
+
+    model_name = ENCODING_ALIASES.get(model_name, model_name)
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"Tiktoken encoding for {model_name} not available, prompt tokens won't be counted: {e}")
+        return None
+
+
+def count_tokens(encoder, text):
+    return len(encoder.encode(text))
+
+
+def count_messages_tokens(encoder, messages):
+    """
+    Receives the tiktoken encoding and the formatted langchain messages.
+    Returns the number of input tokens of the request: the contents plus the chat format overhead of every message and of the reply.
+    """
+
+    return sum(TOKENS_PER_MESSAGE + len(encoder.encode(message.content)) for message in messages) + TOKENS_PER_REPLY
+
+
+def llm_encoder(llm):
+    """
+    Receives the LLM client (or a langchain chat model exposing its model_name).
+    Returns the tokenizer of the client's backend, or the cached tiktoken encoding of the model, or None.
+    """
+
+    model_name = getattr(llm, "model_name", None)
+    backend = getattr(llm, "backend", None)
+    if backend is not None:
+        return backend.encoder(model_name)
+
+    return get_encoder(model_name) if model_name is not None else None
+
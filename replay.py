@@ -0,0 +1,168 @@
+import argparse
+import json
+
+from game_engine import game_engine
+from board_plot import board_plot
+
+
+REPLAY_VERSION = 1
+
+AGENT_FIELDS = ["action", "response", "time", "completion_tokens", "cost"]
+
+
+# --- Utils ---
+
+def board_state_from_json(board_state):
+    """
+    Receives a board state loaded from JSON (positions as lists).
+    Returns the board state with the positions as (x, y) tuples, as the game engine uses them.
+    """
+
+    return {
+        "turn": board_state["turn"],
+        "snake1": {**board_state["snake1"], "body": [tuple(pos) for pos in board_state["snake1"]["body"]]},
+        "snake2": {**board_state["snake2"], "body": [tuple(pos) for pos in board_state["snake2"]["body"]]},
+        "food": [tuple(pos) for pos in board_state["food"]],
+    }
+
+
+def board_config_from_json(board_config):
+    """
+    Receives a board configuration loaded from JSON.
+    Returns it with the colors as tuples, as they are defined in the code.
+    """
+
+    return {key: tuple(value) if isinstance(value, list) else value for key, value in board_config.items()}
+
+
+# --- Recording ---
+
+class ReplayRecorder:
+    """
+    Game engine observer that streams a match to a JSON lines replay file with append-only writes:
+    - a header with the format version, the board configuration, the initial board state, the seed and optional metadata (e.g. models and prompts)
+    - one line per turn with both agents' action, response, time, completion tokens, cost and extra info (e.g. cached)
+    - a final line with the result
+    The board states are not stored, the match is reproduced deterministically from the seed and the actions with replay_match().
+    """
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.metadata = metadata if metadata is not None else {}
+        self.file = None
+
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+
+    def on_game_start(self, board_config, board_state, seed):
+        self.file = open(self.path, "w", encoding="utf-8")
+        self.write({"type": "header",
+                    "version": REPLAY_VERSION,
+                    "board_config": board_config,
+                    "board_state_0": board_state,
+                    "seed": seed,
+                    "metadata": self.metadata})
+
+
+    def on_turn(self, board_config, board_state, game_history):
+        self.write({"type": "turn", "turn": board_state["turn"], **game_history.records[-1]})
+
+
+    def on_game_over(self, board_config, board_state, game_history, winner):
+        self.write({"type": "result", "winner": winner, "turns": board_state["turn"]})
+        self.file.close()
+
+
+# --- Replaying ---
+
+def load_replay(path):
+    """
+    Receives the path of a replay file.
+    Returns the header, the list of turn records and the result record (None if the match didn't finish).
+    """
+
+    header, turns, result = None, [], None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "header":
+                header = record
+            elif record["type"] == "turn":
+                turns.append(record)
+            elif record["type"] == "result":
+                result = record
+
+    if header is None:
+        raise ValueError(f"Replay file without header: {path}")
+    if header["version"] != REPLAY_VERSION:
+        raise ValueError(f"Unsupported replay version {header['version']} in {path}")
+
+    return header, turns, result
+
+
+def replay_policy(turns, agent_number):
+    """
+    Receives the turn records of a replay and the agent int number.
+    Returns a policy function for the game engine that plays the recorded actions (and reports the recorded metrics) without calling any LLM.
+    """
+
+    records = {record["turn"]: record for record in turns}
+
+    prefix = f"agent{agent_number}_"
+
+    def policy(agent, board_config, board_state, game_state):
+        record = records[board_state["turn"]]
+        info = {key[len(prefix):]: value for key, value in record.items() if key.startswith(prefix) and key[len(prefix):] not in AGENT_FIELDS}
+        return tuple(record[prefix + field] for field in AGENT_FIELDS) + (info,)
+
+    return policy
+
+
+def replay_match(path, observers=None):
+    """
+    Receives the path of a replay file and an optional list of observers (e.g. to render the match again).
+    Plays the match again through the game engine with the recorded seed and actions, without calling any LLM.
+    Returns the winner and the full game history. Raises a ValueError if the replay doesn't reach the recorded result.
+    """
+
+    header, turns, result = load_replay(path)
+
+    agent1 = {"policy": replay_policy(turns, 1)}
+    agent2 = {"policy": replay_policy(turns, 2)}
+
+    # Unfinished matches are replayed up to their last recorded turn
+    board_config = board_config_from_json(header["board_config"])
+    if result is None:
+        board_config["MAX_TURNS"] = len(turns)
+
+    winner, game_history = game_engine(board_config=board_config,
+                                       board_state_0=board_state_from_json(header["board_state_0"]),
+                                       agent1=agent1,
+                                       agent2=agent2,
+                                       observers=observers,
+                                       seed=header["seed"])
+
+    if result is not None and (winner != result["winner"] or game_history[-1]["board_state"]["turn"] != result["turns"]):
+        raise ValueError(f"Replay diverged from the recorded result in {path}: {winner} in {game_history[-1]['board_state']['turn']} turns")
+
+    return winner, game_history
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Replay a recorded match through the game engine without calling any LLM.")
+    parser.add_argument("replay", help="Replay file (JSON lines)")
+    parser.add_argument("--save-dir", default=None, help="Directory to save the board of every turn as a PNG image")
+    args = parser.parse_args()
+
+    winner, game_history = replay_match(args.replay)
+
+    if args.save_dir is not None:
+        board_config = board_config_from_json(load_replay(args.replay)[0]["board_config"])
+        for turn in game_history:
+            board_plot(board_config, turn["board_state"], save_dir=args.save_dir)
+
+    print(f"Winner: {winner} in {game_history[-1]['board_state']['turn']} turns")
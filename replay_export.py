@@ -0,0 +1,239 @@
+import argparse
+import os
+import threading
+from collections import Counter
+from queue import Queue, Full
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+from PIL import Image
+
+from board_plot import BoardRenderer
+from replay import replay_match
+
+
+# Frames rendered ahead of the encoder, it bounds the memory used when the encoder is slower than the renderer
+QUEUE_SIZE = 16
+
+
+# --- Writers ---
+
+class VideoFileWriter:
+    """
+    MP4 writer streaming every BGR frame to cv2.VideoWriter (mp4v codec), so only one frame is kept in memory.
+    """
+
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.writer = None
+
+
+    def write(self, frame):
+        # The video size is the one of the first frame
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (width, height))
+            if not self.writer.isOpened():
+                raise RuntimeError(f"OpenCV can't write the video {self.path}")
+        self.writer.write(frame)
+
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+class AnimatedImageWriter:
+    """
+    Animated GIF or WebP writer with Pillow. Pillow saves all the frames at the end, so every frame is converted when it arrives
+    (to a palette for the GIFs, exact with the fast octree method as the boards only have a few colors) and the file is written by close().
+    """
+
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.is_gif = path.lower().endswith(".gif")
+        self.frames = []
+
+
+    def write(self, frame):
+        image = Image.fromarray(frame[:, :, ::-1])
+        self.frames.append(image.quantize(colors=256, method=Image.Quantize.FASTOCTREE) if self.is_gif else image)
+
+
+    def close(self):
+        if not self.frames:
+            return
+
+        options = {"lossless": True} if not self.is_gif else {}
+        self.frames[0].save(self.path, save_all=True, append_images=self.frames[1:], duration=round(1000 / self.fps), loop=0, **options)
+
+
+WRITERS = {
+    "mp4": VideoFileWriter,
+    "gif": AnimatedImageWriter,
+    "webp": AnimatedImageWriter,
+}
+
+
+# --- Export ---
+
+class ExportStopped(Exception):
+    pass
+
+
+class FramesObserver:
+    """
+    Game engine observer producing the frames of the export pipeline: it renders the board of every turn while the match is replayed
+    (only the cells that changed are repainted) and puts the frames in the queue, repeating the final one hold_frames times.
+    If the consumer stops, the next put raises ExportStopped so the replay ends.
+    """
+
+    def __init__(self, frames_queue, stop, hold_frames=0):
+        self.frames_queue = frames_queue
+        self.stop = stop
+        self.hold_frames = hold_frames
+        self.renderer = None
+
+
+    def put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.frames_queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+        raise ExportStopped()
+
+
+    def on_game_start(self, board_config, board_state, seed):
+        self.renderer = BoardRenderer(board_config)
+        self.put(self.renderer.render(board_state))
+
+
+    def on_turn(self, board_config, board_state, game_history):
+        self.put(self.renderer.render(board_state))
+
+
+    def on_game_over(self, board_config, board_state, game_history, winner):
+        frame = self.renderer.render(board_state)
+        for _ in range(self.hold_frames):
+            self.put(frame)
+
+
+def produce_frames(replay_path, observer):
+    """
+    Receives the path of the replay file and the FramesObserver.
+    Producer thread of the export pipeline: replays the match with the observer and puts None in the queue when it finishes (or the exception if it fails).
+    """
+
+    try:
+        replay_match(replay_path, observers=[observer])
+        observer.put(None)
+    except ExportStopped:
+        pass
+    except Exception as e:
+        try:
+            observer.put(e)
+        except ExportStopped:
+            pass
+
+
+def export_replay(replay_path, out_path, fps=4, hold=1.0, queue_size=QUEUE_SIZE):
+    """
+    Receives the path of a replay file, the output path (.mp4, .gif or .webp), the frames per second, the seconds the final board is shown
+    and the maximum number of frames rendered ahead of the encoder.
+    Replays the match without calling any LLM and exports its boards as a video or an animated image. The match is replayed and its frames rendered
+    in a thread while the previous frames are encoded, so the encoding overlaps the frame generation.
+    Returns the number of frames written.
+    """
+
+    extension = os.path.splitext(out_path)[1].lower().lstrip(".")
+    if extension not in WRITERS:
+        raise ValueError(f"Unsupported export format {extension}, it must be one of {list(WRITERS)}")
+
+    frames_queue = Queue(maxsize=queue_size)
+    stop = threading.Event()
+    observer = FramesObserver(frames_queue, stop, hold_frames=round(hold * fps))
+    producer = threading.Thread(target=produce_frames, args=(replay_path, observer), daemon=True)
+    producer.start()
+
+    writer = WRITERS[extension](out_path, fps)
+    n_frames = 0
+    try:
+        while True:
+            frame = frames_queue.get()
+            if frame is None:
+                break
+            if isinstance(frame, Exception):
+                raise frame
+            writer.write(frame)
+            n_frames += 1
+    finally:
+        # The producer is stopped if the encoding failed
+        stop.set()
+        producer.join()
+        writer.close()
+
+    return n_frames
+
+
+def export_paths(replay_paths, out_dir, format):
+    """
+    Receives the paths of the replay files, the output directory and the format.
+    Returns the dictionary of the output path of every replay path, named as its replay file (e.g. match_0000.mp4) or prefixed with the name
+    of its directory when several replays have the same name, as every run_matches.py and tournament.py output (e.g. tournament_match_0000.mp4).
+    Raises a ValueError if two replays still get the same output path, so no export overwrites another one.
+    """
+
+    names = {path: os.path.splitext(os.path.basename(path))[0] for path in replay_paths}
+    name_counts = Counter(names.values())
+
+    out_paths = {}
+    for path, name in names.items():
+        if name_counts[name] > 1:
+            name = f"{os.path.basename(os.path.dirname(os.path.abspath(path)))}_{name}"
+        out_paths[path] = os.path.join(out_dir, f"{name}.{format}")
+
+    duplicates = [out_path for out_path, count in Counter(out_paths.values()).items() if count > 1]
+    if duplicates:
+        raise ValueError(f"Several replays would be exported to {duplicates}, rename their files or directories")
+
+    return out_paths
+
+
+def export_replays(replay_paths, out_dir, format="mp4", fps=4, hold=1.0, max_workers=None):
+    """
+    Receives the paths of the replay files, the output directory, the format (mp4, gif or webp), the frames per second, the seconds the final board is shown
+    and the maximum number of processes (the number of CPUs if None).
+    Exports every match in a process pool, with the name of its replay file (see export_paths()).
+    Returns the dictionary of the output path of every replay path.
+    """
+
+    out_paths = export_paths(replay_paths, out_dir, format)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Every export is CPU bound (rendering and encoding), one process per match
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(export_replay, path, out_path, fps, hold): path for path, out_path in out_paths.items()}
+        for future in as_completed(futures):
+            n_frames = future.result()
+            print(f"{futures[future]} -> {out_paths[futures[future]]} ({n_frames} frames)")
+
+    return out_paths
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Export recorded matches as MP4 videos or animated GIF/WebP images without calling any LLM.")
+    parser.add_argument("replays", nargs="+", help="Replay files (JSON lines)")
+    parser.add_argument("--out-dir", default="./videos/", help="Output directory, every export is named as its replay file")
+    parser.add_argument("--format", default="mp4", choices=list(WRITERS), help="Output format")
+    parser.add_argument("--fps", type=float, default=4, help="Turns per second")
+    parser.add_argument("--hold", type=float, default=1.0, help="Seconds the final board is shown")
+    parser.add_argument("--workers", type=int, default=None, help="Matches exported at the same time (processes), the number of CPUs by default")
+    args = parser.parse_args()
+
+    export_replays(args.replays, args.out_dir, format=args.format, fps=args.fps, hold=args.hold, max_workers=args.workers)
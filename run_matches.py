@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import dotenv
+
+from game_engine import game_engine, board_config, board_state_0, TIMEOUT_FALLBACKS
+from agents import AVAILABLE_MODELS, DEFAULT_PROMPT1, DEFAULT_PROMPT2
+from backends import build_agent_llm, model_id
+from llm_client import set_model_limits
+from replay import ReplayRecorder
+from llm_cache import ResponseCache
+from conversation import MEMORY_POLICIES
+from profiling import phase_stats, format_phase_stats, profile_to
+
+
+dotenv.load_dotenv()
+
+
+# --- Utils ---
+
+def load_prompt(prompt_path, default_prompt):
+    """
+    Receives the path to a JSON file with the "sys_msg" and "human_msg" keys (or None) and the default prompt list.
+    Returns the prompt dictionary to be used by the agent.
+    """
+
+    if prompt_path is None:
+        return {"sys_msg": default_prompt[0], "human_msg": default_prompt[1]}
+
+    with open(prompt_path, "r", encoding="utf-8") as f:
+        prompt = json.load(f)
+
+    return {"sys_msg": prompt["sys_msg"], "human_msg": prompt["human_msg"]}
+
+
+def build_agent(model, temperature, prompt, is_test, openai_api_key, cache=None, token_budget=None, conversation=None, stop_early=False, move_timeout=None, timeout_fallback="keep",
+                skip_forced=False, correct_moves=False):
+    """
+    Receives the agent's model, temperature, prompt dictionary, the test flag, the OpenAI API key, an optional ResponseCache, an optional input tokens budget per turn,
+    the optional Conversation options of the multi-turn mode, whether to stream the responses and stop them once the move is committed,
+    the optional deadline of every move in seconds, the policy applied when it expires ("keep" or one of the local bots), whether to play the forced moves
+    without calling the LLM and whether to correct the moves that hit a wall or a body.
+    Returns the agent config dictionary expected by game_engine().
+    """
+
+    # The model's backend builds the shared LLM client (or the policy of a scripted bot)
+    agent = {"llm": None, "prompt": prompt} if is_test else build_agent_llm(model, temperature, prompt, openai_api_key)
+
+    return {**agent, "is_test": is_test, "cache": cache, "token_budget": token_budget, "conversation": conversation, "stream": stop_early, "stop_early": stop_early,
+            "move_timeout": move_timeout, "timeout_fallback": timeout_fallback, "skip_forced": skip_forced, "correct_moves": correct_moves}
+
+
+def match_summary(match_id, winner, game_history):
+    """
+    Receives the match id, the winner and the game history of a finished match.
+    Returns a dictionary with the final result and the aggregated metrics of both agents.
+    """
+
+    final_state = game_history[-1]["board_state"]
+
+    summary = {
+        "match_id": match_id,
+        "winner": winner,
+        "turns": final_state["turn"],
+        "snake1_length": len(final_state["snake1"]["body"]),
+        "snake2_length": len(final_state["snake2"]["body"]),
+        "snake1_is_alive": final_state["snake1"]["is_alive"],
+        "snake2_is_alive": final_state["snake2"]["is_alive"],
+    }
+
+    for agent in ["agent1", "agent2"]:
+        # Unknown (None) if any call was abandoned by its deadline, as its tokens and cost are not reported
+        summary[f"{agent}_completion_tokens"] = game_history.metrics.total(f"{agent}_completion_tokens")
+        summary[f"{agent}_cost"] = game_history.metrics.total(f"{agent}_cost")
+        summary[f"{agent}_time"] = game_history.metrics.totals[f"{agent}_time"]
+        summary[f"{agent}_timeouts"] = sum(1 for record in game_history.records if record.get(f"{agent}_timed_out"))
+        summary[f"{agent}_forced_moves"] = sum(1 for record in game_history.records if record.get(f"{agent}_forced"))
+        summary[f"{agent}_corrections"] = sum(1 for record in game_history.records if record.get(f"{agent}_corrected"))
+
+    return summary
+
+
+# --- Main function ---
+
+def run_matches(agent1, agent2, n_matches, out_dir, board_config=board_config, board_state_0=board_state_0, seed=None, metadata=None, profile=False, trace_hook=None):
+    """
+    Receives the two agent configs, the number of matches to play, the output directory, the board configuration, the initial board state,
+    an optional seed (the match i uses seed + i for the food placement), optional metadata saved in the replays (e.g. models and prompts),
+    whether to profile every match with cProfile and an optional trace_hook(phase, turn, seconds) for the phase timers of the game engine.
+    Plays all the matches headless and writes results.jsonl (one summary per match), match_XXXX.jsonl (per-turn replay file), phases.json
+    (count, mean, total, p50, p95 and p99 of every phase time over all the turns) and, when profiling, match_XXXX.prof in the output directory.
+    Returns the list of match summaries.
+    """
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    summaries = []
+    records = []
+    with open(os.path.join(out_dir, "results.jsonl"), "w", encoding="utf-8") as results_file:
+        for match_id in range(n_matches):
+
+            match_seed = seed + match_id if seed is not None else None
+            recorder = ReplayRecorder(os.path.join(out_dir, f"match_{match_id:04}.jsonl"), metadata=metadata)
+            with profile_to(os.path.join(out_dir, f"match_{match_id:04}.prof") if profile else None):
+                winner, game_history = game_engine(board_config=board_config, board_state_0=board_state_0, agent1=agent1, agent2=agent2, observers=[recorder], seed=match_seed, trace_hook=trace_hook)
+            records.extend(game_history.records)
+
+            summary = match_summary(match_id, winner, game_history)
+            results_file.write(json.dumps(summary) + "\n")
+            results_file.flush()
+            summaries.append(summary)
+
+            print(f"Match {match_id}: {winner} in {summary['turns']} turns")
+
+    stats = phase_stats(records)
+    with open(os.path.join(out_dir, "phases.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    if profile:
+        print(format_phase_stats(stats))
+
+    return summaries
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Play N headless matches between two agents and save the results and the per-turn history to disk.")
+    parser.add_argument("--model1", default=AVAILABLE_MODELS[0], help=f"Model of the Agent 1 (green snake) as backend:model_name, e.g. {', '.join(AVAILABLE_MODELS)} or local:<model served at LOCAL_LLM_BASE_URL>")
+    parser.add_argument("--model2", default=AVAILABLE_MODELS[0], help="Model of the Agent 2 (blue snake) as backend:model_name")
+    parser.add_argument("--temp1", type=float, default=0.5, help="Temperature of the LLM-1")
+    parser.add_argument("--temp2", type=float, default=0.5, help="Temperature of the LLM-2")
+    parser.add_argument("--prompt1", default=None, help="JSON file with the sys_msg and human_msg of the Agent 1 (default prompt if not set)")
+    parser.add_argument("--prompt2", default=None, help="JSON file with the sys_msg and human_msg of the Agent 2 (default prompt if not set)")
+    parser.add_argument("--test1", action="store_true", help="Use the random test agent instead of calling the LLM-1")
+    parser.add_argument("--test2", action="store_true", help="Use the random test agent instead of calling the LLM-2")
+    parser.add_argument("--n-matches", type=int, default=1, help="Number of matches to play")
+    parser.add_argument("--max-turns", type=int, default=board_config["MAX_TURNS"], help="Maximum number of turns per match")
+    parser.add_argument("--out-dir", default="./matches/", help="Output directory for the results and the matches history")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the food placement (the match i uses seed + i)")
+    parser.add_argument("--model-limits", default=None, help="JSON file with the per-model rate limits: {model: {requests_per_minute, tokens_per_minute}}")
+    parser.add_argument("--cache", default=None, help="SQLite file to cache the LLM responses of the calls with temperature 0")
+    parser.add_argument("--budget1", type=int, default=None, help="Input tokens budget per turn of the Agent 1, its board variables are compacted above it")
+    parser.add_argument("--conversation1", default=None, choices=MEMORY_POLICIES, help="Play the Agent 1 as a multi-turn conversation with this memory policy")
+    parser.add_argument("--conversation2", default=None, choices=MEMORY_POLICIES, help="Play the Agent 2 as a multi-turn conversation with this memory policy")
+    parser.add_argument("--stop-early", action="store_true", help="Stream the LLM responses and stop them once the move is committed (arrow emoji followed by a space)")
+    parser.add_argument("--move-timeout", type=float, default=None, help="Deadline of every LLM move in seconds, the fallback policy moves when it expires")
+    parser.add_argument("--timeout-fallback", default="keep", choices=list(TIMEOUT_FALLBACKS), help="Move of a timed out agent: keep the current direction or play the move of a local bot")
+    parser.add_argument("--skip-forced", action="store_true", help="Play the forced moves (only one safe move) without calling the LLM")
+    parser.add_argument("--correct-moves", action="store_true", help="Replace the LLM moves that hit a wall or a body by a safe move (recorded in the history)")
+    parser.add_argument("--profile", action="store_true", help="Dump a cProfile of every match (match_XXXX.prof) and print the per-phase times (p50, p95, p99)")
+    parser.add_argument("--window", type=int, default=10, help="Turns kept in the conversations before the older ones are removed")
+    parser.add_argument("--budget2", type=int, default=None, help="Input tokens budget per turn of the Agent 2, its board variables are compacted above it")
+    args = parser.parse_args()
+
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    cache = ResponseCache(args.cache) if args.cache is not None else None
+
+    if args.model_limits is not None:
+        with open(args.model_limits, "r", encoding="utf-8") as f:
+            for model, limits in json.load(f).items():
+                set_model_limits(model_id(model), limits.get("requests_per_minute"), limits.get("tokens_per_minute"))
+
+    prompt1 = load_prompt(args.prompt1, DEFAULT_PROMPT1)
+    prompt2 = load_prompt(args.prompt2, DEFAULT_PROMPT2)
+
+    conversation1 = {"memory": args.conversation1, "window": args.window} if args.conversation1 else None
+    conversation2 = {"memory": args.conversation2, "window": args.window} if args.conversation2 else None
+    agent1 = build_agent(args.model1, args.temp1, prompt1, args.test1, openai_api_key, cache, args.budget1, conversation1, args.stop_early, args.move_timeout, args.timeout_fallback,
+                         args.skip_forced, args.correct_moves)
+    agent2 = build_agent(args.model2, args.temp2, prompt2, args.test2, openai_api_key, cache, args.budget2, conversation2, args.stop_early, args.move_timeout, args.timeout_fallback,
+                         args.skip_forced, args.correct_moves)
+
+    metadata = {
+        "agent1": {"model": args.model1, "temperature": args.temp1, "prompt": prompt1, "is_test": args.test1},
+        "agent2": {"model": args.model2, "temperature": args.temp2, "prompt": prompt2, "is_test": args.test2},
+    }
+
+    run_matches(agent1, agent2, args.n_matches, args.out_dir, board_config={**board_config, "MAX_TURNS": args.max_turns}, seed=args.seed, metadata=metadata, profile=args.profile)
@@ -0,0 +1,134 @@
+import streamlit as st
+import pandas as pd
+from contextlib import nullcontext
+
+from board_plot import BoardRenderer
+
+
+DIR_TO_ARROW = {
+    "U": "⬆️",
+    "D": "⬇️",
+    "L": "⬅️",
+    "R": "➡️",
+    None: "❌",
+}
+
+PLOTS_TITLES = ["##### Completion tokens", "##### Cost of input + completion tokens ($)", "##### Response Time (s)"]
+PLOTS_COLUMNS = [
+    ["agent1_completion_tokens", "agent2_completion_tokens"],
+    ["agent1_cost", "agent2_cost"],
+    ["agent1_time", "agent2_time"],
+]
+
+
+def prompt_tokens_caption(record, prefix):
+    """
+    Receives the last turn record and the agent prefix ("agent1" or "agent2").
+    Returns the caption with the input tokens of the agent's last prompt and whether its board variables were compacted to fit the budget.
+    """
+
+    prompt_tokens = record.get(f"{prefix}_prompt_tokens")
+    if prompt_tokens is None:
+        return ""
+
+    compacted = record.get(f"{prefix}_compacted")
+    return f"Prompt tokens: {prompt_tokens}" + (f" (compacted: {compacted})" if compacted else "")
+
+
+def total_text(metrics, column, format_spec):
+    """
+    Receives the metrics accumulator, a metric column and its format spec.
+    Returns its total as text, a lower bound ("≥") if the value of some turns is unknown (calls abandoned by their deadline).
+    """
+
+    text = format(metrics.totals[column], format_spec)
+    return f"≥ {text}" if metrics.unknown[column] else text
+
+
+class StreamlitObserver:
+    """
+    Game engine observer that renders every turn in the Streamlit web layout (agents' messages, board image and metrics plots).
+    """
+
+    def __init__(self, board_imgs_space, turn_counter, plots_space, agents_spaces):
+        self.board_imgs_space = board_imgs_space
+        self.turn_counter = turn_counter
+        self.plots_space = plots_space
+        self.agents_spaces = agents_spaces
+        self.renderer = None
+        self.charts = None
+        self.totals_spaces = None
+        self.plotted_rows = 0
+
+
+    def on_turn(self, board_config, board_state, game_history):
+
+        turn = board_state["turn"]
+
+        # Update latest messages in web layout
+        container1 = self.agents_spaces[0].container()
+        container2 = self.agents_spaces[1].container()
+
+        with container1:
+            st.markdown(f"<h4 style='text-align:center; background-color:green;'> Agent 1 Score: {len(board_state['snake1']['body'])} </h4>", unsafe_allow_html=True)
+            st.caption(prompt_tokens_caption(game_history.records[-1], "agent1"))
+            for i in range(min(2, len(game_history)-1)):
+                st.success(f"**Turn {turn-i}:** " + game_history.records[-(i+1)]["agent1_response"], icon=DIR_TO_ARROW[game_history.records[-(i+1)]["agent1_action"]])
+
+        with container2:
+            st.markdown(f"<h4 style='text-align:center; background-color:blue;'> Agent 2 Score: {len(board_state['snake2']['body'])} </h4>", unsafe_allow_html=True)
+            st.caption(prompt_tokens_caption(game_history.records[-1], "agent2"))
+            for i in range(min(2, len(game_history)-1)):
+                st.info(f"**Turn {turn-i}:** " + game_history.records[-(i+1)]["agent2_response"], icon=DIR_TO_ARROW[game_history.records[-(i+1)]["agent2_action"]])
+
+        # Update board, only the cells that changed since the previous turn are repainted
+        if self.renderer is None:
+            self.renderer = BoardRenderer(board_config)
+        with game_history.timer.phase("render") if game_history.timer is not None else nullcontext():
+            img_arr = self.renderer.render(board_state, copy=False)
+
+        # BGR to RGB and update new img in web layout
+        self.turn_counter.markdown(f"<h3 style='text-align:center'> Turn {turn} </h3>", unsafe_allow_html=True)
+        self.board_imgs_space.image(img_arr[:, :, (2, 1, 0)], use_column_width=True)
+
+        # Update plots, the charts are created in the first turn and then only the new rows are appended
+        metrics = game_history.metrics
+        if self.charts is None:
+            self.create_plots(metrics)
+        else:
+            for chart, columns in zip(self.charts, PLOTS_COLUMNS):
+                chart.add_rows(pd.DataFrame(metrics.rows(columns, start=self.plotted_rows), index=range(self.plotted_rows, len(metrics))))
+
+        self.plotted_rows = len(metrics)
+
+        self.totals_spaces[0][0].success(f"Total completion tokens Agent 1: {total_text(metrics, 'agent1_completion_tokens', '.0f')}")
+        self.totals_spaces[0][1].info(f"Total completion tokens Agent 2: {total_text(metrics, 'agent2_completion_tokens', '.0f')}")
+        self.totals_spaces[1][0].success(f"Total cost Agent 1: {total_text(metrics, 'agent1_cost', '.4f')} $")
+        self.totals_spaces[1][1].info(f"Total cost Agent 2: {total_text(metrics, 'agent2_cost', '.4f')} $")
+        self.totals_spaces[2][0].success(f"Total time Agent 1: {total_text(metrics, 'agent1_time', '.3f')} s")
+        self.totals_spaces[2][1].info(f"Total time Agent 2: {total_text(metrics, 'agent2_time', '.3f')} s")
+
+
+    def create_plots(self, metrics):
+
+        plots_container = self.plots_space.container()
+
+        self.charts = []
+        self.totals_spaces = []
+        with plots_container:
+            st.write("")
+            cols_plots = st.columns(3)
+            for col, title, columns in zip(cols_plots, PLOTS_TITLES, PLOTS_COLUMNS):
+                with col:
+                    st.write(title)
+                    self.charts.append(st.line_chart(pd.DataFrame(metrics.rows(columns)), color=["#12c914", "#0074ba"]))
+                    self.totals_spaces.append((st.empty(), st.empty()))
+
+
+    def on_game_over(self, board_config, board_state, game_history, winner):
+
+        self.turn_counter.markdown(f"<h3 style='text-align:center'> Turn {board_state['turn']} - WINNER: {winner} </h3>", unsafe_allow_html=True)
+
+        st.toast(f"Game over! \nWinner: {winner}", icon="🟰" if winner=="Draw" else "🎉")
+        if winner != "Draw":
+            st.balloons()
@@ -0,0 +1,124 @@
+"""
+Reference implementations kept for the equivalence tests: the dictionary based game rules and the board_plot() drawing every square
+with cv2.rectangle, as they were before the game state moved to GameState and the rendering to the cached templates.
+"""
+
+import cv2
+import numpy as np
+
+
+# --- Game rules ---
+
+def move_snake(board_state, snake):
+
+    head = snake["body"][0]
+
+    if snake["dir"] == "U":
+        head = (head[0], head[1]-1)
+    elif snake["dir"] == "D":
+        head = (head[0], head[1]+1)
+    elif snake["dir"] == "L":
+        head = (head[0]-1, head[1])
+    elif snake["dir"] == "R":
+        head = (head[0]+1, head[1])
+
+    snake["body"].insert(0, head)
+
+    if head in board_state["food"]:
+        board_state["food"].remove(head)
+    else:
+        snake["body"].pop()
+
+
+def is_snake_dead(board_config, board_state, snake_id):
+
+    other_id = "snake2" if snake_id == "snake1" else "snake1"
+    head = board_state[snake_id]["body"][0]
+
+    return head in board_state[other_id]["body"] or \
+        head in board_state[snake_id]["body"][1:] or \
+        head[0] < 0 or head[0] >= board_config["GRID_SIZE"] or \
+        head[1] < 0 or head[1] >= board_config["GRID_SIZE"]
+
+
+def play_turn(board_config, board_state, agent1_action, agent2_action):
+
+    if agent1_action is not None:
+        board_state["snake1"]["dir"] = agent1_action
+
+    if agent2_action is not None:
+        board_state["snake2"]["dir"] = agent2_action
+
+    move_snake(board_state, board_state["snake1"])
+    move_snake(board_state, board_state["snake2"])
+
+    game_over = False
+    if is_snake_dead(board_config, board_state, "snake1"):
+        board_state["snake1"]["is_alive"] = False
+        game_over = True
+
+    if is_snake_dead(board_config, board_state, "snake2"):
+        board_state["snake2"]["is_alive"] = False
+        game_over = True
+
+    return game_over
+
+
+# --- Rendering ---
+
+def board_plot(board_config, board_state):
+
+    GRID_SIZE = board_config["GRID_SIZE"]
+    SQUARE_SIZE = board_config["SQUARE_SIZE"]
+    LINE_THICKNESS = board_config["LINE_THICKNESS"]
+
+    grid_thickness = GRID_SIZE * SQUARE_SIZE + (GRID_SIZE + 1) * LINE_THICKNESS
+
+    image = np.ones((grid_thickness, grid_thickness, 3), dtype=np.uint8) * board_config["BACKGROUND_COLOR"]
+    image = image.astype(np.uint8)
+
+    LINES_COLOR = board_config["LINES_COLOR"]
+    cv2.line(image, (0, 0), (0, grid_thickness), LINES_COLOR, thickness=LINE_THICKNESS)
+    cv2.line(image, (0, 0), (grid_thickness, 0), LINES_COLOR, thickness=LINE_THICKNESS)
+
+    for i in range(1, GRID_SIZE + 1):
+        cv2.line(image, (i * (SQUARE_SIZE + LINE_THICKNESS), 0), (i * (SQUARE_SIZE + LINE_THICKNESS), grid_thickness), LINES_COLOR, thickness=LINE_THICKNESS)
+        cv2.line(image, (0, i * (SQUARE_SIZE + LINE_THICKNESS)), (grid_thickness, i * (SQUARE_SIZE + LINE_THICKNESS)), LINES_COLOR, thickness=LINE_THICKNESS)
+
+    def draw_pos(target_pos, color, is_head=False, dir=None):
+
+        square_top_left = (target_pos[0] * (SQUARE_SIZE + LINE_THICKNESS) + LINE_THICKNESS, target_pos[1] * (SQUARE_SIZE + LINE_THICKNESS) + LINE_THICKNESS)
+        square_bottom_right = (square_top_left[0] + SQUARE_SIZE - LINE_THICKNESS, square_top_left[1] + SQUARE_SIZE - LINE_THICKNESS)
+        cv2.rectangle(image, square_top_left, square_bottom_right, color, -1)
+
+        if is_head:
+            radius = SQUARE_SIZE // 5
+
+            if dir in ["U", "D"]:
+                center1 = (square_top_left[0] + SQUARE_SIZE//4 - 1, square_top_left[1] + SQUARE_SIZE//2)
+                center2 = (square_top_left[0] + 3 * SQUARE_SIZE//4, square_top_left[1] + SQUARE_SIZE//2)
+                sign = -1 if dir == "U" else 1
+                center1pupil = (center1[0], center1[1] + sign * (radius//2))
+                center2pupil = (center2[0], center2[1] + sign * (radius//2))
+            else:
+                center1 = (square_top_left[0] + SQUARE_SIZE//2, square_top_left[1] + SQUARE_SIZE//4 - 1)
+                center2 = (square_top_left[0] + SQUARE_SIZE//2, square_top_left[1] + 3 * SQUARE_SIZE//4)
+                sign = -1 if dir == "L" else 1
+                center1pupil = (center1[0] + sign * (radius//2), center1[1])
+                center2pupil = (center2[0] + sign * (radius//2), center2[1])
+
+            cv2.circle(image, center1, radius, (200, 200, 200), -1)
+            cv2.circle(image, center2, radius, (200, 200, 200), -1)
+            cv2.circle(image, center1pupil, radius//2, (20, 20, 20), -1)
+            cv2.circle(image, center2pupil, radius//2, (20, 20, 20), -1)
+
+    for snake_id, color_key in [("snake1", "SNAKE1_COLOR"), ("snake2", "SNAKE2_COLOR")]:
+        body, dir = board_state[snake_id]["body"], board_state[snake_id]["dir"]
+        for pos in body[1:]:
+            draw_pos(pos, board_config[color_key], False, dir)
+        draw_pos(body[0], board_config[color_key], True, dir)
+
+    for pos in board_state["food"]:
+        draw_pos(pos, board_config["FOOD_COLOR"])
+
+    return image
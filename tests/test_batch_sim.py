@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from game_engine import board_config, board_state_0, get_winner
+from game_state import GameState
+from batch_sim import BatchSimulator, DIRS, AGENT1, AGENT2, DRAW, random_test_policy
+
+
+WINNERS = {"Agent 1": AGENT1, "Agent 2": AGENT2, "Draw": DRAW}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_matches_game_state(seed):
+    n_games = 64
+    sim = BatchSimulator(n_games, seed=seed)
+    game_states = [GameState(board_config, board_state_0) for _ in range(n_games)]
+    rng = np.random.default_rng(seed + 1000)
+
+    while not sim.done.all():
+        active = sim.begin_turn()
+
+        # The food placed by the batch is added to the GameStates, so both play the same games
+        for game in active:
+            game_state = game_states[game]
+            game_state.turn += 1
+            for pos in sim.to_dict(game)["food"]:
+                if pos not in game_state.food:
+                    game_state.add_food(pos)
+
+        # Random actions, -1 keeps the current direction
+        actions = rng.integers(-1, 4, size=(n_games, 2))
+        played = sim.step(actions)
+
+        for game in played:
+            game_state = game_states[game]
+            game_over = game_state.play_turn(*[DIRS[a] if a >= 0 else None for a in actions[game]])
+
+            expected = game_state.to_dict()
+            batch_state = sim.to_dict(game)
+            assert {**batch_state, "food": sorted(batch_state["food"])} == {**expected, "food": sorted(expected["food"])}
+            assert sim.done[game] == (game_over or game_state.turn >= board_config["MAX_TURNS"])
+
+    winners = sim.winners()
+    for game, game_state in enumerate(game_states):
+        assert winners[game] == WINNERS[get_winner(game_state.to_dict())]
+
+
+def test_play_is_seeded():
+    winners = [BatchSimulator(200, seed=7).play(random_test_policy, random_test_policy) for _ in range(2)]
+
+    assert np.array_equal(winners[0], winners[1])
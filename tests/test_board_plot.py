@@ -0,0 +1,54 @@
+from random import Random
+
+import numpy as np
+import pytest
+
+from game_engine import board_config, board_state_0
+from game_state import GameState
+from board_plot import board_plot
+import reference_rules
+
+
+CONFIGS = [
+    board_config,
+    {**board_config, "GRID_SIZE": 10, "SQUARE_SIZE": 20, "LINE_THICKNESS": 1},
+    {**board_config, "GRID_SIZE": 8, "SQUARE_SIZE": 12, "LINE_THICKNESS": 3},
+]
+
+
+def game_states(config, seed, n_turns=100):
+    """
+    Board states of a random game (mostly safe moves) until a snake dies, the last one with a head out of the board or in a body.
+    """
+
+    rng = Random(seed)
+    start = {**board_state_0, "snake1": {**board_state_0["snake1"], "body": [(3, 2), (2, 2), (1, 2)]},
+             "snake2": {**board_state_0["snake2"], "body": [(4, 5), (5, 5), (6, 5)]}}
+    game_state = GameState(config, start, seed=seed)
+    states = [game_state.to_dict()]
+
+    for _ in range(n_turns):
+        if len(game_state.food) < 2:
+            game_state.add_food(game_state.place_food())
+
+        actions = []
+        for snake_id in ["snake1", "snake2"]:
+            head = game_state.snakes[snake_id]["body"][0]
+            safe = [dir for dir, pos in [("U", (head[0], head[1] - 1)), ("D", (head[0], head[1] + 1)), ("L", (head[0] - 1, head[1])), ("R", (head[0] + 1, head[1]))]
+                    if game_state.is_free(pos) or pos in game_state.food]
+            actions.append(rng.choice(safe) if safe and rng.random() < 0.95 else rng.choice("UDLR"))
+
+        game_over = game_state.play_turn(*actions)
+        states.append(game_state.to_dict())
+        if game_over:
+            break
+
+    return states
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+@pytest.mark.parametrize("seed", range(5))
+def test_board_plot_matches_baseline(config, seed):
+    for board_state in game_states(config, seed):
+        assert np.array_equal(board_plot(config, board_state), reference_rules.board_plot(config, board_state))
+
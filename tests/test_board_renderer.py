@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from game_engine import board_config
+from board_plot import board_plot, BoardRenderer
+from test_board_plot import CONFIGS, game_states
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+@pytest.mark.parametrize("seed", range(5))
+def test_renderer_matches_board_plot(config, seed):
+    renderer = BoardRenderer(config)
+    for board_state in game_states(config, seed):
+        assert np.array_equal(renderer.render(board_state), board_plot(config, board_state))
+
+
+def test_renderer_reset_after_another_game():
+    renderer = BoardRenderer(board_config)
+    for board_state in game_states(board_config, 0):
+        renderer.render(board_state)
+
+    renderer.reset()
+    for board_state in game_states(board_config, 1):
+        assert np.array_equal(renderer.render(board_state), board_plot(board_config, board_state))
+
+
+def test_render_copy_is_not_updated():
+    renderer = BoardRenderer(board_config)
+    states = game_states(board_config, 0)
+    frame = renderer.render(states[0])
+    renderer.render(states[1])
+
+    assert np.array_equal(frame, board_plot(board_config, states[0]))
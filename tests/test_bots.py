@@ -0,0 +1,30 @@
+from game_engine import game_engine, board_config, board_state_0
+from bots import flood_fill_policy, expectimax_policy
+
+
+SEEDS = range(10)
+
+
+def head_to_head(policy, opponent_policy, seeds=SEEDS):
+    """
+    Plays a match with every seed on both sides.
+    Returns the wins of the policy and the wins of the opponent.
+    """
+
+    wins, opponent_wins = 0, 0
+    for seed in seeds:
+        for agent_number in [1, 2]:
+            agents = [{"policy": policy, "prompt": None}, {"policy": opponent_policy, "prompt": None}]
+            if agent_number == 2:
+                agents.reverse()
+            winner, _ = game_engine(board_config, board_state_0, *agents, seed=seed)
+            wins += winner == f"Agent {agent_number}"
+            opponent_wins += winner == f"Agent {3 - agent_number}"
+
+    return wins, opponent_wins
+
+
+def test_expectimax_matches_flood_fill():
+    # The expectimax bot is offered as the strongest baseline and timeout fallback, so it must not lose to the flood fill bot
+    wins, flood_fill_wins = head_to_head(expectimax_policy, flood_fill_policy)
+    assert wins >= flood_fill_wins
@@ -0,0 +1,130 @@
+from time import sleep
+
+from langchain.schema import AIMessage
+
+from game_engine import game_engine, board_config, board_state_0
+from agents import compile_prompt, DEFAULT_PROMPT1
+from backends import DeterministicFakeChatModel, SimpleEncoder
+from bots import heuristic_policy
+from conversation import Conversation
+from metrics import MetricsAccumulator
+from prompt_tokens import TOKENS_PER_REPLY
+
+
+PROMPT = {"sys_msg": "You play snake. {board_state_str}", "human_msg": "Turn {turn}, your move."}
+
+
+def variables(turn):
+    return lambda names: {name: f"{name} {turn}" for name in names}
+
+
+def board(turn):
+    return {**board_state_0, "turn": turn}
+
+
+def test_late_response_is_not_added():
+    conversation = Conversation(compile_prompt(PROMPT))
+    conversation.next_messages(1, board(1), variables(1))
+    conversation.add_response("Up ⬆️ ", "U", 1)
+
+    conversation.next_messages(1, board(2), variables(2))
+    conversation.abandon_turn(2)
+    conversation.add_response("Late ⬇️ ", "D", 2)
+
+    messages = conversation.next_messages(1, board(3), variables(3))
+    assert not any("Late" in message.content for message in messages)
+    assert [message.content for message in messages if isinstance(message, AIMessage)] == ["Up ⬆️ "]
+    # The board changes of turn 2 were never answered, the message of turn 3 has the whole board
+    assert "sparse_board 3" in messages[-1].content
+
+
+def test_response_arriving_before_the_abandon_is_removed():
+    conversation = Conversation(compile_prompt(PROMPT))
+    conversation.next_messages(1, board(1), variables(1))
+    conversation.add_response("Up ⬆️ ", "U", 1)
+    n_messages = len(conversation.next_messages(1, board(2), variables(2))) - 1
+
+    conversation.add_response("Late ⬇️ ", "D", 2)
+    conversation.abandon_turn(2)
+
+    assert len(conversation.messages) == n_messages
+    assert conversation.needs_snapshot
+
+
+def test_abandoned_first_turn_restarts_the_conversation():
+    conversation = Conversation(compile_prompt(PROMPT))
+    first = conversation.next_messages(1, board(1), variables(1))
+    conversation.abandon_turn(1)
+
+    assert conversation.messages == []
+    assert [message.content for message in conversation.next_messages(1, board(2), variables(2))] == [message.content.replace(" 1", " 2") for message in first]
+
+
+def test_count_tokens_prefix():
+    encoder = SimpleEncoder()
+    conversation = Conversation(compile_prompt(PROMPT))
+    conversation.next_messages(1, board(1), variables(1))
+    first_tokens, first_cached = conversation.count_tokens(encoder)
+    conversation.add_response("Up ⬆️ ", "U", 1)
+    conversation.next_messages(1, board(2), variables(2))
+    prompt_tokens, cached_tokens = conversation.count_tokens(encoder)
+
+    assert first_cached == 0
+    # The messages of the first request are the cached prefix of the second one
+    assert cached_tokens == first_tokens - TOKENS_PER_REPLY
+    assert prompt_tokens > first_tokens
+
+
+# Messages received by every SlowFakeChatModel call
+CALLS = []
+
+
+class SlowFakeChatModel(DeterministicFakeChatModel):
+    """
+    Fake LLM whose calls on the given turns block longer than the move deadline and then answer "Late".
+    """
+
+    slow_turns: set = set()
+    delay: float = 0.3
+
+    def respond(self, messages):
+        CALLS.append(list(messages))
+        if any(f"Turn {turn}." in messages[-1].content for turn in self.slow_turns):
+            sleep(self.delay)
+            return "Late ⬆️ "
+        return super().respond(messages)
+
+
+def slow_policy(agent_number, board_config, board_state, game_state):
+    sleep(0.02)
+    return heuristic_policy(agent_number, board_config, board_state, game_state)
+
+
+def test_timed_out_turn_in_the_game_engine():
+    CALLS.clear()
+    prompt = {"sys_msg": DEFAULT_PROMPT1[0], "human_msg": DEFAULT_PROMPT1[1]}
+    agent1 = {"llm": SlowFakeChatModel(slow_turns={3}), "prompt": prompt, "conversation": True, "move_timeout": 0.1, "correct_moves": True}
+
+    # The opponent's turns are slow enough for the late response to arrive while the match goes on
+    agent2 = {"policy": slow_policy, "prompt": None}
+    _, game_history = game_engine({**board_config, "MAX_TURNS": 30}, board_state_0, agent1, agent2, seed=0)
+
+    records = game_history.records[1:]
+    assert [record["agent1_timed_out"] for record in records[:4]] == [False, False, True, False]
+    assert records[2]["agent1_completion_tokens"] is None and records[2]["agent1_cost"] is None
+    assert game_history.metrics.total("agent1_cost") is None
+    assert game_history.metrics.total("agent2_cost") == 0
+
+    # The late response never gets into the conversation
+    assert len(CALLS) > 20
+    assert not any("Late" in message.content for messages in CALLS for message in messages)
+
+
+def test_metrics_unknown_values():
+    metrics = MetricsAccumulator(["cost"])
+    metrics.append({"cost": 0.5})
+    metrics.append({"cost": None})
+
+    assert metrics.totals["cost"] == 0.5
+    assert metrics.unknown["cost"] == 1
+    assert metrics.total("cost") is None
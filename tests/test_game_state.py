@@ -0,0 +1,96 @@
+from copy import deepcopy
+from random import Random
+
+import pytest
+
+from game_engine import board_config, board_state_0
+from game_state import GameState, EMPTY, FOOD, SNAKE1, SNAKE2
+import reference_rules
+
+
+DIRS = ["U", "D", "L", "R", None]
+
+
+def random_action(rng, game_state, snake_id):
+    # Mostly safe moves so the games last, with some random ones to also hit the collisions
+    safe = [dir for dir in "UDLR" if game_state.is_free(step(game_state.snakes[snake_id]["body"][0], dir))]
+    if safe and rng.random() < 0.9:
+        return rng.choice(safe)
+    return rng.choice(DIRS)
+
+
+def step(pos, dir):
+    return {"U": (pos[0], pos[1] - 1), "D": (pos[0], pos[1] + 1), "L": (pos[0] - 1, pos[1]), "R": (pos[0] + 1, pos[1])}[dir]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_play_turn_matches_dict_rules(seed):
+    rng = Random(seed)
+    game_state = GameState(board_config, board_state_0, seed=seed)
+    board_state = deepcopy(board_state_0)
+
+    game_over = False
+    while not game_over and game_state.turn < board_config["MAX_TURNS"]:
+        game_state.turn = board_state["turn"] = game_state.turn + 1
+
+        # Both sides get the same food, placed by GameState
+        if len(game_state.food) < 2:
+            pos = game_state.place_food()
+            if pos is not None:
+                game_state.add_food(pos)
+                board_state["food"].append(pos)
+
+        action1, action2 = random_action(rng, game_state, "snake1"), random_action(rng, game_state, "snake2")
+        game_over = game_state.play_turn(action1, action2)
+        assert game_over == reference_rules.play_turn(board_config, board_state, action1, action2)
+        assert game_state.to_dict() == board_state
+
+
+def test_grid_matches_bodies_and_food():
+    rng = Random(0)
+    game_state = GameState(board_config, board_state_0, seed=0)
+
+    for _ in range(60):
+        if len(game_state.food) < 2:
+            game_state.add_food(game_state.place_food())
+        if game_state.play_turn(random_action(rng, game_state, "snake1"), random_action(rng, game_state, "snake2")):
+            break
+
+        expected = {}
+        for pos in game_state.food:
+            expected[pos] = FOOD
+        for snake_id, code in [("snake1", SNAKE1), ("snake2", SNAKE2)]:
+            for pos in game_state.snakes[snake_id]["body"]:
+                expected[pos] = code
+
+        G = board_config["GRID_SIZE"]
+        for y in range(G):
+            for x in range(G):
+                assert game_state.get_cell((x, y)) == expected.get((x, y), EMPTY)
+
+        free = {(cell % G, cell // G) for cell in game_state.free_cells}
+        assert free == {(x, y) for y in range(G) for x in range(G)} - expected.keys()
+
+
+def test_place_food_fills_the_board():
+    # Every empty cell is found even on a crowded board, None only when the board is full
+    config = {**board_config, "GRID_SIZE": 3}
+    state = {"turn": 0, "snake1": {"body": [(0, 0), (1, 0), (2, 0)], "dir": "L", "is_alive": True},
+             "snake2": {"body": [(0, 2), (1, 2), (2, 2)], "dir": "L", "is_alive": True}, "food": []}
+    game_state = GameState(config, state, seed=0)
+
+    placed = set()
+    while (pos := game_state.place_food()) is not None:
+        game_state.add_food(pos)
+        placed.add(pos)
+
+    assert placed == {(0, 1), (1, 1), (2, 1)}
+
+
+def test_place_food_is_seeded():
+    positions = []
+    for _ in range(2):
+        game_state = GameState(board_config, board_state_0, seed=42)
+        positions.append([game_state.place_food() for _ in range(5)])
+
+    assert positions[0] == positions[1]
@@ -0,0 +1,63 @@
+from copy import deepcopy
+from random import Random
+
+import pytest
+
+from game_engine import game_engine, board_config, board_state_0
+from backends import build_agent_llm
+from history import GameHistory, make_delta, apply_delta, to_working_state, to_board_state
+
+
+class StatesObserver:
+    """
+    Keeps a copy of every board state shown to the observers.
+    """
+
+    def __init__(self):
+        self.states = []
+
+    def on_game_start(self, board_config, board_state, seed):
+        self.states.append(deepcopy(board_state))
+
+    def on_turn(self, board_config, board_state, game_history):
+        self.states.append(deepcopy(board_state))
+
+
+def play(seed):
+    observer = StatesObserver()
+    _, game_history = game_engine(board_config, board_state_0, build_agent_llm("bot:flood_fill", 0, None), build_agent_llm("bot:heuristic", 0, None),
+                                  observers=[observer], seed=seed)
+    return game_history, observer.states
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_history_reconstructs_every_board_state(seed):
+    game_history, states = play(seed)
+
+    assert len(game_history) == len(states)
+    assert [turn["board_state"] for turn in game_history] == states
+
+
+@pytest.mark.parametrize("keyframe_interval", [1, 3, 20, 1000])
+def test_history_random_access(keyframe_interval):
+    played_history, states = play(0)
+    game_history = GameHistory(keyframe_interval)
+    for board_state, record in zip(states, played_history.records):
+        game_history.append({"board_state": board_state, **record})
+
+    rng = Random(keyframe_interval)
+    for idx in [rng.randrange(-len(states), len(states)) for _ in range(100)]:
+        assert game_history[idx]["board_state"] == states[idx]
+
+    assert game_history[2:8] == [{"board_state": state, **record} for state, record in zip(states[2:8], played_history.records[2:8])]
+
+    with pytest.raises(IndexError):
+        game_history[len(states)]
+
+
+def test_delta_round_trip():
+    _, states = play(1)
+    state = to_working_state(states[0])
+    for prev_state, board_state in zip(states, states[1:]):
+        apply_delta(state, make_delta(prev_state, board_state))
+        assert to_board_state(state) == board_state
@@ -0,0 +1,79 @@
+import pytest
+from langchain.schema import SystemMessage, HumanMessage
+
+from llm_cache import ResponseCache
+from llm_client import LLMClient
+from backends import BACKENDS, DeterministicFakeChatModel
+
+
+MESSAGES = [SystemMessage(content="You play snake"), HumanMessage(content="Board: ...")]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def client(backend_name, model_name="llama3", temperature=0):
+    return LLMClient(DeterministicFakeChatModel(model_name=model_name, temperature=temperature), BACKENDS[backend_name])
+
+
+def test_key_is_stable(cache):
+    assert cache.make_key(client("local"), MESSAGES) == cache.make_key(client("local"), list(MESSAGES))
+
+
+def test_key_depends_on_backend(cache):
+    assert cache.make_key(client("openai"), MESSAGES) != cache.make_key(client("local"), MESSAGES)
+
+
+def test_key_depends_on_model_and_temperature(cache):
+    keys = {cache.make_key(client("local", model_name, temperature), MESSAGES) for model_name in ["llama3", "mistral"] for temperature in [0, 0.5]}
+
+    assert len(keys) == 4
+
+
+def test_key_depends_on_mode(cache):
+    assert cache.make_key(client("local"), MESSAGES, "full") != cache.make_key(client("local"), MESSAGES, "stop_early")
+
+
+def test_key_depends_on_messages(cache):
+    other = [SystemMessage(content="You play snake"), HumanMessage(content="Board: ....")]
+    swapped = [HumanMessage(content="You play snake"), SystemMessage(content="Board: ...")]
+
+    assert len({cache.make_key(client("local"), messages) for messages in [MESSAGES, other, swapped]}) == 3
+
+
+def test_put_get_round_trip(tmp_path, cache):
+    key = cache.make_key(client("local"), MESSAGES)
+    cache.put(key, "Moving ⬆️ ", 12, 0.001)
+
+    assert cache.get(key) == ("Moving ⬆️ ", 12, 0.001)
+
+    # The entries persist in the SQLite file
+    reopened = ResponseCache(str(tmp_path / "cache.sqlite"))
+    assert reopened.get(key) == ("Moving ⬆️ ", 12, 0.001)
+    reopened.close()
+
+
+def test_only_deterministic(cache):
+    assert cache.is_cacheable(client("local", temperature=0))
+    assert not cache.is_cacheable(client("local", temperature=0.5))
+
+
+def test_disk_eviction_keeps_memory_hits(tmp_path, monkeypatch):
+    # Increasing access times, so no two accesses tie
+    clock = iter(range(1000))
+    monkeypatch.setattr("llm_cache.time", lambda: next(clock))
+
+    cache = ResponseCache(str(tmp_path / "lru.sqlite"), max_disk_entries=3)
+    cache.put("a", "⬆️ ", 1, 0)
+    for key in ["b", "c", "d"]:
+        assert cache.get("a") is not None
+        cache.put(key, "⬆️ ", 1, 0)
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path / "lru.sqlite"))
+    assert [row[0] for row in reopened.db.execute("SELECT key FROM responses ORDER BY key")] == ["a", "c", "d"]
+    reopened.close()
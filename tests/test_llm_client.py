@@ -0,0 +1,43 @@
+from langchain.schema import HumanMessage
+
+import llm_client
+from llm_client import LLMClient, set_model_limits, backoff_delay
+from backends import BACKENDS, DeterministicFakeChatModel, model_id
+
+
+def client(backend_name, model_name="llama3"):
+    return LLMClient(DeterministicFakeChatModel(model_name=model_name), BACKENDS[backend_name])
+
+
+def test_limiters_are_per_backend(monkeypatch):
+    monkeypatch.setattr(llm_client, "MODEL_LIMITERS", {})
+    set_model_limits(model_id("local:llama3"), requests_per_minute=10)
+
+    messages = [HumanMessage(content="Your move")]
+    assert client("local").acquire(messages) is llm_client.MODEL_LIMITERS["local:llama3"]
+    assert client("openai").acquire(messages) is None
+    assert client("local", "mistral").acquire(messages) is None
+
+
+def test_model_id_of_former_names():
+    assert model_id("openai gpt-4o-2024-05-13 (GPT-4o)") == "openai:gpt-4o-2024-05-13"
+    assert model_id("local:llama3") == "local:llama3"
+
+
+def test_requests_bucket_is_consumed(monkeypatch):
+    monkeypatch.setattr(llm_client, "MODEL_LIMITERS", {})
+    set_model_limits("fake:deterministic", requests_per_minute=3)
+
+    fake = client("fake", "deterministic")
+    for _ in range(3):
+        fake([HumanMessage(content="Your move")])
+
+    assert llm_client.MODEL_LIMITERS["fake:deterministic"].requests.tokens < 1
+
+
+def test_backoff_delay():
+    class RateLimited(Exception):
+        headers = {"retry-after": "7"}
+
+    assert backoff_delay(0, RateLimited()) == 7
+    assert all(0 <= backoff_delay(attempt, base_delay=1, max_delay=10) <= min(10, 2 ** attempt) for attempt in range(8))
@@ -0,0 +1,66 @@
+from random import Random
+
+import pytest
+
+from agents import ArrowStreamParser, parse_direction, find_move, DIR_TO_ARROW
+
+
+RESPONSES = [
+    "I will go up ⬆️ because the food is there",
+    "Not ⬅️, the wall is there. Going ⬇️ instead",
+    "⬅️, or rather ➡️ to reach the food",
+    "Moving right ➡️",
+    "Options: ⬆️/⬇️/⬅️/➡️. I choose ⬇️ since it is safe",
+    "Up ⬆️. Then right ➡️ later",
+    "No arrow in this response",
+    "",
+    "Down⬇️\nthen left ⬅️ ",
+]
+
+
+def chunks(text, rng):
+    # Random split of the response, also in the middle of the arrows' code points
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 8)))) if len(text) > 1 else []
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+
+def stream(text, rng, stop_early):
+    parser = ArrowStreamParser()
+    for chunk in chunks(text, rng):
+        if parser.feed(chunk) is not None and stop_early:
+            return parser.text[:parser.committed_end]
+    return parser.text
+
+
+def test_parse_direction_first_committed_arrow():
+    assert [parse_direction(response) for response in RESPONSES] == ["U", "D", "R", "R", "D", "R", None, None, "D"]
+
+
+def test_parse_direction_fallback_to_first_arrow():
+    assert parse_direction("Going ⬅️.") == "L"
+    assert parse_direction("⬇️,⬆️.") == "D"
+
+
+@pytest.mark.parametrize("response", RESPONSES)
+@pytest.mark.parametrize("seed", range(20))
+def test_stream_parser_matches_parse_direction(response, seed):
+    rng = Random(seed)
+    parser = ArrowStreamParser()
+    for chunk in chunks(response, rng):
+        parser.feed(chunk)
+
+    # A committed move during the stream is the move of the whole response
+    if parser.committed is not None:
+        assert parser.committed == parse_direction(response)
+        assert find_move(response)[1] == parser.committed_end
+
+    # Streamed, stopped early or whole, the response is parsed to the same move
+    assert parse_direction(stream(response, rng, stop_early=True)) == parse_direction(response)
+    assert parse_direction(stream(response, rng, stop_early=False)) == parse_direction(response)
+
+
+def test_random_responses():
+    rng = Random(0)
+    for _ in range(500):
+        response = "".join(rng.choice([" ", "a", ".", "\n"] + list(DIR_TO_ARROW.values())) for _ in range(rng.randint(0, 12)))
+        assert parse_direction(stream(response, rng, stop_early=True)) == parse_direction(response)
@@ -0,0 +1,35 @@
+from collections import Counter
+
+from game_engine import game_engine, board_config, board_state_0
+from backends import build_agent_llm
+from profiling import PhaseTimer, phase_stats
+
+
+def test_one_sample_per_phase_and_turn():
+    traced = []
+    agent1 = {**build_agent_llm("bot:heuristic", 0, None), "correct_moves": True}
+    agent2 = build_agent_llm("bot:flood_fill", 0, None)
+    _, game_history = game_engine(board_config, board_state_0, agent1, agent2, seed=0, trace_hook=lambda phase, turn, seconds: traced.append((phase, turn)))
+
+    turns = len(game_history) - 1
+    counts = Counter(phase for phase, _ in traced)
+    for phase in ["food", "agents", "correct", "move", "history", "ui"]:
+        assert counts[phase] == turns
+    assert max(Counter(traced).values()) == 1
+
+    stats = phase_stats(game_history.records)
+    assert {f"phase_{phase}" for phase in ["food", "agents", "correct", "move", "history", "render", "ui"]} <= stats.keys()
+    assert all(stat["count"] == turns for key, stat in stats.items() if key.startswith("phase_"))
+
+
+def test_nested_phase_is_not_counted_twice():
+    timer = PhaseTimer()
+    timer.start_turn(1)
+    with timer.phase("ui"):
+        with timer.phase("render"):
+            sum(range(10000))
+
+    fields = timer.fields()
+    assert fields["phase_render"] > 0
+    assert fields["phase_ui"] >= 0
+    assert set(fields) == {"phase_ui", "phase_render"}
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from game_engine import board_config
+from backends import build_agent_llm
+from run_matches import run_matches
+from replay_export import export_paths, export_replays
+
+
+def test_export_paths_keep_the_replay_names():
+    out_paths = export_paths(["m/match_0000.jsonl", "m/match_0001.jsonl"], "v", "gif")
+    assert out_paths == {"m/match_0000.jsonl": os.path.join("v", "match_0000.gif"), "m/match_0001.jsonl": os.path.join("v", "match_0001.gif")}
+
+
+def test_export_paths_prefix_the_directory_of_repeated_names():
+    out_paths = export_paths(["m/match_0000.jsonl", "t/match_0000.jsonl", "t/match_0001.jsonl"], "v", "gif")
+    assert out_paths == {
+        "m/match_0000.jsonl": os.path.join("v", "m_match_0000.gif"),
+        "t/match_0000.jsonl": os.path.join("v", "t_match_0000.gif"),
+        "t/match_0001.jsonl": os.path.join("v", "match_0001.gif"),
+    }
+
+
+def test_export_paths_raise_on_duplicates():
+    with pytest.raises(ValueError):
+        export_paths(["a/m/match_0000.jsonl", "b/m/match_0000.jsonl"], "v", "gif")
+
+
+def test_export_replays_from_two_directories(tmp_path):
+    config = {**board_config, "MAX_TURNS": 10}
+    for out_dir in ["m", "t"]:
+        agent1, agent2 = build_agent_llm("bot:heuristic", 0, None), build_agent_llm("bot:flood_fill", 0, None)
+        run_matches(agent1, agent2, 1, str(tmp_path / out_dir), board_config=config, seed=0)
+
+    replay_paths = [str(tmp_path / "m" / "match_0000.jsonl"), str(tmp_path / "t" / "match_0000.jsonl")]
+    out_paths = export_replays(replay_paths, str(tmp_path / "v"), format="gif", max_workers=2)
+
+    assert sorted(os.listdir(tmp_path / "v")) == ["m_match_0000.gif", "t_match_0000.gif"]
+    assert all(os.path.getsize(out_path) > 0 for out_path in out_paths.values())
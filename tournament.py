@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import threading
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import dotenv
+
+from game_engine import game_engine, board_config, board_state_0
+from agents import DEFAULT_PROMPT1, DEFAULT_PROMPT2
+from backends import build_agent_llm, resolve_model, model_id
+from llm_client import set_model_limits
+from run_matches import load_prompt, match_summary
+from replay import ReplayRecorder
+from llm_cache import ResponseCache
+
+
+dotenv.load_dotenv()
+
+
+ELO_INITIAL = 1500
+ELO_K = 32
+
+
+# --- Scheduling ---
+
+def round_robin_pairings(entrants, games_per_pairing=2):
+    """
+    Receives the list of entrants and the number of games per pairing.
+    Returns the list of (agent1_name, agent2_name) pairings where every entrant plays every other one, swapping sides between games.
+    """
+
+    pairings = []
+    for entrant_a, entrant_b in combinations(entrants, 2):
+        for game in range(games_per_pairing):
+            if game % 2 == 0:
+                pairings.append((entrant_a["name"], entrant_b["name"]))
+            else:
+                pairings.append((entrant_b["name"], entrant_a["name"]))
+
+    return pairings
+
+
+def swiss_pairings(standings, played_pairs):
+    """
+    Receives the current standings and the set of frozenset({name_a, name_b}) pairs already played.
+    Returns the list of (agent1_name, agent2_name) pairings for the next round and the name of the entrant with a bye (or None).
+    Entrants are sorted by points and Elo and paired with the closest one they haven't played yet.
+    """
+
+    ranking = [s["name"] for s in sorted(standings.values(), key=lambda s: (s["points"], s["elo"]), reverse=True)]
+
+    bye = None
+    if len(ranking) % 2 == 1:
+        # The lowest ranked entrant with the fewest byes rests this round
+        bye = min(reversed(ranking), key=lambda name: standings[name]["byes"])
+        ranking.remove(bye)
+
+    pairings = []
+    while ranking:
+        name_a = ranking.pop(0)
+        opponent_idx = next((i for i, name_b in enumerate(ranking) if frozenset((name_a, name_b)) not in played_pairs), 0)
+        name_b = ranking.pop(opponent_idx)
+
+        # The entrant that has played less times as the snake1 takes that side
+        if standings[name_a]["as_agent1"] <= standings[name_b]["as_agent1"]:
+            pairings.append((name_a, name_b))
+        else:
+            pairings.append((name_b, name_a))
+
+    return pairings, bye
+
+
+# --- Leaderboard ---
+
+def new_standings(entrants):
+    """
+    Receives the list of entrants.
+    Returns the initial standings dictionary, indexed by entrant name.
+    """
+
+    return {entrant["name"]: {"name": entrant["name"],
+                              "model": entrant.get("model"),
+                              "temperature": entrant.get("temperature"),
+                              "matches": 0,
+                              "wins": 0,
+                              "draws": 0,
+                              "losses": 0,
+                              "byes": 0,
+                              "as_agent1": 0,
+                              "points": 0,
+                              "elo": ELO_INITIAL,
+                              } for entrant in entrants}
+
+
+def elo_update(elo1, elo2, score1, k=ELO_K):
+    """
+    Receives the Elo ratings of both players and the score of the first one (1 win, 0.5 draw, 0 loss).
+    Returns the updated Elo ratings of both players.
+    """
+
+    expected1 = 1 / (1 + 10 ** ((elo2 - elo1) / 400))
+    delta = k * (score1 - expected1)
+
+    return elo1 + delta, elo2 - delta
+
+
+def update_standings(standings, result):
+    """
+    Receives the standings dictionary and a match result with the "agent1", "agent2" names and the "winner".
+    Updates the win/draw/loss counters, points (1 per win, 0.5 per draw) and Elo ratings of both entrants in place.
+    """
+
+    name1, name2 = result["agent1"], result["agent2"]
+    score1 = {"Agent 1": 1, "Agent 2": 0, "Draw": 0.5}[result["winner"]]
+
+    standings[name1]["elo"], standings[name2]["elo"] = elo_update(standings[name1]["elo"], standings[name2]["elo"], score1)
+
+    for name, score in [(name1, score1), (name2, 1 - score1)]:
+        standings[name]["matches"] += 1
+        standings[name]["points"] += score
+        if score == 1:
+            standings[name]["wins"] += 1
+        elif score == 0:
+            standings[name]["losses"] += 1
+        else:
+            standings[name]["draws"] += 1
+
+    standings[name1]["as_agent1"] += 1
+
+
+def leaderboard(standings):
+    """
+    Receives the standings dictionary.
+    Returns the list of standings sorted by points and Elo rating.
+    """
+
+    return sorted(standings.values(), key=lambda s: (s["points"], s["elo"]), reverse=True)
+
+
+# --- Matches ---
+
+def build_entrant_agent(entrant, side, openai_api_key, cache=None):
+    """
+    Receives the entrant config, the side it plays (1 or 2), the OpenAI API key and the optional ResponseCache.
+    Returns the agent config dictionary expected by game_engine().
+    Entrants can define "prompt1" and "prompt2" (dicts or JSON file paths) as the prompts depend on the snake they control.
+    """
+
+    prompt = entrant.get(f"prompt{side}")
+    if not isinstance(prompt, dict):
+        prompt = load_prompt(prompt, DEFAULT_PROMPT1 if side == 1 else DEFAULT_PROMPT2)
+
+    is_test = entrant.get("is_test", False)
+    # The LLM clients are shared by all the matches, with the model's rate limits and retries
+    agent = {"llm": None, "prompt": prompt} if is_test else build_agent_llm(entrant["model"], entrant.get("temperature", 0.5), prompt, openai_api_key)
+
+    return {**agent, "is_test": is_test, "cache": cache, "token_budget": entrant.get("token_budget"), "conversation": entrant.get("conversation"),
+            "stream": entrant.get("stop_early", False), "stop_early": entrant.get("stop_early", False),
+            "move_timeout": entrant.get("move_timeout"), "timeout_fallback": entrant.get("timeout_fallback", "keep"),
+            "skip_forced": entrant.get("skip_forced", False), "correct_moves": entrant.get("correct_moves", False)}
+
+
+def play_tournament_match(match, board_config=board_config, openai_api_key=None, model_slots=None, out_dir=None, cache=None):
+    """
+    Receives the scheduled match (dict with "match_id" and the "agent1" and "agent2" entrant configs), the board configuration, the OpenAI API key,
+    the optional per-model concurrency semaphores, the optional output directory for the match replay and the optional ResponseCache.
+    Plays the match and returns its summary with the entrants' names.
+    It is a top-level function so it can also run in a process pool for local (non-LLM) entrants.
+    """
+
+    entrant1, entrant2 = match["agent1"], match["agent2"]
+
+    # Taking one concurrency slot per distinct model, always in the same order to avoid deadlocks between matches
+    models = sorted({model_id(e["model"]) for e in (entrant1, entrant2) if not e.get("is_test", False)})
+    slots = [model_slots[model] for model in models if model_slots is not None and model in model_slots]
+    for slot in slots:
+        slot.acquire()
+
+    observers = []
+    if out_dir is not None:
+        metadata = {"agent1": entrant1, "agent2": entrant2, "match_id": match["match_id"]}
+        observers.append(ReplayRecorder(os.path.join(out_dir, f"match_{match['match_id']:04}.jsonl"), metadata=metadata))
+
+    try:
+        agent1 = build_entrant_agent(entrant1, 1, openai_api_key, cache)
+        agent2 = build_entrant_agent(entrant2, 2, openai_api_key, cache)
+        winner, game_history = game_engine(board_config=board_config, board_state_0=board_state_0, agent1=agent1, agent2=agent2, observers=observers)
+    finally:
+        for slot in reversed(slots):
+            slot.release()
+
+    summary = match_summary(match["match_id"], winner, game_history)
+    summary["agent1"] = entrant1["name"]
+    summary["agent2"] = entrant2["name"]
+
+    return summary
+
+
+# --- Main function ---
+
+def run_tournament(entrants,
+                   mode="round_robin",
+                   n_rounds=3,
+                   games_per_pairing=2,
+                   max_workers=4,
+                   model_limits=None,
+                   board_config=board_config,
+                   openai_api_key=None,
+                   out_dir=None,
+                   cache_path=None,
+                   ):
+    """
+    Receives the list of entrants (dicts with "name", "model", "temperature", optionally "prompt1", "prompt2" and "is_test"),
+    the tournament mode ("round_robin" or "swiss"), the number of Swiss rounds, the games per round robin pairing, the size of the worker pool,
+    the per-model limits ({model: {"max_concurrent": int, "requests_per_minute": int, "tokens_per_minute": int}}), the board configuration, the OpenAI API key, the output directory
+    and the optional SQLite file of the LLM responses cache (shared by all the matches).
+    Plays all the matches in a bounded pool (threads for LLM entrants, processes if every entrant is local) and returns the results and the final leaderboard.
+    """
+
+    entrants_by_name = {entrant["name"]: entrant for entrant in entrants}
+    if len(entrants_by_name) != len(entrants):
+        raise ValueError("Entrant names must be unique")
+
+    model_limits = model_limits if model_limits is not None else {}
+
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    # Local entrants (test agents, bots and fake LLMs) are CPU bound and picklable so they can be simulated in a process pool, LLM entrants wait on I/O and share the limiters in threads
+    is_local = all(entrant.get("is_test", False) or resolve_model(entrant["model"])[0].runs_locally for entrant in entrants)
+    if is_local:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        model_slots, cache = None, None
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        model_slots = {model_id(model): threading.Semaphore(limits["max_concurrent"]) for model, limits in model_limits.items() if "max_concurrent" in limits}
+        for model, limits in model_limits.items():
+            if "requests_per_minute" in limits or "tokens_per_minute" in limits:
+                set_model_limits(model_id(model), limits.get("requests_per_minute"), limits.get("tokens_per_minute"))
+        cache = ResponseCache(cache_path) if cache_path is not None else None
+
+    standings = new_standings(entrants)
+    played_pairs = set()
+    results = []
+
+    def play_round(pairings):
+        matches = [{"match_id": len(results) + i, "agent1": entrants_by_name[name1], "agent2": entrants_by_name[name2]} for i, (name1, name2) in enumerate(pairings)]
+        futures = [executor.submit(play_tournament_match, match, board_config, openai_api_key, model_slots, out_dir, cache) for match in matches]
+
+        round_results = []
+        for future in as_completed(futures):
+            result = future.result()
+            round_results.append(result)
+            print(f"Match {result['match_id']}: {result['agent1']} vs {result['agent2']} -> {result['winner']} in {result['turns']} turns")
+
+        # Elo depends on the order of the updates, so they are applied in the schedule order and not in the completion order
+        for result in sorted(round_results, key=lambda r: r["match_id"]):
+            update_standings(standings, result)
+            played_pairs.add(frozenset((result["agent1"], result["agent2"])))
+            results.append(result)
+
+    try:
+        if mode == "round_robin":
+            play_round(round_robin_pairings(entrants, games_per_pairing))
+
+        elif mode == "swiss":
+            for _ in range(n_rounds):
+                pairings, bye = swiss_pairings(standings, played_pairs)
+                if bye is not None:
+                    standings[bye]["byes"] += 1
+                    standings[bye]["points"] += 1
+                play_round(pairings)
+
+        else:
+            raise ValueError(f"Unknown tournament mode: {mode}")
+
+    finally:
+        executor.shutdown()
+
+    final_leaderboard = leaderboard(standings)
+
+    if out_dir is not None:
+        with open(os.path.join(out_dir, "results.jsonl"), "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+        with open(os.path.join(out_dir, "leaderboard.json"), "w", encoding="utf-8") as f:
+            json.dump(final_leaderboard, f, indent=4)
+
+    return results, final_leaderboard
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Play a round robin or Swiss tournament between a list of entrants and print the leaderboard.")
+    parser.add_argument("--entrants", required=True, help="JSON file with the list of entrants (name, model, temperature, prompt1, prompt2, is_test)")
+    parser.add_argument("--mode", default="round_robin", choices=["round_robin", "swiss"], help="Tournament mode")
+    parser.add_argument("--rounds", type=int, default=3, help="Number of rounds in the Swiss mode")
+    parser.add_argument("--games-per-pairing", type=int, default=2, help="Games per pairing in the round robin mode (sides are swapped)")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of matches played at the same time")
+    parser.add_argument("--model-limits", default=None, help="JSON file with the per-model limits: {model: {max_concurrent, requests_per_minute, tokens_per_minute}}")
+    parser.add_argument("--max-turns", type=int, default=board_config["MAX_TURNS"], help="Maximum number of turns per match")
+    parser.add_argument("--out-dir", default="./tournament/", help="Output directory for the results, the leaderboard and the matches history")
+    parser.add_argument("--cache", default=None, help="SQLite file to cache the LLM responses of the calls with temperature 0")
+    args = parser.parse_args()
+
+    with open(args.entrants, "r", encoding="utf-8") as f:
+        entrants = json.load(f)
+
+    model_limits = None
+    if args.model_limits is not None:
+        with open(args.model_limits, "r", encoding="utf-8") as f:
+            model_limits = json.load(f)
+
+    results, final_leaderboard = run_tournament(entrants,
+                                                mode=args.mode,
+                                                n_rounds=args.rounds,
+                                                games_per_pairing=args.games_per_pairing,
+                                                max_workers=args.workers,
+                                                model_limits=model_limits,
+                                                board_config={**board_config, "MAX_TURNS": args.max_turns},
+                                                openai_api_key=os.getenv("OPENAI_API_KEY"),
+                                                out_dir=args.out_dir,
+                                                cache_path=args.cache)
+
+    print("")
+    print(f"{'#':>2} {'Entrant':<30} {'W':>3} {'D':>3} {'L':>3} {'Pts':>5} {'Elo':>6}")
+    for i, s in enumerate(final_leaderboard):
+        print(f"{i+1:>2} {s['name']:<30} {s['wins']:>3} {s['draws']:>3} {s['losses']:>3} {s['points']:>5} {s['elo']:>6.0f}")